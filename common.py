@@ -1,11 +1,13 @@
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, legend, figure, subplot, title, subplots_adjust, figlegend, ylim, figtext, savefig, axhline
+from matplotlib.pyplot import plot, legend, figure, subplot, title, subplots_adjust, figlegend, ylim, figtext, savefig, axhline, close
 import os
 import sys
 import time
+import multiprocessing
 from math import sqrt, ceil
-from daffy_plot.plot_helper import DaffyTCVPlotHelper
+import numpy as np
+from daffy_plot.plot_helper import DaffyTCVPlotHelper, BEST_TRACK_LABEL
 from pycane.timing.conversions import epoch_to_pretty_time_string
 
 '''
@@ -22,20 +24,137 @@ FIG_TITLE_X = 0.3
 FIG_TITLE_Y = 0.96
 FIG_TITLE_FONTSIZE = 22
 
+# Defaults for the arguments of create_grid_of_plots() 
+GRID_DEFAULTS = dict(x_label="fhr", y_label="", figure_title="", 
+                     legend_position='best', plots_per_page=16, 
+                     save_prefix=None, file_type='png')
+
+# PlotHelper used by the worker processes of create_grids_of_plots(), which
+# inherit it when forked
+_render_plot_helper = None
+# GridPageRenderer of each grid rendered by a worker process
+_render_renderers = {}
+
 
 def create_grid_of_plots(plot_helper, metric_name, x_label="fhr", y_label="", 
                          figure_title="", legend_position = 'best', 
-                         plots_per_page=16, save_prefix=None, file_type='png'):
-    num_cycles = len(plot_helper.datasets[0].cycles)
-    num_pages = ceil(num_cycles / plots_per_page)
-    for i, startCycle in enumerate(range(0, num_cycles, plots_per_page)):
-        endCycle = startCycle + plots_per_page
-        #currCycles = plot_helper.datasets[startCycle:endCycle]
-        currCycles = plot_helper.datasets[0].cycles[startCycle:endCycle]
-        _create_one_grid(currCycles, plot_helper, metric_name, x_label, 
-                         y_label, figure_title, legend_position)
-        if save_prefix is not None:
-            savefig(save_prefix + '_' + str(i) + '.' + file_type)
+                         plots_per_page=16, save_prefix=None, file_type='png',
+                         jobs=None):
+    '''
+    Create a grid of plots of `metric_name' (see _create_one_grid()) for 
+    every `plots_per_page' cycles of the plot_helper's datasets. If a 
+    `save_prefix' is given, each page is saved to 
+    <save_prefix>_<page number>.<file_type> and closed. Otherwise, each page
+    is left open in a Figure of its own.
+    If `jobs' (default: the plot_helper cfg's render_jobs) is greater than 1
+    and a `save_prefix' is given, the pages are rendered concurrently by a 
+    pool of processes. See create_grids_of_plots()
+    '''
+    create_grids_of_plots(plot_helper, 
+                          [dict(metric_name=metric_name, x_label=x_label,
+                                y_label=y_label, figure_title=figure_title,
+                                legend_position=legend_position,
+                                plots_per_page=plots_per_page,
+                                save_prefix=save_prefix, 
+                                file_type=file_type)],
+                          jobs=jobs)
+
+def create_grids_of_plots(plot_helper, grids, jobs=None):
+   '''
+   Create several grids of plots (e.g. one for each metric). Each element of
+   `grids' is a dictionary with the arguments to create_grid_of_plots() 
+   (other than `plot_helper' and `jobs').
+   The data of all datasets is read before rendering anything. 
+   The pages of grids with a `save_prefix' are closed once they are saved. 
+   If `jobs' (default: the plot_helper cfg's render_jobs) is greater than 1,
+   they are rendered concurrently by a pool of `jobs' processes, which 
+   inherit the data that was read. Otherwise, the pages of each grid are 
+   rendered serially, reusing the same Figure (see GridPageRenderer). Either
+   way, the resulting files are the same.
+   Each page of the grids without a `save_prefix' is created in a Figure of
+   its own, which is left open (e.g. for show()).
+   '''
+   if jobs is None:
+      jobs = plot_helper.cfg.render_jobs
+   pages = []
+   for gridIdx, grid in enumerate(grids):
+      grid = dict(GRID_DEFAULTS, **grid)
+      numCycles = len(plot_helper.datasets[0].cycles)
+      for i, startCycle in enumerate(range(0, numCycles, 
+                                           grid['plots_per_page'])):
+         endCycle = startCycle + grid['plots_per_page']
+         currCycles = plot_helper.datasets[0].cycles[startCycle:endCycle]
+         if grid['save_prefix'] is None:
+            savePath = None
+         else:
+            savePath = grid['save_prefix'] + '_' + str(i) + '.' \
+                       + grid['file_type']
+         pages.append( (gridIdx, currCycles, grid['metric_name'], 
+                        grid['x_label'], grid['y_label'], 
+                        grid['figure_title'], grid['legend_position'], 
+                        savePath) )
+   _preload_grid_data(plot_helper, set(grid['metric_name'] 
+                                       for grid in grids))
+   savedPages = [ page for page in pages if page[-1] is not None ]
+   jobs = min(jobs, len(savedPages))
+   if jobs > 1:
+      global _render_plot_helper
+      _render_plot_helper = plot_helper
+      pool = multiprocessing.Pool(jobs)
+      try:
+         pool.map(_render_and_save_page_in_worker, savedPages, chunksize=1)
+      finally:
+         pool.close()
+         pool.join()
+         _render_plot_helper = None
+      pages = [ page for page in pages if page[-1] is None ]
+   renderers = {}
+   try:
+      for page in pages:
+         if page[-1] is None:
+            _create_one_grid(page[1], plot_helper, *page[2:-1])
+         else:
+            _render_and_save_page(page, plot_helper, renderers)
+   finally:
+      for renderer in renderers.values():
+         renderer.close()
+
+def _preload_grid_data(plot_helper, metric_names):
+   '''
+   Read all the data needed to plot the given `metric_names' of all of the
+   plot_helper's datasets, concurrently if the datasets are configured to 
+   use more than one job
+   '''
+   is_absolute = (plot_helper.cfg.difference_type == 'absolute')
+   errors = any('_error' in metric for metric in metric_names)
+   for dataset in plot_helper.datasets:
+      dataset.prefetch_tc_stats(errors=errors, is_absolute=is_absolute)
+      # used for the dynamic y limits
+      dataset.track_cube.get_range_index(is_absolute)
+   if any('_value' in metric for metric in metric_names):
+      plot_helper.cfg.truth_index
+
+def _render_and_save_page(page, plot_helper, renderers):
+   '''
+   Render a page of a grid of plots and save it with the plot_helper. 
+   `page' is a tuple consisting of the index of its grid, the arguments to 
+   _create_one_grid() (other than the plot_helper) and the path to save it 
+   to. `renderers' maps grid indices to the GridPageRenderer used for their
+   pages, so the Figure of the grid's previous page is reused.
+   '''
+   gridIdx = page[0]
+   if not gridIdx in renderers:
+      renderers[gridIdx] = GridPageRenderer(plot_helper, *page[2:-1])
+   fig = renderers[gridIdx].render(page[1])
+   plot_helper.savefig(page[-1], fig=fig)
+
+def _render_and_save_page_in_worker(page):
+   '''
+   Render and save a page of a grid of plots (see _render_and_save_page())
+   in a worker process of create_grids_of_plots()
+   '''
+   _render_and_save_page(page, _render_plot_helper, _render_renderers)
+   return page[-1]
 
 def _create_one_grid(cycles, plot_helper, metric_name, x_label, y_label,
                      figure_title, legend_position='best'):
@@ -47,53 +166,213 @@ def _create_one_grid(cycles, plot_helper, metric_name, x_label, y_label,
    The default plot_helper behavior applies: If it contains "_error", use 
    get_tc_error_stats(). If it contains "_value", use get_tc_value_stats()
 
+   RETURN the Figure created
    NOTE : 'cycles' is just a list of ints (i.e. time since epoch), which should be the same for all `dataset's, so passing just one in should be fine
    '''
-   nRows = nCols = ceil( sqrt( len(cycles) ) )
-   fig = figure(figsize=(FIG_WIDTH, FIG_HEIGHT))
-   subplots_adjust(hspace=SUBPLOT_HSPACE, wspace=SUBPLOT_WSPACE)
-   dsCtr = 0
-   for dataset in plot_helper.datasets:
-      i = 1 # subplot uses 1-indexing
-      #for cycle in dataset.cycles:
-      for cycle in cycles:
-         #if metric_name.find("_value") > -1:
-         ax = subplot(nRows, nCols, i)
-         i += 1
-         plot_helper.plot_dataset_metric_vs_fhr(dataset, cycle, metric_name, x_label=x_label, y_label=y_label, axes=ax)
-         # labels and title only need be done on the final dataset, but for each cycle. 
-         # actually labels are automatically created by PlotHelper.
-         if dsCtr == len(plot_helper.datasets) - 1:
-            title(epoch_to_pretty_time_string(cycle) )
-      dsCtr += 1      
-      
-  # Set y limits to be the same for all plots
-   plot_helper.set_y_limits(metric_name)
-   for ii in range( 1, int(nRows*nCols) + 1 ):
-      ax = subplot(nRows, nCols, ii)
-      # Get the min/max y extents from fields in the PlotHelper
-      ylim( getattr(plot_helper, 'yMin_' + metric_name), getattr(plot_helper, 'yMax_' + metric_name) )
-   
-    # Create legend
-#   handles, labels = ax.get_legend_handles_labels()
-#   fig.legend(handles, labels)
-#      figtext( FIG_TITLE_X, FIG_TITLE_Y, figure_title, fontsize=FIG_TITLE_FONTSIZE)
-   
-   # ignore duplicates
-   handles, labels = ax.get_legend_handles_labels()
-   unique_handles = []
-   unique_labels = []
-   #print len(labels)
-   for j in range(len(labels)):
-      #print j
-      if not labels[j] in unique_labels:
-         unique_labels.append(labels[j])
-         unique_handles.append(handles[j])
-   handles = unique_handles
-   labels = unique_labels
-   #leg = legend(handles, labels, loc=plot_helper.cfg.legend_position)
-   leg = fig.legend(handles, labels)
-   leg.get_frame().set_alpha(plot_helper.cfg.legend_alpha)
-   if len(figure_title) > 0:
-      figtext( FIG_TITLE_X, FIG_TITLE_Y, figure_title, fontsize=FIG_TITLE_FONTSIZE)
-  
+   renderer = GridPageRenderer(plot_helper, metric_name, x_label, y_label,
+                               figure_title, legend_position)
+   return renderer.render(cycles)
+
+
+class GridPageRenderer(object):
+   '''
+   Renders the pages of a grid of plots (see _create_one_grid()) that are 
+   saved as soon as they are rendered. The figure, the axes layout, labels,
+   y limits and legend are created once, for the first page. For subsequent
+   pages with the same number of cycles, only the data of the lines is 
+   replaced and the titles are updated, so the same Figure is returned for 
+   each page and the previous page is lost.
+   Each page looks exactly as if it had been created from scratch, so the 
+   output does not depend on which pages were rendered before it (e.g. by 
+   the same worker process of create_grids_of_plots()). Since the x limits
+   of a new figure also account for the size of the flagged entry markers,
+   which cannot be recomputed for an existing one, pages with flagged entry
+   markers are created from scratch, as are all pages if the artists 
+   created by the plot_helper for the first page do not correspond to the 
+   data in the expected way.
+   '''
+   def __init__(self, plot_helper, metric_name, x_label, y_label, 
+                figure_title, legend_position='best'):
+      self.plot_helper = plot_helper
+      self.metric_name = metric_name
+      self.x_label = x_label
+      self.y_label = y_label
+      self.figure_title = figure_title
+      self.legend_position = legend_position
+      self.fig = None
+      self._num_cells = None
+      self._axes = []
+      # maps (cell index, dataset index) to the artists to update
+      self._artists = {}
+      self._reusable = False
+
+   def render(self, cycles):
+      '''
+      Render the page for the given `cycles'. 
+      RETURN the Figure containing it
+      '''
+      if self.fig is None or not self._reusable \
+         or len(cycles) != self._num_cells:
+         self._create_figure(cycles)
+         return self.fig
+      pageData = {}
+      for dsIdx, dataset in enumerate(self.plot_helper.datasets):
+         for cellIdx, cycle in enumerate(cycles):
+            pageData[(cellIdx, dsIdx)] = self._get_page_data(dataset, cycle)
+      if self.plot_helper.cfg.plot_flagged_tracker_entries \
+         and any(len(data[1]) > 0 for data in pageData.values()):
+         self._create_figure(cycles)
+      else:
+         self._set_page_data(cycles, pageData)
+      return self.fig
+
+   def close(self):
+      ''' Close the Figure of the last page rendered '''
+      if self.fig is not None:
+         close(self.fig)
+         self.fig = None
+
+   def _create_figure(self, cycles):
+      '''
+      Create the Figure with the plots of the given `cycles', keeping track
+      of the artists of each dataset's plot in each subplot
+      '''
+      self.close()
+      plot_helper = self.plot_helper
+      metric_name = self.metric_name
+      nRows = nCols = ceil( sqrt( len(cycles) ) )
+      self.fig = fig = figure(figsize=(FIG_WIDTH, FIG_HEIGHT))
+      subplots_adjust(hspace=SUBPLOT_HSPACE, wspace=SUBPLOT_WSPACE)
+      self._num_cells = len(cycles)
+      self._axes = []
+      self._artists = {}
+      self._reusable = True
+      for dsIdx, dataset in enumerate(plot_helper.datasets):
+         for cellIdx, cycle in enumerate(cycles):
+            ax = subplot(nRows, nCols, cellIdx + 1) # 1-indexing
+            if dsIdx == 0:
+               self._axes.append(ax)
+            (numLines, numCollections, numTexts) = \
+                  (len(ax.lines), len(ax.collections), len(ax.texts))
+            plot_helper.plot_dataset_metric_vs_fhr(dataset, cycle, 
+                                                   metric_name, 
+                                                   x_label=self.x_label, 
+                                                   y_label=self.y_label, 
+                                                   axes=ax)
+            if len(ax.texts) != numTexts:
+               self._reusable = False
+            artists = self._get_page_artists(dataset, cycle,
+                                             ax.lines[numLines:], 
+                                             ax.collections[numCollections:])
+            if artists is None:
+               self._reusable = False
+            self._artists[(cellIdx, dsIdx)] = artists
+            # labels and title only need be done on the final dataset, 
+            # but for each cycle. 
+            if dsIdx == len(plot_helper.datasets) - 1:
+               title(epoch_to_pretty_time_string(cycle))
+
+      # Set y limits to be the same for all plots
+      plot_helper.set_y_limits(metric_name)
+      for ii in range( 1, int(nRows*nCols) + 1 ):
+         ax = subplot(nRows, nCols, ii)
+         ylim( getattr(plot_helper, 'yMin_' + metric_name), 
+               getattr(plot_helper, 'yMax_' + metric_name) )
+
+      # ignore duplicates
+      handles, labels = ax.get_legend_handles_labels()
+      unique_handles = []
+      unique_labels = []
+      seen = set()
+      for handle, label in zip(handles, labels):
+         if not label in seen:
+            seen.add(label)
+            unique_labels.append(label)
+            unique_handles.append(handle)
+      leg = fig.legend(unique_handles, unique_labels)
+      leg.get_frame().set_alpha(plot_helper.cfg.legend_alpha)
+      if len(self.figure_title) > 0:
+         figtext( FIG_TITLE_X, FIG_TITLE_Y, self.figure_title, 
+                  fontsize=FIG_TITLE_FONTSIZE)
+
+   def _get_page_data(self, dataset, cycle):
+      '''
+      RETURN a 3-tuple consisting of the (x,y) data of the given `dataset's
+      line for `cycle', the (x,y) data of its flagged entries and, if 
+      plotting values, the (x,y) data of the Truth line
+      '''
+      metric_name = self.metric_name
+      entries = self.plot_helper.get_dataset_metric_track(
+                                 dataset, cycle, metric_name).tracker_entries
+      lineData = ( [ e.fhr for e in entries ], 
+                   [ getattr(e, metric_name) for e in entries ] )
+      flaggedData = [ (e.fhr, getattr(e, metric_name)) for e in entries 
+                      if e.flagged ]
+      if '_value' in metric_name:
+         natureData = self.plot_helper.get_nature_run_values(cycle, 
+                                                             metric_name)
+      else:
+         natureData = None
+      return (lineData, flaggedData, natureData)
+
+   def _get_page_artists(self, dataset, cycle, lines, collections):
+      '''
+      Determine which of the `lines' and `collections' created when 
+      plotting the given `dataset's `cycle' contain its data, its flagged 
+      entries and the Truth values. 
+      RETURN a dictionary with the 'line', 'flagged' and 'nature' artists,
+      or None if they do not contain the expected data
+      '''
+      (lineData, flaggedData, natureData) = \
+            self._get_page_data(dataset, cycle)
+      dataLines = [ l for l in lines if l.get_label() == dataset.name ]
+      natureLines = [ l for l in lines if l.get_label() == BEST_TRACK_LABEL ]
+      if len(dataLines) != 1 \
+         or not _same_data(dataLines[0].get_data(), lineData):
+         return None
+      for line in natureLines:
+         if not _same_data(line.get_data(), natureData):
+            return None
+      for collection in collections:
+         if not _same_data(collection.get_offsets(), flaggedData):
+            return None
+      return dict(line=dataLines[0], flagged=collections, nature=natureLines)
+
+   def _set_page_data(self, cycles, pageData):
+      '''
+      Replace the data of the artists in each subplot with that of the 
+      corresponding cycle in `cycles', as given in `pageData' (which maps
+      (cell index, dataset index) to the return value of _get_page_data()),
+      and update the titles and x limits. The page may not have any flagged
+      entry markers to draw, since their size would not be accounted for in
+      the x limits.
+      '''
+      for (cellIdx, dsIdx), data in pageData.iteritems():
+         artists = self._artists[(cellIdx, dsIdx)]
+         (lineData, flaggedData, natureData) = data
+         artists['line'].set_data(*lineData)
+         for collection in artists['flagged']:
+            collection.set_offsets(np.empty((0, 2)))
+         for line in artists['nature']:
+            line.set_data(*natureData)
+      for ax, cycle in zip(self._axes, cycles):
+         ax.set_title(epoch_to_pretty_time_string(cycle))
+         # the x limits of a new figure only depend on the lines too
+         ax.relim()
+         ax.autoscale_view()
+
+
+def _same_data(data, expected):
+   '''
+   RETURN True if the given artist `data' (an (x,y) tuple or an array of 
+   points) contains the `expected' values, where None or NaN values match 
+   each other
+   '''
+   data = np.asarray(data, dtype=float)
+   expected = np.asarray(expected, dtype=float)
+   if data.size == 0 and expected.size == 0:
+      return True
+   if data.shape != expected.shape:
+      return False
+   return bool(np.all((data == expected) 
+                      | (np.isnan(data) & np.isnan(expected))))
@@ -0,0 +1,104 @@
+'''
+Provides the BasemapCache class, which keeps pickled Basemap objects on disk,
+so that the coastline and boundary processing done when instantiating a
+Basemap (which takes several seconds at the higher resolutions) is only done
+once for each map configuration.
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import hashlib
+import cPickle as pickle
+import logging
+from util import atomic_write
+
+# Increment this if the format of the cached entries changes, so that
+# entries created with previous versions are not used
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_SUFFIX = '.basemap.pkl'
+
+
+class BasemapCache(object):
+    '''
+    Stores Basemap objects in a cache directory. Each entry is keyed by the
+    arguments passed to the Basemap constructor (i.e. projection, extents,
+    resolution, area threshold, etc.) and the version of Basemap. The Axes
+    of the Basemap is not part of the key; it is set when an entry is
+    retrieved.
+    '''
+    def __init__(self, cache_dir, log=None):
+        '''
+        Instantiate a BasemapCache, creating `cache_dir' if it does not
+        exist
+        '''
+        if log is None:
+            log = logging.getLogger()
+        self.log = log
+        self.cache_dir = cache_dir
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # may have been created concurrently
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def _get_entry_path(self, basemap_kwargs):
+        '''
+        RETURN the path of the cache entry for a Basemap instantiated with
+        the given `basemap_kwargs'
+        '''
+        import mpl_toolkits.basemap
+        key = repr((sorted(basemap_kwargs.items()),
+                    mpl_toolkits.basemap.__version__, CACHE_FORMAT_VERSION))
+        return os.path.join(self.cache_dir,
+                            hashlib.md5(key).hexdigest() + CACHE_FILE_SUFFIX)
+
+    def get(self, ax=None, **basemap_kwargs):
+        '''
+        RETURN a Basemap equivalent to Basemap(ax=ax, **basemap_kwargs),
+        reading it from the cache if possible. Otherwise, it is created and
+        added to the cache.
+        '''
+        from mpl_toolkits.basemap import Basemap
+        entryPath = self._get_entry_path(basemap_kwargs)
+        basemap = None
+        try:
+            with open(entryPath, 'rb') as f:
+                basemap = pickle.load(f)
+            self.log.debug("Using cached Basemap {}".format(entryPath))
+        except (IOError, OSError):
+            pass
+        except Exception as e:
+            self.log.warn("Ignoring unreadable Basemap cache entry {}: {}"
+                          .format(entryPath, e))
+        if basemap is None:
+            basemap = Basemap(ax=None, **basemap_kwargs)
+            self._put(entryPath, basemap)
+        basemap.ax = ax
+        return basemap
+
+    def _put(self, entryPath, basemap):
+        '''
+        Write the given `basemap' (which should not have an Axes set) to the
+        cache entry at `entryPath'
+        '''
+        try:
+            with atomic_write(entryPath) as f:
+                pickle.dump(basemap, f, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.log.warn("Unable to write Basemap cache entry {}: {}"
+                          .format(entryPath, e))
+
+
+def get_basemap(cache_dir=None, ax=None, log=None, **basemap_kwargs):
+    '''
+    RETURN a Basemap instantiated with the given `ax' and `basemap_kwargs'.
+    If a `cache_dir' is given, it is read from/added to the BasemapCache in
+    that directory.
+    '''
+    if cache_dir is None:
+        from mpl_toolkits.basemap import Basemap
+        return Basemap(ax=ax, **basemap_kwargs)
+    return BasemapCache(cache_dir, log=log).get(ax=ax, **basemap_kwargs)
@@ -7,12 +7,18 @@ from pycane.postproc.tracker import utils as trkutils
 from pycane.postproc.tracker import objects as trkobj
 # export PYTHONPATH=$PYTHONPATH:/home/Javier.Delgado/apps/pyhwrf/r3963/ush
 from hwrf.config import HWRFConfig
-import hwrf.config
+import ConfigParser
 from datetime import datetime as dtime
 from datetime import timedelta as tdelta
 import glob
+import fnmatch
+import threading
+from multiprocessing.pool import ThreadPool
 import logging as log
-from math import sqrt
+from track_cube import TrackCube
+from truth_index import TruthIndex
+from track_cache import TrackFileCache
+from util import LRUCache
 
 # Set names of products. These should correspond to the names given 
 # in the product configuration files 
@@ -20,6 +26,12 @@ DIAPOST_TRK_PROD = 'diapost_track'
 GFDLTRK_TRK_PROD = 'gfdltrk_track'
 GFDLTRK_FLAG_PROD = 'gfdltrk_flagged_entries'
 
+# Supported values for the `executor' of ExperimentDataset
+EXECUTORS = ('serial', 'thread')
+# Product config file (in <os.getcwd()>/conf) containing the settings common
+# to all experiment types
+COMMON_PRODUCTS_CONFIG_FILE = 'products_common.cfg'
+
 
 class ExperimentDataset(object):
     '''
@@ -36,10 +48,17 @@ class ExperimentDataset(object):
     An HWRFConfig object (from pyhwrf) is used for parsing the parameter values,
     so all rules of its conftimestrinterp method apply
     '''
+    # Product config file (in <os.getcwd()>/conf) specific to the type of
+    # experiment. Set by the subclasses
+    PRODUCTS_CONFIG_FILE = None
+    # Whether the paths of the products include the storm ID
+    USES_STORM_ID = False
+
     def __init__(self, name, path, start_date, end_date, cycle_frequency,
                  forecast_frequency, forecast_duration, history_interval, 
                  plot_options, truth_track=None, genericConfigFile=None,
-                 log=None, storm_id=None, best_track_path=None):
+                 log=None, storm_id=None, best_track_path=None,
+                 jobs=1, executor='thread', exptTypeConfigFile=None):
         '''
         Construct an ExperimentDataset. Hint: You probably do not want to 
         instantiate one of these but rather one of the experiment-type-specific
@@ -56,10 +75,16 @@ class ExperimentDataset(object):
         @param genericConfigFile Configuration file specifying product-related 
                parameters. If not passed in, use
                <os.getcwd()>/conf/products_generic.cfg 
+        @param exptTypeConfigFile Configuration file specifying parameters
+               specific to the system used to run the experiment. Its 
+               settings are read after (i.e. override) the genericConfigFile
         @param storm_id The number+basin code of the Storm (e.g. '07L') 
                 If working with a real case, this is required since the 
                 path will include it.
         @param best_track_path Path to best track 
+        @param jobs Number of cycles whose data is read concurrently
+        @param executor How to read cycles concurrently: 'thread' to use a
+               pool of `jobs' threads or 'serial' to read them one by one
         @param experiment_id - Experiment ID
         @param experiment_uuid - Experiment UUID
         '''
@@ -73,6 +98,10 @@ class ExperimentDataset(object):
         self.history_interval = history_interval
         self.plot_options = plot_options
         self.storm_id = storm_id
+        if not executor in EXECUTORS:
+            raise Exception("executor should be one of {}".format(EXECUTORS))
+        self.jobs = int(jobs)
+        self.executor = executor
 
         if log is None:
             log = logging.getLogger()
@@ -84,26 +113,46 @@ class ExperimentDataset(object):
         if genericConfigFile is None:
             self.common_products_conf_file = os.path.join(os.getcwd(),
                                                           'conf',
-                                                          'products_common.cfg')
+                                                          COMMON_PRODUCTS_CONFIG_FILE)
         else:
             self.common_products_conf_file = genericConfigFile
         # HWRFConfig does not check existance of the config file 
         if not os.path.exists(self.common_products_conf_file):
             raise Exception("Config file %s does not exist" 
                              %self.common_products_conf_file)
-        self.conf = hwrf.config.from_file(self.common_products_conf_file)
-        self.conf.add_section("dynamic")
-        self.conf.set_options("dynamic", expt_rundir=self.path)
-        if storm_id is not None:
-            self.conf.set_options("dynamic", storm_id=storm_id)
-            self.conf.set_options("dynamic", storm_id_lc=storm_id.lower())
-            self.conf.set_options("dynamic", storm_id_uc=storm_id.upper())
+        configFiles = [self.common_products_conf_file]
+        if exptTypeConfigFile is not None:
+            # HWRFConfig does not check existance of the config file 
+            if not os.path.exists(exptTypeConfigFile):
+                raise Exception("Config file %s does not exist" 
+                                 %exptTypeConfigFile)
+            configFiles.append(exptTypeConfigFile)
+        self.conf = create_products_conf(self.path, configFiles, storm_id)
         #self.conf.set_options("dynamic", best_track=best_track_path)
         self._initialize_min_max_vars()
+        self._track_cube = None
+        self._track_cube_key = None
+        # Parsed tracker files persisted across runs, if enabled
+        cacheDir = self.plot_options.get('track_cache_dir')
+        if cacheDir:
+            self.track_file_cache = TrackFileCache(cacheDir, log=self.log)
+        else:
+            self.track_file_cache = None
+        # protects the min/max vars, which may be updated by map_cycles()
+        # workers
+        self._min_max_lock = threading.Lock()
+        # Cache of the ForecastTrack(Diff)s returned by get_tc_value_stats() 
+        # and get_tc_error_stats(), so that each cycle's tracker data is
+        # only read once
+        self.tc_stats_cache = LRUCache(
+            max_entries=self.plot_options.get('tc_stats_cache_size'),
+            max_bytes=self.plot_options.get('tc_stats_cache_bytes'),
+            sizeof=_track_sizeof)
 
         # this should be a ForecastTrack
-        if truth_track is not None:
-            self.truth_track = truth_track
+        self.truth_track = truth_track
+        self._truth_index = None
+        self._truth_index_track = None
         # TODO : deprecate separate truth_track
         '''
         if best_track_path is not None:
@@ -180,7 +229,8 @@ class ExperimentDataset(object):
     def get_mean_tc_error_stats(self):
         '''
         Calculate and return the mean error across all cycles, along the 
-        forecast hours, using the get_tc_error_stats() method
+        forecast hours, using the TrackCube of this dataset (see 
+        the track_cube property)
         RETURN A 2-tupple consisting of:
            1) A list of TrackerDataDiff populated with the mean of the 
               individual errors, excluding flagged entries
@@ -188,216 +238,179 @@ class ExperimentDataset(object):
            The elements in each tupple correspond to the tracker outputs, 
            so the frequency correponds to self.history_interval
         '''
-
-        # initialize
-        tracker_entries_avg = []
-        num_unflagged_entries = []
-        for i in range( int(self.forecast_duration / self.history_interval + 1) ):
-            currFhr = i * self.history_interval / 3600
-            tracker_entries_avg.append(
-                trkobj.TrackerDataDiff(currFhr, False, 0, 0, 0))
-            # keep track of the number of unflagged entries for each tracker entry
-            num_unflagged_entries.append(0)
-        # accumulate foreach cycle
-        for cycle in self.cycles:
-            #import pdb ; pdb.set_trace()
-            log.debug("Getting TCV error stats for cycle {}"
-                      .format(conversions.epoch_to_yyyymmddHHMM(cycle)))
-            cycle_tcv_errors = self.get_tc_error_stats(cycle).tracker_entries
-            assert cycle_tcv_errors[-1].fhr <= self.forecast_duration
-            for i in range(len(cycle_tcv_errors) ):
-                if not cycle_tcv_errors[i].flagged:
-                    # get_tc_error_stats() will only return diapost entries
-                    # that were not flagged, but mean_tcv_errors will have an 
-                    # entry for all history intervals, so use indirect
-                    # addressing
-                    histIntvHrs = self.history_interval / 3600 
-                    fhrIdx = int(cycle_tcv_errors[i].fhr / histIntvHrs)
-                    # "avg" is actually a running sum, for now
-                    tracker_entries_avg[fhrIdx].track_error += \
-                            cycle_tcv_errors[i].track_error
-                    tracker_entries_avg[fhrIdx].maxwind_error += \
-                            cycle_tcv_errors[i].maxwind_error
-                    tracker_entries_avg[fhrIdx].mslp_error += \
-                            cycle_tcv_errors[i].mslp_error
-                    num_unflagged_entries[fhrIdx] += 1
-        # get mean
-        #log.info('Number of unflagged entries: %s' %num_unflagged_entries)
-        for i in range( len(tracker_entries_avg)):
-            # For forecast hours in which all values are flagged, set the value
-            # to the previous fhr's value, to keep the plots smooth. If they're
-            # all flagged for the first forecast hour, set the value to None
-            if num_unflagged_entries[i] == 0:
-                if i == 0:
-                    tracker_entries_avg[i].track_error = None
-                    tracker_entries_avg[i].maxwind_error = None
-                    tracker_entries_avg[i].mslp_error = None
-                else:
-                    tracker_entries_avg[i].track_error =\
-                         tracker_entries_avg[i-1].track_error
-                    tracker_entries_avg[i].maxwind_error =\
-                         tracker_entries_avg[i-1].maxwind_error
-                    tracker_entries_avg[i].mslp_error =\
-                         tracker_entries_avg[i-1].mslp_error
-            else:
-                tracker_entries_avg[i].track_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].maxwind_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].mslp_error /= num_unflagged_entries[i]
-
-        return (tracker_entries_avg, num_unflagged_entries)
+        return self.track_cube.get_mean_errors()
 
     def get_rms_tc_error_stats(self):
         '''
-        Calculate and return the mean error across all cycles, along the 
-        forecast hours, using the get_tc_error_stats() method
+        Calculate and return the root mean square error across all cycles, 
+        along the forecast hours, using the TrackCube of this dataset (see 
+        the track_cube property)
         RETURN A 2-tupple consisting of:
-           1) A list of TrackerDataDiff populated with the mean of the 
+           1) A list of TrackerDataDiff populated with the RMS of the 
               individual errors, excluding flagged entries
            2) Number of unflagged entries
            The elements in each tupple correspond to the tracker outputs, 
            so the frequency correponds to self.history_interval
-        
-        TODO
-         Lots of overlap with this function and get_mean_tc_error_stats - basically,
-         the only difference is that we square the sums and take the square root at
-         the end (so all but 6 lines are identical)
-        '''
-
-        # initialize
-        tracker_entries_avg = []
-        num_unflagged_entries = []
-        for i in range( int(self.forecast_duration / self.history_interval + 1) ):
-            currFhr = i * self.history_interval / 3600
-            tracker_entries_avg.append(
-                trkobj.TrackerDataDiff(currFhr, False, 0, 0, 0)) # initialize all errors to 0
-            # keep track of the number of unflagged entries for each tracker entry
-            num_unflagged_entries.append(0)
-        # accumulate foreach cycle
-        for cycle in self.cycles:
-            #import pdb ; pdb.set_trace()
-            log.debug("Getting TCV error stats for cycle {}"
-                      .format(conversions.epoch_to_yyyymmddHHMM(cycle)))
-            cycle_tcv_errors = self.get_tc_error_stats(cycle).tracker_entries
-            if len(cycle_tcv_errors) == 0:
-                log.warn("No useable TC stats for this cycle. Skipping...")
-                continue
-            assert cycle_tcv_errors[-1].fhr <= self.forecast_duration
-            for i in range(len(cycle_tcv_errors) ):
-                if not cycle_tcv_errors[i].flagged:
-                    # get_tc_error_stats() will only return diapost entries
-                    # that were not flagged, but mean_tcv_errors will have an 
-                    # entry for all history intervals, so use indirect
-                    # addressing
-                    histIntvHrs = self.history_interval / 3600 
-                    fhrIdx = int(cycle_tcv_errors[i].fhr / histIntvHrs)
-                    # "avg" is actually a running sum of square errors, for now
-                    tracker_entries_avg[fhrIdx].track_error += \
-                            (cycle_tcv_errors[i].track_error)**2
-                    tracker_entries_avg[fhrIdx].maxwind_error += \
-                            (cycle_tcv_errors[i].maxwind_error)**2
-                    tracker_entries_avg[fhrIdx].mslp_error += \
-                            (cycle_tcv_errors[i].mslp_error)**2
-                    num_unflagged_entries[fhrIdx] += 1
-        # get mean
-        #log.info('Number of unflagged entries: %s' %num_unflagged_entries)
-        for i in range( len(tracker_entries_avg)):
-            # For forecast hours in which all values are flagged, set the value
-            # to the previous fhr's value, to keep the plots smooth. If they're
-            # all flagged for the first forecast hour, set the value to None
-            if num_unflagged_entries[i] == 0:
-                # all entries for this fhr were flagged 
-                if i == 0:
-                    tracker_entries_avg[i].track_error = None
-                    tracker_entries_avg[i].maxwind_error = None
-                    tracker_entries_avg[i].mslp_error = None
-                else:
-                    tracker_entries_avg[i].track_error =\
-                         tracker_entries_avg[i-1].track_error
-                    tracker_entries_avg[i].maxwind_error =\
-                         tracker_entries_avg[i-1].maxwind_error
-                    tracker_entries_avg[i].mslp_error =\
-                         tracker_entries_avg[i-1].mslp_error
-            else:
-                # at least one unflagged flagged
-                tracker_entries_avg[i].track_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].maxwind_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].mslp_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].track_error = sqrt(tracker_entries_avg[i].track_error)
-                tracker_entries_avg[i].maxwind_error = sqrt(tracker_entries_avg[i].maxwind_error)
-                tracker_entries_avg[i].mslp_error = sqrt(tracker_entries_avg[i].mslp_error)
-
-        return (tracker_entries_avg, num_unflagged_entries)
-
+        '''
+        return self.track_cube.get_rms_errors()
 
-    def _testing_get_mean_tc_error_stats(self):
+    def get_tc_error_statistics(self, percentiles=()):
         '''
-        Calculate and return the mean error across all cycles, along the 
-        forecast hours, using the get_tc_error_stats() method
+        Calculate the mean, RMS, median, standard deviation and the given 
+        `percentiles' of the errors across all cycles, along the forecast 
+        hours, using the TrackCube of this dataset. All statistics are 
+        calculated at once, so this should be preferred to calling 
+        get_mean_tc_error_stats() and get_rms_tc_error_stats() separately.
         RETURN A 2-tupple consisting of:
-           1) A list of TrackerDataDiff populated with the mean of the 
-              individual errors, excluding flagged entries
+           1) A dictionary mapping the statistic name ('mean', 'rmse', 
+              'median', 'std' and 'p<N>' for each percentile N) to a list 
+              of TrackerDataDiff populated with the corresponding statistic
+              of the individual errors, excluding flagged entries
            2) Number of unflagged entries
-           The elements in each tupple correspond to the tracker outputs, 
-           so the frequency correponds to self.history_interval
         '''
+        return self.track_cube.get_error_statistics(percentiles)
 
-        # initialize
-        expt_errors_by_fhr = [] # list of TrackerDataDiff 
-        num_unflagged_entries = []
-        for i in range(int(self.forecast_duration / self.history_interval + 1)):
-            currFhr = i * self.history_interval / 3600
-            error_by_fhr.append(
-                trkobj.TrackerDataDiff(currFhr, False, 0, 0, 0))
-            # keep track of the number of unflagged entries for each tracker entry
-            num_unflagged_entries.append(0)
-        # accumulate foreach cycle
-        for cycle in self.cycles:
-            #import pdb ; pdb.set_trace()
-            log.debug("Getting TCV error stats for cycle {}"
-                      .format(conversions.epoch_to_yyyymmddHHMM(cycle)))
-            cycle_tcv_errors = self.get_tc_error_stats(cycle).tracker_entries
-            assert cycle_tcv_errors[-1].fhr <= self.forecast_duration
-            for i in range(len(cycle_tcv_errors) ):
-                if not cycle_tcv_errors[i].flagged:
-                    # get_tc_error_stats() will only return diapost entries
-                    # that were not flagged, but mean_tcv_errors will have an 
-                    # entry for all history intervals, so use indirect
-                    # addressing
-                    histIntvHrs = self.history_interval / 3600 
-                    fhrIdx = int(cycle_tcv_errors[i].fhr / histIntvHrs)
-                    # "avg" is actually a running sum, for now
-                    tracker_entries_avg[fhrIdx].track_error += \
-                            cycle_tcv_errors[i].track_error
-                    tracker_entries_avg[fhrIdx].maxwind_error += \
-                            cycle_tcv_errors[i].maxwind_error
-                    tracker_entries_avg[fhrIdx].mslp_error += \
-                            cycle_tcv_errors[i].mslp_error
-                    num_unflagged_entries[fhrIdx] += 1
-        # get mean
-        #log.info('Number of unflagged entries: %s' %num_unflagged_entries)
-        for i in range( len(tracker_entries_avg)):
-            # For forecast hours in which all values are flagged, set the value
-            # to the previous fhr's value, to keep the plots smooth. If they're
-            # all flagged for the first forecast hour, set the value to None
-            if num_unflagged_entries[i] == 0:
-                if i == 0:
-                    tracker_entries_avg[i].track_error = None
-                    tracker_entries_avg[i].maxwind_error = None
-                    tracker_entries_avg[i].mslp_error = None
-                else:
-                    tracker_entries_avg[i].track_error =\
-                         tracker_entries_avg[i-1].track_error
-                    tracker_entries_avg[i].maxwind_error =\
-                         tracker_entries_avg[i-1].maxwind_error
-                    tracker_entries_avg[i].mslp_error =\
-                         tracker_entries_avg[i-1].mslp_error
-            else:
-                tracker_entries_avg[i].track_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].maxwind_error /= num_unflagged_entries[i]
-                tracker_entries_avg[i].mslp_error /= num_unflagged_entries[i]
+    @property
+    def track_cube(self):
+        '''
+        TrackCube containing the tracker values and errors of all cycles of 
+        this dataset. It is created the first time it is accessed and 
+        recreated if any of the plot_options that affect the tracker data 
+        change.
+        '''
+        cubeKey = (self.plot_options['tracker'],
+                   self.plot_options['plot_flagged_tracker_entries'],
+                   self.plot_options['ignore_land_points'],
+                   tuple(self.cycles))
+        if self._track_cube is None or self._track_cube_key != cubeKey:
+            self._track_cube = self._create_track_cube()
+            self._track_cube_key = cubeKey
+        return self._track_cube
+
+    def _create_track_cube(self):
+        '''
+        Read the tracker data of every cycle and populate a TrackCube with the
+        values and (experiment-truth) errors. The errors are those of the
+        ForecastTrackDiff of each cycle (i.e. the same ones returned by
+        get_tc_error_stats()).
+        The experiment-wide min/max values are updated from the cube.
+        '''
+        cube = TrackCube(self.cycles, self.history_interval,
+                         self.forecast_duration, log=self.log)
+        self._check_truth_track()
+        cycleStats = self.map_cycles(self._get_cycle_value_and_error_stats)
+        for cycle,(expt_cycle_track,fcst_tcv_errors) in \
+                zip(self.cycles, cycleStats):
+            cube.set_track(cycle, expt_cycle_track)
+            if len(fcst_tcv_errors.tracker_entries) > 0:
+                cube.set_errors(cycle, fcst_tcv_errors)
+        for cycle in cube.get_cycles_without_errors():
+            log.warn("No useable TC stats for cycle {}. Skipping..."
+                     .format(conversions.epoch_to_yyyymmddHHMM(cycle)))
+        self._update_min_max_vars(cube)
+        return cube
+
+    @property
+    def truth_index(self):
+        '''
+        TruthIndex of self.truth_track, which is created the first time it
+        is accessed
+        '''
+        if self._truth_index is None or \
+                self._truth_index_track is not self.truth_track:
+            self._truth_index = TruthIndex(self.truth_track)
+            self._truth_index_track = self.truth_track
+        return self._truth_index
+
+    def _get_cycle_value_stats(self, cycle):
+        ''' Same as get_tc_value_stats(), with logging '''
+        log.debug("Getting TCV stats for cycle {}"
+                  .format(conversions.epoch_to_yyyymmddHHMM(cycle)))
+        return self.get_tc_value_stats(cycle)
+
+    def _get_cycle_value_and_error_stats(self, cycle):
+        '''
+        RETURN a 2-tuple containing the ForecastTrack for the given `cycle' 
+        and its ForecastTrackDiff relative to the truth track
+        '''
+        expt_cycle_track = self._get_cycle_value_stats(cycle)
+        return (expt_cycle_track, self._get_track_diff(expt_cycle_track))
 
-        return (tracker_entries_avg, num_unflagged_entries)
+    def map_cycles(self, func, cycles=None):
+        '''
+        Call `func' for each of the given `cycles' (default: self.cycles). 
+        If self.executor is 'thread', up to self.jobs cycles are processed
+        concurrently.
+        RETURN a list containing the value returned by `func' for each cycle,
+        in the same order as `cycles'
+        '''
+        if cycles is None:
+            cycles = self.cycles
+        numWorkers = min(self.jobs, len(cycles))
+        if self.executor == 'serial' or numWorkers <= 1:
+            return [ func(cycle) for cycle in cycles ]
+        self.log.debug("Processing {} cycles of dataset {} using {} threads"
+                       .format(len(cycles), self.name, numWorkers))
+        pool = ThreadPool(numWorkers)
+        try:
+            return pool.map(func, cycles)
+        finally:
+            pool.close()
+            pool.join()
 
+    def prefetch_tc_stats(self, cycles=None, errors=False, is_absolute=False):
+        '''
+        Read the TC Vitals stats (see get_tc_value_stats()) for the given
+        `cycles' (default: self.cycles) using map_cycles(), so that 
+        subsequent requests for them are served from self.tc_stats_cache
+        @param errors If True, also calculate the errors of each cycle (see
+               get_tc_error_stats()), using the given `is_absolute'
+        '''
+        self.map_cycles(self.get_tc_value_stats, cycles)
+        if errors:
+            self.map_cycles(lambda cycle: self.get_tc_error_stats(
+                                        cycle, is_absolute=is_absolute),
+                            cycles)
+
+    def get_range(self, param, is_absolute=False, include_flagged=None):
+        '''
+        RETURN the (min,max) of the given `param' (e.g. 'mslp_value' or 
+        'track_error') across all cycles, from the range index of this 
+        dataset's TrackCube (see TrackCube.get_range_index()). Unlike the 
+        expt_min_*/expt_max_* attributes, this does not require the stats of
+        every cycle to have been requested first.
+        @param is_absolute If True, use the absolute values of the errors
+        @param include_flagged Whether to consider flagged entries. By 
+               default, they are considered for errors but not for values,
+               as done for the expt_min_*/expt_max_* attributes
+        @raise Exception if there are no entries for `param'
+        '''
+        if include_flagged is None:
+            include_flagged = param.endswith('_error')
+        (minVal, maxVal) = self.track_cube.get_range_index(is_absolute)\
+                                            [(param, include_flagged)]
+        if minVal is None:
+            raise Exception('Experiment {} has no values for {}'
+                            .format(self.name, param))
+        return (minVal, maxVal)
+
+    def _update_min_max_vars(self, cube):
+        '''
+        (Re)set the experiment-wide min/max values using the values and 
+        errors contained in the given TrackCube
+        '''
+        for param in ('mslp_value', 'maxwind_value'):
+            (minVal, maxVal) = cube.get_value_range(param)
+            self._update_min_max_var(param, minVal, maxVal)
+        for param in ('track_error', 'maxwind_error', 'mslp_error'):
+            (minVal, maxVal) = cube.get_error_range(param)
+            self._update_min_max_var(param, minVal, maxVal)
+
+    def _update_min_max_var(self, param, minVal, maxVal):
+        if minVal is not None and minVal < getattr(self, '_expt_min_' + param):
+            setattr(self, '_expt_min_' + param, minVal)
+        if maxVal is not None and maxVal > getattr(self, '_expt_max_' + param):
+            setattr(self, '_expt_max_' + param, maxVal)
 
     def get_tc_error_stats(self, cycle, is_absolute=False):
         '''
@@ -410,40 +423,81 @@ class ExperimentDataset(object):
         @param is_absolute If True, calculate absolute error. Otherwise do
                            Experiment-Best
         '''
-        if self.truth_track is None or not self.truth_track.tracker_entries:
-            raise Exception(("self.truth_track does not contain any data. Is "
-                        "it set correctly in the configuration and passed to "
-                        "the constructor?".format()))
+        cacheKey = self._tc_stats_cache_key(cycle, is_absolute)
+        fcst_tcv_errors = self.tc_stats_cache.get(cacheKey)
+        if fcst_tcv_errors is not None:
+            return fcst_tcv_errors
         expt_cycle_track = self.get_tc_value_stats(cycle)
-        fcst_tcv_errors = trkobj.ForecastTrackDiff(expt_cycle_track, 
-                                                   self.truth_track,
-                                                   absoluteTimeDiff=True,
-                                                   absolute=is_absolute)
+        fcst_tcv_errors = self._get_track_diff(expt_cycle_track, is_absolute)
+        self.tc_stats_cache.put(cacheKey, fcst_tcv_errors)
         # (re)set experiment min/max error values
-        for currFhrError in fcst_tcv_errors.tracker_entries:
-            if self._expt_min_track_error > currFhrError.track_error: 
-                self._expt_min_track_error = currFhrError.track_error
-            if self._expt_max_track_error < currFhrError.track_error: 
-                self._expt_max_track_error = currFhrError.track_error
-            if self._expt_min_maxwind_error > currFhrError.maxwind_error: 
-                self._expt_min_maxwind_error = currFhrError.maxwind_error
-            if self._expt_max_maxwind_error < currFhrError.maxwind_error:
-                self._expt_max_maxwind_error = currFhrError.maxwind_error
-            if self._expt_min_mslp_error > currFhrError.mslp_error:
-                self._expt_min_mslp_error = currFhrError.mslp_error
-            if self._expt_max_mslp_error < currFhrError.mslp_error: 
-                self._expt_max_mslp_error = currFhrError.mslp_error
+        with self._min_max_lock:
+            for currFhrError in fcst_tcv_errors.tracker_entries:
+                if self._expt_min_track_error > currFhrError.track_error: 
+                    self._expt_min_track_error = currFhrError.track_error
+                if self._expt_max_track_error < currFhrError.track_error: 
+                    self._expt_max_track_error = currFhrError.track_error
+                if self._expt_min_maxwind_error > currFhrError.maxwind_error: 
+                    self._expt_min_maxwind_error = currFhrError.maxwind_error
+                if self._expt_max_maxwind_error < currFhrError.maxwind_error:
+                    self._expt_max_maxwind_error = currFhrError.maxwind_error
+                if self._expt_min_mslp_error > currFhrError.mslp_error:
+                    self._expt_min_mslp_error = currFhrError.mslp_error
+                if self._expt_max_mslp_error < currFhrError.mslp_error: 
+                    self._expt_max_mslp_error = currFhrError.mslp_error
 
         return fcst_tcv_errors
 
+    def _get_track_diff(self, expt_cycle_track, is_absolute=False):
+        '''
+        RETURN a ForecastTrackDiff of the given ForecastTrack relative to 
+        self.truth_track
+        '''
+        self._check_truth_track()
+        return trkobj.ForecastTrackDiff(expt_cycle_track, 
+                                        self.truth_track,
+                                        absoluteTimeDiff=True,
+                                        absolute=is_absolute)
+
+    def _check_truth_track(self):
+        ''' Ensure self.truth_track is set and contains entries '''
+        if self.truth_track is None or not self.truth_track.tracker_entries:
+            raise Exception(("self.truth_track does not contain any data. Is "
+                        "it set correctly in the configuration and passed to "
+                        "the constructor?".format()))
+
     def get_tc_value_stats(self, cycle):
         '''
         Generic method for getting TC Vitals stats for the given `cycle`.
         The `cycle` is the seconds-since-epoch corresponding to the cycle date.
         The values will be obtained using a separate method corresponding to the tracker specified in
         self.plot_options['tracker'].
+        The returned objects are cached in self.tc_stats_cache, so they should
+        not be modified.
         @return a [ForecastTrack] object for the given cycle.
         '''
+        cacheKey = self._tc_stats_cache_key(cycle)
+        cycle_track = self.tc_stats_cache.get(cacheKey)
+        if cycle_track is None:
+            cycle_track = self._read_tc_value_stats(cycle)
+            self.tc_stats_cache.put(cacheKey, cycle_track)
+        return cycle_track
+
+    def _tc_stats_cache_key(self, cycle, is_absolute=None):
+        '''
+        RETURN the key of self.tc_stats_cache for the given `cycle' and 
+        current plot_options. For the value stats, `is_absolute' is None.
+        '''
+        return (cycle, self.plot_options['tracker'],
+                self.plot_options['plot_flagged_tracker_entries'],
+                self.plot_options['ignore_land_points'], is_absolute)
+
+    def _read_tc_value_stats(self, cycle):
+        '''
+        Read the TC Vitals stats for the given `cycle', using the method
+        corresponding to self.plot_options['tracker']. 
+        See get_tc_value_stats()
+        '''
         if self.plot_options['tracker'] == 'diapost':
             return self.get_experiment_forecast_diapost_data(
                self.path,
@@ -485,19 +539,19 @@ class ExperimentDataset(object):
         self.log.debug('Reading Diapost data for dataset %s, cycle time %s'
                   %(self.name, cycle))
         diapost_atcf = self.products[DIAPOST_TRK_PROD].get_path(cycle)
-        cycle_diapost_track =\
-            trkutils.get_diapost_track_data(diapost_atcf, 
+        parserOptions = {'tracker' : 'diapost', 
+                         'include_flagged' : include_flagged_entries,
+                         'duration' : duration,
+                         'skip_land_points' : self.plot_options['ignore_land_points']}
+        cycle_diapost_track = self._parse_track_file(
+            [diapost_atcf], parserOptions,
+            lambda: trkutils.get_diapost_track_data(diapost_atcf, 
                                             include_flagged_entries, 
                                             None, 
                                             duration,
-                                            skip_land_points=self.plot_options['ignore_land_points'])  # TODO pass in logger
+                                            skip_land_points=self.plot_options['ignore_land_points']))  # TODO pass in logger
         # set global attributes
-        for trackData in [ c for c in cycle_diapost_track.get_tracker_entries() if not c.flagged]:
-        #for trackData in cycle_diapost_track.get_tracker_entries():
-            if trackData.mslp_value < self._expt_min_mslp_value: self._expt_min_mslp_value = trackData.mslp_value
-            if trackData.mslp_value > self._expt_max_mslp_value: self._expt_max_mslp_value = trackData.mslp_value
-            if trackData.maxwind_value < self._expt_min_maxwind_value: self._expt_min_maxwind_value = trackData.maxwind_value
-            if trackData.maxwind_value > self._expt_max_maxwind_value: self._expt_max_maxwind_value = trackData.maxwind_value
+        self._update_value_min_max_vars(cycle_diapost_track)
 
         return cycle_diapost_track
 
@@ -526,24 +580,49 @@ class ExperimentDataset(object):
             flaggedEntriesExist = False
             include_flagged_entries = False
             flaggedEntriesFile = None
-        cycle_track = trkutils.get_gfdltrk_track_data(trkFile,
+        parserOptions = {'tracker' : 'gfdl', 
+                         'include_flagged' : include_flagged_entries,
+                         'duration' : duration,
+                         'skip_land_points' : self.plot_options['ignore_land_points']}
+        cycle_track = self._parse_track_file(
+            [trkFile, flaggedEntriesFile], parserOptions,
+            lambda: trkutils.get_gfdltrk_track_data(trkFile,
                                                       flaggedEntriesFile,
                                                       include_flagged_entries,
                                                       self.log,
                                                       duration,
-                                                      skip_land_points=self.plot_options['ignore_land_points'])
-        for trackData in [ c for c in cycle_track.get_tracker_entries() if not c.flagged]:
-            if trackData.mslp_value < self._expt_min_mslp_value: 
-                self._expt_min_mslp_value = trackData.mslp_value
-            if trackData.mslp_value > self._expt_max_mslp_value: 
-                self._expt_max_mslp_value = trackData.mslp_value
-            if trackData.maxwind_value < self._expt_min_maxwind_value: 
-                self._expt_min_maxwind_value = trackData.maxwind_value
-            if trackData.maxwind_value > self._expt_max_maxwind_value: 
-                self._expt_max_maxwind_value = trackData.maxwind_value
+                                                      skip_land_points=self.plot_options['ignore_land_points']))
+        self._update_value_min_max_vars(cycle_track)
 
         return cycle_track
 
+    def _parse_track_file(self, paths, parserOptions, parse_func):
+        '''
+        RETURN the ForecastTrack parsed from the given tracker file `paths'
+        by `parse_func'. If a track cache directory is configured, the 
+        parsed track is taken from/stored in the TrackFileCache.
+        '''
+        if self.track_file_cache is None:
+            return parse_func()
+        return self.track_file_cache.get_or_parse(paths, parserOptions,
+                                                  parse_func)
+
+    def _update_value_min_max_vars(self, cycle_track):
+        '''
+        (Re)set the experiment-wide min/max values using the unflagged 
+        entries of the given ForecastTrack
+        '''
+        with self._min_max_lock:
+            for trackData in [ c for c in cycle_track.get_tracker_entries() if not c.flagged]:
+                if trackData.mslp_value < self._expt_min_mslp_value: 
+                    self._expt_min_mslp_value = trackData.mslp_value
+                if trackData.mslp_value > self._expt_max_mslp_value: 
+                    self._expt_max_mslp_value = trackData.mslp_value
+                if trackData.maxwind_value < self._expt_min_maxwind_value: 
+                    self._expt_min_maxwind_value = trackData.maxwind_value
+                if trackData.maxwind_value > self._expt_max_maxwind_value: 
+                    self._expt_max_maxwind_value = trackData.maxwind_value
+
     ##
     # Setters/Getters for experiment-wide min/max values. Ensures that they are set before returning
     ##
@@ -618,11 +697,16 @@ class PyHwrfExperimentDataset(ExperimentDataset):
     A PyHwrfExperimentDataset encapsulates the functionality for 
     retrieving products generated with the PyHWRF system
     '''
+    # Product config file (in <os.getcwd()>/conf) specific to the type
+    PRODUCTS_CONFIG_FILE = 'products_pyhwrf.cfg'
+    # Whether the paths of the products include the storm ID
+    USES_STORM_ID = True
     def __init__(self, name, path, start_date, end_date, cycle_frequency,
                  forecast_frequency, forecast_duration, history_interval, 
                  plot_options, truth_track=None,
                  stormId=None, best_track_path=None,
-                 exptTypeConfigFile=None, genericConfigFile=None):
+                 exptTypeConfigFile=None, genericConfigFile=None,
+                 jobs=1, executor='thread'):
         '''
         Instantiate a PyHwrfExperimentDataset. The parameters passed in are
         the same as those for the parent class ExperimentDataset, with the 
@@ -634,7 +718,7 @@ class PyHwrfExperimentDataset(ExperimentDataset):
         if exptTypeConfigFile is None:
             exptTypeConfigFile = os.path.join(os.getcwd(), 
                                               'conf', 
-                                              'products_pyhwrf.cfg')
+                                              self.PRODUCTS_CONFIG_FILE)
         super(PyHwrfExperimentDataset, self).__init__(
                        name=name, path=path, start_date=start_date, 
                        end_date=end_date, cycle_frequency=cycle_frequency,
@@ -645,12 +729,9 @@ class PyHwrfExperimentDataset(ExperimentDataset):
                        truth_track=truth_track,
                        storm_id=stormId,
                        best_track_path=best_track_path,
-                       genericConfigFile=genericConfigFile)
-        # HWRFConfig does not check existance of the config file 
-        if not os.path.exists(exptTypeConfigFile):
-            raise Exception("Config file %s does not exist" 
-                             %exptTypeConfigFile)
-        self.conf.read(exptTypeConfigFile)
+                       genericConfigFile=genericConfigFile,
+                       jobs=jobs, executor=executor,
+                       exptTypeConfigFile=exptTypeConfigFile)
         self.set_paths()
     
     
@@ -659,10 +740,13 @@ class DaffyExperimentDataset(ExperimentDataset):
     A DaffyExperimentDataset encapsulates the functionality for 
     retrieving products generated with the DAFFY system
     '''
+    # Product config file (in <os.getcwd()>/conf) specific to the type
+    PRODUCTS_CONFIG_FILE = 'products_daffy.cfg'
     def __init__(self, name, path, start_date, end_date, cycle_frequency,
                  forecast_frequency, forecast_duration, history_interval, 
                  plot_options, truth_track=None,
-                 exptTypeConfigFile=None, genericConfigFile=None):
+                 exptTypeConfigFile=None, genericConfigFile=None,
+                 jobs=1, executor='thread'):
         '''
         Instantiate a DaffyExperimentDataset. The parameters passed in are
         the same as those for the parent class ExperimentDataset, with the 
@@ -674,7 +758,7 @@ class DaffyExperimentDataset(ExperimentDataset):
         if exptTypeConfigFile is None:
             exptTypeConfigFile = os.path.join(os.getcwd(), 
                                               'conf', 
-                                              'products_daffy.cfg')
+                                              self.PRODUCTS_CONFIG_FILE)
         super(DaffyExperimentDataset, self).__init__(
                        name=name, path=path, start_date=start_date, 
                        end_date=end_date, cycle_frequency=cycle_frequency,
@@ -683,12 +767,9 @@ class DaffyExperimentDataset(ExperimentDataset):
                        history_interval=history_interval,
                        plot_options=plot_options, 
                        truth_track=truth_track,
-                       genericConfigFile=genericConfigFile)
-        # HWRFConfig does not check existance of the config file 
-        if not os.path.exists(exptTypeConfigFile):
-            raise Exception("Config file %s does not exist" 
-                             %exptTypeConfigFile)
-        self.conf.read(exptTypeConfigFile)
+                       genericConfigFile=genericConfigFile,
+                       jobs=jobs, executor=executor,
+                       exptTypeConfigFile=exptTypeConfigFile)
         self.set_paths()
 
 ##
@@ -697,11 +778,16 @@ class NmmbAutorunnerExperimentDataset(ExperimentDataset):
     A NmmbAutorunnerExperimentDataset encapsulates the functionality for 
     retrieving products generated with the NMM-B autorunner
     '''
+    # Product config file (in <os.getcwd()>/conf) specific to the type
+    PRODUCTS_CONFIG_FILE = 'products_nmmb_autorunner.cfg'
+    # Whether the paths of the products include the storm ID
+    USES_STORM_ID = True
     def __init__(self, name, path, start_date, end_date, cycle_frequency,
                  forecast_frequency, forecast_duration, history_interval, 
                  plot_options, truth_track=None,
                  stormId=None,
-                 exptTypeConfigFile=None, genericConfigFile=None):
+                 exptTypeConfigFile=None, genericConfigFile=None,
+                 jobs=1, executor='thread'):
         '''
         Instantiate a NmmbAutorunnerExperimentDataset. The parameters passed in are
         the same as those for the parent class ExperimentDataset, with the 
@@ -713,7 +799,7 @@ class NmmbAutorunnerExperimentDataset(ExperimentDataset):
         if exptTypeConfigFile is None:
             exptTypeConfigFile = os.path.join(os.getcwd(), 
                                               'conf', 
-                                              'products_nmmb_autorunner.cfg')
+                                              self.PRODUCTS_CONFIG_FILE)
         super(NmmbAutorunnerExperimentDataset, self).__init__(
                        name=name, path=path, start_date=start_date, 
                        end_date=end_date, cycle_frequency=cycle_frequency,
@@ -723,12 +809,9 @@ class NmmbAutorunnerExperimentDataset(ExperimentDataset):
                        plot_options=plot_options, 
                        truth_track=truth_track,
                        genericConfigFile=genericConfigFile,
+                       jobs=jobs, executor=executor,
+                       exptTypeConfigFile=exptTypeConfigFile,
                        storm_id=stormId)
-        # HWRFConfig does not check existance of the config file 
-        if not os.path.exists(exptTypeConfigFile):
-            raise Exception("Config file %s does not exist" 
-                             %exptTypeConfigFile)
-        self.conf.read(exptTypeConfigFile)
         self.set_paths()
 
 ##            
@@ -756,10 +839,14 @@ class ProductFetcher(object):
         self.topdir = topdir
         self.file_pattern = filePattern
         self.storm_id = stormId
+        # maps (cycle, domain, fhr) to the interpolated path pattern
+        self._path_patterns = {}
             
     def get_path(self, cycle, domain=None, fhr=0):
         '''
         Get the path of a product for a given cycle, domain, and forecast hour.
+        Directory listings are cached (see DirectoryIndex), so repeated 
+        lookups do not rescan the directories unless their contents change.
         @param cycle Datetime object representing the cycle 
         @param domain Domain number, if applicable
         @param fhr Forecast hour, if applicable
@@ -782,11 +869,16 @@ class ProductFetcher(object):
             kwargs['storm_id'] = self.storm_id
             kwargs['storm_id_lc'] = self.storm_id.lower()
             kwargs['storm_id_uc'] = self.storm_id.upper()
-        path = os.path.join(self.topdir, self.file_pattern)    
-        # resolve the path
-        pathPattern = self._conf.timestrinterp(self.name, path, fhr,
-                                        cycle,**kwargs)
-        pathGlob = glob.glob(pathPattern)
+        # resolve the path. The interpolated patterns are memoized since the
+        # same products are requested repeatedly
+        patternKey = (cycle, domain, fhr)
+        pathPattern = self._path_patterns.get(patternKey)
+        if pathPattern is None:
+            path = os.path.join(self.topdir, self.file_pattern)    
+            pathPattern = self._conf.timestrinterp(self.name, path, fhr,
+                                            cycle,**kwargs)
+            self._path_patterns[patternKey] = pathPattern
+        pathGlob = _directory_index.glob(pathPattern)
         if len(pathGlob) == 1:
             return pathGlob[0]
         elif len(pathGlob) == 0:
@@ -795,6 +887,150 @@ class ProductFetcher(object):
             raise AmbiguousProductException("Pattern {} matched more than one file, "
                                             "namely {}".format(pathPattern, pathGlob))
        
+# Parsed product config files, shared by all ExperimentDatasets. Maps tuples
+# of (path, mtime) of the files read to the SafeConfigParser they were read 
+# into
+_products_conf_templates = {}
+
+def get_products_conf(configFiles):
+    '''
+    RETURN an HWRFConfig containing the settings of the given `configFiles',
+    which are read in order. Files are only parsed the first time a given 
+    set of files is requested (or if any of them has been modified since). 
+    Each call returns a separate copy of the settings, so the caller is free 
+    to modify it (e.g. add its [dynamic] section).
+    '''
+    key = tuple( (f, os.path.getmtime(f)) for f in configFiles )
+    template = _products_conf_templates.get(key)
+    if template is None:
+        template = ConfigParser.SafeConfigParser()
+        template.optionxform = str # as done by hwrf.config.from_file()
+        template.read(configFiles)
+        _products_conf_templates[key] = template
+    # copying the parsed settings is much cheaper than parsing the files
+    # again, and keeps the template from being modified
+    defaults = template.defaults()
+    conf = ConfigParser.SafeConfigParser(defaults=dict(defaults))
+    conf.optionxform = str
+    for section in template.sections():
+        conf.add_section(section)
+        for (option, value) in template.items(section, raw=True):
+            # items() includes the defaults
+            if option in defaults and defaults[option] == value:
+                continue
+            # set values as read(), i.e. without checking their 
+            # interpolation syntax, as SafeConfigParser.set() does
+            ConfigParser.RawConfigParser.set(conf, section, option, value)
+    return HWRFConfig(conf)
+
+def create_products_conf(path, configFiles, storm_id=None):
+    '''
+    RETURN the HWRFConfig used to resolve the product paths of the experiment
+    at `path': the settings of the given `configFiles' (see 
+    get_products_conf()) plus a [dynamic] section with the experiment 
+    directory and, if given, the `storm_id'
+    '''
+    conf = get_products_conf(configFiles)
+    conf.add_section("dynamic")
+    conf.set_options("dynamic", expt_rundir=path)
+    if storm_id is not None:
+        conf.set_options("dynamic", storm_id=storm_id)
+        conf.set_options("dynamic", storm_id_lc=storm_id.lower())
+        conf.set_options("dynamic", storm_id_uc=storm_id.upper())
+    return conf
+
+def get_product_path(path, configFiles, prodName, cycle, domain=None,
+                     storm_id=None):
+    '''
+    RETURN the path of product `prodName' for the given `cycle' and `domain'
+    of the experiment at `path', whose products are described by the given
+    `configFiles', as an ExperimentDataset using them would (see 
+    ProductFetcher.get_path()), but without instantiating it. This is used 
+    to determine the type of an experiment.
+    @raise MissingProductException, AmbiguousProductException as
+           ProductFetcher.get_path()
+    '''
+    conf = create_products_conf(path, configFiles, storm_id)
+    fetcher = ProductFetcher(prodName, conf, conf.getraw(prodName, 'dir'),
+                             conf.getraw(prodName, 'filePattern'),
+                             stormId=storm_id)
+    return fetcher.get_path(cycle, domain=domain)
+
+class DirectoryIndex(object):
+    '''
+    Resolves glob patterns using cached directory listings. Each directory
+    is listed once and its listing is reused until the directory's 
+    modification time changes, so that resolving many patterns in the same
+    directory (e.g. one product for every cycle) only requires a stat() of
+    the directory rather than a full scan each time.
+    '''
+    def __init__(self):
+        # maps directory path to (mtime, list of entries)
+        self._listings = {}
+
+    def listdir(self, dirPath):
+        '''
+        RETURN the entries of `dirPath' (like os.listdir()), or an empty
+        list if it is not a directory
+        '''
+        try:
+            mtime = os.stat(dirPath).st_mtime
+        except OSError:
+            self._listings.pop(dirPath, None)
+            return []
+        cached = self._listings.get(dirPath)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            entries = os.listdir(dirPath)
+        except OSError:
+            return []
+        self._listings[dirPath] = (mtime, entries)
+        return entries
+
+    def glob(self, pattern):
+        '''
+        RETURN a list of paths matching `pattern', with the same semantics
+        as glob.glob()
+        '''
+        if not glob.has_magic(pattern):
+            return [pattern] if os.path.lexists(pattern) else []
+        dirName, baseName = os.path.split(pattern)
+        if not dirName:
+            dirs = [os.curdir]
+        elif glob.has_magic(dirName):
+            dirs = self.glob(dirName)
+        else:
+            dirs = [dirName]
+        matches = []
+        for d in dirs:
+            if glob.has_magic(baseName):
+                names = fnmatch.filter(self.listdir(d), baseName)
+                if not baseName.startswith('.'):
+                    names = [ n for n in names if not n.startswith('.') ]
+            elif os.path.lexists(os.path.join(d, baseName)):
+                names = [baseName]
+            else:
+                names = []
+            if dirName:
+                matches.extend([ os.path.join(d, n) for n in names ])
+            else:
+                matches.extend(names)
+        return matches
+
+# Directory listings shared by all ProductFetchers
+_directory_index = DirectoryIndex()
+
+def _track_sizeof(track):
+    '''
+    RETURN the approximate size, in bytes, of the given ForecastTrack or 
+    ForecastTrackDiff, including its tracker entries
+    '''
+    size = sys.getsizeof(track)
+    for entry in track.tracker_entries:
+        size += sys.getsizeof(entry) + sys.getsizeof(entry.__dict__)
+    return size
+
 class MissingProductException(Exception):
     def __init__(self, path):
         self.path = path
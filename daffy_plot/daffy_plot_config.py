@@ -7,10 +7,15 @@ import logging
 from odict import OrderedDict
 import glob # only need this temporarily, for the best_track_hack
 import re
+import hashlib
 
 from daffy_dataset import DaffyExperimentDataset, PyHwrfExperimentDataset
 from daffy_dataset import NmmbAutorunnerExperimentDataset
 from daffy_dataset import AmbiguousProductException, MissingProductException
+from daffy_dataset import EXECUTORS, COMMON_PRODUCTS_CONFIG_FILE
+from daffy_dataset import get_product_path
+from truth_index import TruthIndex
+from track_cube import ERROR_STATISTICS, percentile_name, parse_percentile_name
 
 from nwpy.dateutils  import conversions # only needed temp. for best_track hack
 from pycane.postproc.tracker import objects as trkobj
@@ -20,6 +25,21 @@ from pycane.postproc.tracker import utils as trkutils
 Provides an interface between the config file and the runtime environment
 '''
 
+# Supported experiment types, in the order they are tried when the type
+# of an experiment is not known
+EXPERIMENT_TYPES = ('daffy', 'pyhwrf', 'nmmb_autorunner')
+# The product (and domain) whose existance for the last cycle indicates 
+# that an experiment is of a given type
+EXPERIMENT_TYPE_PROBES = {'daffy' : ('gfdltrk_track', None),
+                          'pyhwrf' : ('gfdltrk_track', None),
+                          'nmmb_autorunner' : ('diapost_track_domSpecific', 2)}
+# ExperimentDataset subclass of each experiment type
+EXPERIMENT_TYPE_CLASSES = {'daffy' : DaffyExperimentDataset,
+                           'pyhwrf' : PyHwrfExperimentDataset,
+                           'nmmb_autorunner' : NmmbAutorunnerExperimentDataset}
+# Subdirectory of the cache_dir in which the experiment types are recorded
+EXPERIMENT_TYPE_CACHE_SUBDIR = 'experiment_types'
+
 class DaffyPlotConfig:
     DEFAULT_CONFIG_FILE = 'default.cfg'
 
@@ -72,6 +92,8 @@ class DaffyPlotConfig:
            help='Date (of output) to end the processing/product generation on')
         parser.add_option("-d", "--debug-mode", action="store_true", dest="debug_mode", default=False,
            help='Debug mode: Sets log level to be very verbose.')
+        parser.add_option("-j", "--jobs", dest="jobs", type="int",
+           help='Number of cycles of each dataset to process concurrently (overrides "jobs" in the config file)')
         return parser
 
     def parse_cmdline_args(self, parser):
@@ -98,6 +120,13 @@ class DaffyPlotConfig:
             except ValueError:
                 print 'Passed-in end date', options.end_date, 'does not match expected format MM-DD-YYYY hh:mm'
                 sys.exit(1)
+        if options.jobs is not None:
+            if options.jobs < 1:
+                print 'Passed-in number of jobs should be at least 1'
+                sys.exit(1)
+            self.jobs = options.jobs
+            for ds in self.datasets:
+                ds.jobs = options.jobs
         self.debug_mode = options.debug_mode
 
         if self.debug_mode :
@@ -189,6 +218,33 @@ class DaffyPlotConfig:
         self.forecast_duration = config.getfloat(BASIC_CONFIG_SECTION, 'forecast_duration') * 3600.0
         self.history_interval = config.getfloat(BASIC_CONFIG_SECTION, 'history_interval') * 3600.0
         self.tracker = config.get(BASIC_CONFIG_SECTION, 'tracker')
+        # concurrency of the per-cycle data processing of each dataset
+        self.jobs = int(self._getopt(config, BASIC_CONFIG_SECTION, 'jobs', 1))
+        self.executor = self._getopt(config, BASIC_CONFIG_SECTION, 'executor',
+                                     'thread')
+        if not self.executor in EXECUTORS:
+            raise Exception("executor should be one of {}".format(EXECUTORS))
+        # number of processes used for rendering grids of plots
+        self.render_jobs = int(self._getopt(config, BASIC_CONFIG_SECTION, 
+                                            'render_jobs', 1))
+        # number of processes used for encoding and writing PNG images in
+        # the background (0 to save them synchronously)
+        self.image_writer_jobs = int(self._getopt(config, BASIC_CONFIG_SECTION,
+                                                  'image_writer_jobs', 1))
+        # directory for keeping parsed tracker files across runs
+        self.cache_dir = self._getopt(config, BASIC_CONFIG_SECTION, 
+                                      'cache_dir', None)
+        if self.cache_dir is not None:
+            self.cache_dir = os.path.expanduser(self.cache_dir.strip())
+            self.log.debug("Using cache directory {}".format(self.cache_dir))
+            self.track_cache_dir = os.path.join(self.cache_dir, 'tracks')
+            self.basemap_cache_dir = os.path.join(self.cache_dir, 'basemaps')
+            self.map_background_cache_dir = os.path.join(self.cache_dir, 
+                                                         'map_backgrounds')
+        else:
+            self.track_cache_dir = None
+            self.basemap_cache_dir = None
+            self.map_background_cache_dir = None
 
         # storm settings
         self.storm_id = config.get(STORM_CONFIG_SECTION, 'storm_id')
@@ -226,14 +282,38 @@ class DaffyPlotConfig:
 
         # data settings
         self.average_type = config.get(DATA_CONFIG_SECTION, "average_type")
-        if not self.average_type in ('mean', 'rmse'):
-            raise Exception("Average type should be 'mean' or 'rmse'")
+        percentiles = self._getopt(config, DATA_CONFIG_SECTION,
+                                   'error_percentiles', '')
+        self.error_percentiles = self.get_list(percentiles, cast=float) \
+                                 if percentiles.strip() else []
+        for q in self.error_percentiles:
+            if not 0 <= q <= 100:
+                raise Exception("error_percentiles should be in the range "
+                                "[0,100]")
+        averagePercentile = parse_percentile_name(self.average_type)
+        if averagePercentile is not None:
+            self.error_percentiles.append(averagePercentile)
+            self.average_type = percentile_name(averagePercentile)
+        elif not self.average_type in ERROR_STATISTICS:
+            raise Exception("Average type should be one of {} or 'p<N>' for "
+                            "the Nth percentile".format(ERROR_STATISTICS))
         self.difference_type = config.get(DATA_CONFIG_SECTION, "difference_type")
         if not self.difference_type in ("absolute", "relative"):
             raise Exception("Difference type should be 'absolute' or 'relative'")
         self.plot_flagged_tracker_entries = config.getboolean(DATA_CONFIG_SECTION, 'plot_flagged_tracker_entries')
         self.annotate_unflagged_entries = config.getboolean(DATA_CONFIG_SECTION, 'annotate_unflagged_entries')
         self.ignore_land_points = config.getboolean(DATA_CONFIG_SECTION, "ignore_land_points")
+        self.interpolate_truth = self._getopt(config, DATA_CONFIG_SECTION,
+                                              'interpolate_truth', 'False')
+        self.interpolate_truth = self.interpolate_truth.strip().lower() \
+                                 in ('true', 'yes', 'on', '1')
+        # bounds of each dataset's cache of per-cycle TC stats (0 disables it)
+        self.tc_stats_cache_size = int(self._getopt(config, DATA_CONFIG_SECTION,
+                                                    'tc_stats_cache_size', 1024))
+        cacheBytes = self._getopt(config, DATA_CONFIG_SECTION, 
+                                  'tc_stats_cache_bytes', None)
+        self.tc_stats_cache_bytes = None if cacheBytes is None \
+                                    else int(cacheBytes)
         # TODO : Unify the best track and truth track stuff. Leave this one as a
         #       deprecated option
         if self.best_track_db_path is None:
@@ -270,6 +350,10 @@ class DaffyPlotConfig:
         self.hline_at_zero = config.getboolean(PLOT_CONFIG_SECTION, 'add_hline_at_zero')
         # TODO : make this optional, since it will be set in stylesheets anyway
         self.line_width = config.getfloat(PLOT_CONFIG_SECTION, 'line_width')
+        self.decimation_tolerance = float(self._getopt(config,
+                                                       PLOT_CONFIG_SECTION,
+                                                       'decimation_tolerance',
+                                                       0))
         
         # Set Styles. Specifically, set self.style_paths which will be a list
         # containing the paths to the styles to use. For now, this consists
@@ -333,6 +417,10 @@ class DaffyPlotConfig:
         # populate all the boolean settings
         for param in ('draw_coastlines', 'draw_countries', 'get_extents_from_grib'):
             self.map_options[param] = config.getboolean(MAP_CONFIG_SECTION, param)
+        # draw the map decorations as a raster image rendered only once
+        self.map_options['cache_background'] = \
+                self._getopt(config, MAP_CONFIG_SECTION, 'cache_background', 
+                             'False').strip().lower() in ('true', 'yes', 'on', '1')
         #settings with integer values
         for param in ('latitude_line_freq', 'longitude_line_freq',
                       'track_plot_time_indicator_freq'):
@@ -382,81 +470,155 @@ class DaffyPlotConfig:
             plot_options['annotate_unflagged_entries'] = self.annotate_unflagged_entries
             plot_options['hline_at_zero'] = self.hline_at_zero
             plot_options['ignore_land_points'] = self.ignore_land_points 
-            # Determine what system was used to run the experiment
-            # and instantiate either DaffyExperimentDataset or PyHwrfExperimentDataset
-            # For now, simply look for the gfdltrk product, since that should
-            # probably exist for all experiments. 
-            exptTypeFound = False
+            plot_options['tc_stats_cache_size'] = self.tc_stats_cache_size
+            plot_options['tc_stats_cache_bytes'] = self.tc_stats_cache_bytes
+            plot_options['track_cache_dir'] = self.track_cache_dir
+            ds = self._create_dataset(datasets[i], data_paths[i], plot_options)
+            self.datasets.append(ds)
+
+
+    def _create_dataset(self, name, path, plot_options):
+        '''
+        Create the ExperimentDataset for the experiment at `path'. The type 
+        of experiment (i.e. what system was used to run it) is read from
+        the record kept in the cache_dir (see _read_type_sidecar()), if it
+        exists and is still valid. Otherwise, it is determined by 
+        _probe_experiment_type() and recorded, so subsequent runs only
+        create the correct dataset.
+        '''
+        exptType = self._read_type_sidecar(path)
+        if exptType is not None:
+            self.log.debug("Using experiment type '{}' for {} from sidecar "
+                           "file".format(exptType, path))
+        else:
             try:
-                #import pdb ; pdb.set_trace()
-                ds = DaffyExperimentDataset(
-                    name=datasets[i], path=data_paths[i], 
-                    start_date=self.start_date, end_date=self.end_date, 
-                    cycle_frequency=self.cycle_frequency,
-                    forecast_frequency=self.forecast_frequency, 
-                    forecast_duration=self.forecast_duration,
-                    history_interval=self.history_interval, 
-                    plot_options=plot_options, 
-                    truth_track=self.truth_track)
-                p = ds.products['gfdltrk_track'].get_path(cycle=self.end_date)
-                exptTypeFound = True
-                self.log.info("Guessing this is a DAFFY experiment based on "\
-                              "existance of %s" %p)
+                (exptType, probePath) = self._probe_experiment_type(path)
+            except (MissingProductException, AmbiguousProductException):
+                raise Exception("{} : Unable to determine experiment type "
+                                "from the last cycle's tracker output"
+                                "check that path to experiments and that "
+                                " settings in conf/<experiment_type>.cfg "
+                                " are correct".format(name))
+            self._write_type_sidecar(path, exptType, probePath)
+        return self._instantiate_dataset(exptType, name, path, plot_options)
+
+    def _probe_experiment_type(self, path):
+        '''
+        Determine the type of the experiment at `path': the first of the
+        EXPERIMENT_TYPES whose probe product (see EXPERIMENT_TYPE_PROBES)
+        exists for the last cycle. Only the path of each type's probe 
+        product is resolved, using its product config files; no 
+        ExperimentDataset is instantiated.
+        RETURN a 2-tuple consisting of the experiment type and the path of
+        its probe product
+        @raise MissingProductException if no probe product exists
+        '''
+        confDir = os.path.join(os.getcwd(), 'conf')
+        for exptType in EXPERIMENT_TYPES:
+            cls = EXPERIMENT_TYPE_CLASSES[exptType]
+            configFiles = [os.path.join(confDir, COMMON_PRODUCTS_CONFIG_FILE),
+                           os.path.join(confDir, cls.PRODUCTS_CONFIG_FILE)]
+            (prodName, domain) = EXPERIMENT_TYPE_PROBES[exptType]
+            stormId = self.storm_id if cls.USES_STORM_ID else None
+            try:
+                p = get_product_path(path, configFiles, prodName, 
+                                     self.end_date, domain=domain, 
+                                     storm_id=stormId)
             except (MissingProductException, AmbiguousProductException) as e:
-                self.log.info("Assuming it's not a DAFFY experiment due to exc."
-                         "Original exception: {0}".format(e))
-                pass
-            if not exptTypeFound:
-                try:
-                    ds = PyHwrfExperimentDataset(
-                        name=datasets[i], path=data_paths[i], 
-                        start_date=self.start_date, end_date=self.end_date, 
-                        cycle_frequency=self.cycle_frequency,
-                        forecast_frequency=self.forecast_frequency, 
-                        forecast_duration=self.forecast_duration,
-                        history_interval=self.history_interval, 
-                        plot_options=plot_options, 
-                        stormId=self.storm_id,
-                        best_track_path=self.best_track_db_path,
-                        truth_track=self.truth_track)
-                    p = ds.products['gfdltrk_track'].\
-                            get_path(cycle=self.end_date)
-                    self.log.info("Guessing this is a PyHWRF experiment based "\
-                                  "on existance of %s" %p)
-                    exptTypeFound = True
-                except (MissingProductException, AmbiguousProductException):
-                    pass
-            if not exptTypeFound:
-                try:
-                    ds = NmmbAutorunnerExperimentDataset(
-                        name=datasets[i], path=data_paths[i],
-                        start_date=self.start_date, end_date=self.end_date,
-                        cycle_frequency=self.cycle_frequency,
-                        history_interval=self.history_interval,
-                        forecast_frequency=self.forecast_frequency,
-                        forecast_duration=self.forecast_duration,
-                        plot_options=plot_options,
-                        stormId=self.storm_id,
-                        truth_track=self.truth_track,
-                       )
-                    p = ds.products['diapost_track_domSpecific'].\
-                            get_path(cycle=self.end_date, domain=2) 
-                    exptTypeFound = True
-                    self.log.info("Guessing this is an NMM-B autorunner"\
-                                  " experiment based on existance of %s" %p)
-                    # TODO: unhack this. 
-                    self.log.warn("Forcing 'tracker' for this Dataset to diapost, since that is all the NMMB autorunner supports")
-                    plot_options['tracker'] = 'diapost'
-                except (MissingProductException, AmbiguousProductException):
-                    raise Exception("{} : Unable to determine experiment type "
-                                    "from the last cycle's tracker output"
-                                    "check that path to experiments and that "
-                                    " settings in conf/<experiment_type>.cfg "
-                                    " are correct".
-                                    format(datasets[i]))
-                
-            self.datasets.append(ds)
+                self.log.info("Assuming it's not a {} experiment due to exc. "
+                              "Original exception: {}".format(exptType, e))
+                continue
+            self.log.info("Guessing this is a {} experiment based on "
+                          "existance of {}".format(exptType, p))
+            return (exptType, p)
+        raise MissingProductException(path)
 
+    def _instantiate_dataset(self, exptType, name, path, plot_options):
+        '''
+        RETURN an ExperimentDataset of the class corresponding to `exptType',
+        which should be one of the EXPERIMENT_TYPES
+        '''
+        kwargs = dict(name=name, path=path,
+                      start_date=self.start_date, end_date=self.end_date,
+                      cycle_frequency=self.cycle_frequency,
+                      forecast_frequency=self.forecast_frequency,
+                      forecast_duration=self.forecast_duration,
+                      history_interval=self.history_interval,
+                      plot_options=plot_options,
+                      truth_track=self.truth_track,
+                      jobs=self.jobs, executor=self.executor)
+        if exptType == 'daffy':
+            return DaffyExperimentDataset(**kwargs)
+        elif exptType == 'pyhwrf':
+            return PyHwrfExperimentDataset(stormId=self.storm_id,
+                                           best_track_path=self.best_track_db_path,
+                                           **kwargs)
+        elif exptType == 'nmmb_autorunner':
+            # TODO: unhack this. 
+            self.log.warn("Forcing 'tracker' for this Dataset to diapost, since that is all the NMMB autorunner supports")
+            plot_options['tracker'] = 'diapost'
+            return NmmbAutorunnerExperimentDataset(stormId=self.storm_id,
+                                                   **kwargs)
+        else:
+            raise Exception("Unknown experiment type: {}".format(exptType))
+
+    def _get_type_sidecar_path(self, path):
+        '''
+        RETURN the path of the file, in the cache_dir, recording the type of
+        the experiment at `path', or None if no cache_dir is set
+        '''
+        if self.cache_dir is None:
+            return None
+        pathHash = hashlib.md5(os.path.abspath(path)).hexdigest()
+        return os.path.join(self.cache_dir, EXPERIMENT_TYPE_CACHE_SUBDIR, 
+                            pathHash)
+
+    def _read_type_sidecar(self, path):
+        '''
+        RETURN the experiment type recorded for the experiment at `path', or 
+        None if it has not been recorded or the record is no longer valid,
+        i.e. the probe product it was detected from no longer exists or 
+        has been modified (e.g. because the directory was reused for 
+        another experiment)
+        '''
+        sidecar = self._get_type_sidecar_path(path)
+        if sidecar is None:
+            return None
+        try:
+            with open(sidecar) as f:
+                (exptType, probePath, probeMtime) = \
+                        [ l.rstrip('\n') for l in f.readlines() ]
+        except (IOError, ValueError):
+            return None
+        if not exptType in EXPERIMENT_TYPES:
+            self.log.warn("Ignoring invalid experiment type sidecar file {}"
+                          .format(sidecar))
+            return None
+        try:
+            if repr(os.stat(probePath).st_mtime) != probeMtime:
+                return None
+        except OSError:
+            return None
+        return exptType
+
+    def _write_type_sidecar(self, path, exptType, probePath):
+        '''
+        Record the `exptType' of the experiment at `path', which was 
+        detected from the existance of `probePath', in the cache_dir (if 
+        set)
+        '''
+        sidecar = self._get_type_sidecar_path(path)
+        if sidecar is None:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(sidecar)):
+                os.makedirs(os.path.dirname(sidecar))
+            probeMtime = repr(os.stat(probePath).st_mtime)
+            with open(sidecar, 'w') as f:
+                f.write('\n'.join((exptType, probePath, probeMtime)) + '\n')
+        except (IOError, OSError) as e:
+            self.log.debug("Unable to write experiment type sidecar {}: {}"
+                           .format(sidecar, e))
 
     def get_list(self, list_string, cast=None, minValues=-1, maxValues=-1):
         '''
@@ -477,6 +639,16 @@ class DaffyPlotConfig:
             if len(l) > maxValues: raise Exception('Value given [%s] should be at most %i values long' %(list_string, maxValues) )
         return l
 
+    @property
+    def truth_index(self):
+        '''
+        TruthIndex of self.truth_track, which is created the first time it
+        is accessed
+        '''
+        if getattr(self, '_truth_index', None) is None:
+            self._truth_index = TruthIndex(self.truth_track)
+        return self._truth_index
+
     @property
     def nature_track(self):
         logging.info("nature_track is deprecated. Use 'truth_track'")
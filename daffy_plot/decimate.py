@@ -0,0 +1,136 @@
+'''
+Provides routines for reducing the number of points of lines (e.g. dense
+truth tracks) before plotting them, keeping only the points that are
+visually significant at the resolution of the figure. Lines are simplified
+with the Ramer-Douglas-Peucker algorithm in pixel space.
+
+Javier.Delgado@noaa.gov
+'''
+
+import numpy as np
+import matplotlib
+
+
+def rdp_mask(x, y, tolerance):
+    '''
+    RETURN a boolean array indicating which of the points (`x',`y') are kept
+    when simplifying the line through them with the Ramer-Douglas-Peucker
+    algorithm, such that no point is farther than `tolerance' from the
+    simplified line. The first and last points are always kept.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [ (0, len(x) - 1) ]
+    while stack:
+        (start, end) = stack.pop()
+        if end - start < 2:
+            continue
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        xs = x[start+1:end] - x[start]
+        ys = y[start+1:end] - y[start]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dists = np.hypot(xs, ys)
+        else:
+            dists = np.abs(xs * dy - ys * dx) / norm
+        i = np.argmax(dists)
+        if dists[i] > tolerance:
+            idx = start + 1 + i
+            keep[idx] = True
+            stack.append( (start, idx) )
+            stack.append( (idx, end) )
+    return keep
+
+
+def local_extrema(values):
+    '''
+    RETURN the indices of the local minima and maxima of the given `values'
+    (i.e. where the sign of their change flips), including plateau edges
+    '''
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3:
+        return np.arange(len(values))
+    slopes = np.sign(np.diff(values))
+    return np.nonzero(slopes[1:] != slopes[:-1])[0] + 1
+
+
+def decimation_mask(x, y, tolerance, keep_idc=()):
+    '''
+    RETURN a boolean array indicating which of the points (`x',`y') to plot
+    so that the line deviates at most `tolerance' (in the units of `x' and
+    `y', usually pixels) from the original. Points at `keep_idc' (e.g.
+    flagged entries or intensity extrema) and points with missing (NaN)
+    values, along with their neighbors, are always kept. The line is
+    simplified separately between each of these.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[list(keep_idc)] = True
+    missing = np.isnan(x) | np.isnan(y)
+    keep[missing] = True
+    keep[1:][missing[:-1]] = True
+    keep[:-1][missing[1:]] = True
+    keep[0] = keep[-1] = True
+    breaks = np.nonzero(keep)[0]
+    for (start, end) in zip(breaks[:-1], breaks[1:]):
+        if end - start < 2 or missing[start] or missing[end]:
+            continue
+        keep[start:end+1] |= rdp_mask(x[start:end+1], y[start:end+1],
+                                      tolerance)
+    return keep
+
+
+def get_pixels_per_unit(ax, xRange, yRange, equal_aspect=False):
+    '''
+    RETURN a 2-tuple with the number of pixels per x and y data unit of
+    Axes `ax' when showing `xRange' and `yRange' (in data units), at the
+    resolution at which its figure will be saved. If `equal_aspect' is True
+    (e.g. for maps), both are the same, as the axes box shrinks to fit.
+    '''
+    fig = ax.figure
+    dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = fig.dpi
+    (figWidth, figHeight) = fig.get_size_inches() * dpi
+    bounds = ax.get_position(original=True).bounds
+    (width, height) = (bounds[2] * figWidth, bounds[3] * figHeight)
+    xScale = width / xRange if xRange > 0 else 0.
+    yScale = height / yRange if yRange > 0 else 0.
+    if equal_aspect:
+        scales = [ s for s in (xScale, yScale) if s > 0 ]
+        xScale = yScale = min(scales) if scales else 0.
+    return (xScale, yScale)
+
+
+def decimate_line(ax, x, y, tolerance, keep_idc=(), xRange=None,
+                  yRange=None, equal_aspect=False):
+    '''
+    RETURN the indices of the points (`x',`y') to plot on Axes `ax' so that
+    the line deviates at most `tolerance' pixels from the original (see
+    decimation_mask()). The scale is that of showing `xRange' and `yRange'
+    (default: the range of the values) in `ax'. Since the axes limits are
+    usually at least the range of the values, this errs on the side of
+    keeping points.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) < 3 or tolerance <= 0:
+        return np.arange(len(x))
+    if xRange is None:
+        xRange = np.nanmax(x) - np.nanmin(x) if np.isfinite(x).any() else 0.
+    if yRange is None:
+        yRange = np.nanmax(y) - np.nanmin(y) if np.isfinite(y).any() else 0.
+    (xScale, yScale) = get_pixels_per_unit(ax, xRange, yRange,
+                                           equal_aspect=equal_aspect)
+    keep = decimation_mask(x * xScale, y * yScale, tolerance,
+                           keep_idc=keep_idc)
+    return np.nonzero(keep)[0]
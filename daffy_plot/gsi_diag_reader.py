@@ -0,0 +1,571 @@
+'''
+Provides routines for reading the diagnostic ("diag") files written by GSI
+for conventional and radiance observations directly, rather than converting
+them to text with the read_diag_conv/read_diag_rad utilities.
+The diag files are Fortran unformatted sequential files: each record is
+preceded and followed by a 4-byte marker with its length in bytes. The file
+is memory-mapped and the records are decoded with NumPy.
+
+The layouts follow the read_diag utilities under util/Analysis_Utilities of
+the GSI distribution (v3.3). They should be verified with each new release.
+
+It also provides routines for reading the plain text diag files created
+with GsiObTypeDiag.make_plain_text_diag_file() in fixed-size blocks, and
+for writing and reading "column diag" files, a compact binary format for
+exported diagnostics. These consist of a small JSON header (ob type, step,
+date and the name, type and location of each column) followed by the raw
+(optionally zlib-compressed) data of each column, so that columns can be
+read selectively and uncompressed ones can be memory-mapped.
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import gzip
+import zlib
+import json
+import struct
+import numpy as np
+from util import atomic_write
+
+# Default GSI diag files are written with the byte order of the machine
+# that ran GSI, which is often big-endian
+BYTE_ORDERS = ('>', '<')
+
+# 0-based indices of the fields of each conventional ob's info array
+# (`rdiagbuf' in the GSI setup routines)
+CONV_INFO_FIELDS = { 'itype': 0,
+                     'lat': 2,
+                     'lon': 3,
+                     'pres': 5,
+                     'time_delta': 7,   # hours relative to analysis time
+                     'iuse': 11,        # analysis usage flag (1 = used)
+                     'value': 16,       # observed value (u for uv)
+                     'bias': 17,        # o-g (u for uv)
+                     'v_value': 19,     # observed v (uv only)
+                     'v_bias': 20 }     # o-g of v (uv only)
+# Columns of the data returned by read_conv_diag()
+CONV_COLUMNS = ('type', 'station_id') + tuple(sorted(CONV_INFO_FIELDS))
+# 0-based indices of the fields of each radiance ob's info array
+# (`diagbuf' in setuprad)
+RAD_INFO_FIELDS = { 'lat': 0, 'lon': 1, 'elevation': 2, 'time_delta': 3 }
+# 0-based indices of the per-channel fields of each radiance ob
+# (`diagbufchan' in setuprad)
+RAD_CHANNEL_FIELDS = { 'tb_obs': 0, 'omg_bc': 1, 'omg_nbc': 2,
+                       'errinv': 3, 'qc_flag': 4, 'emissivity': 5 }
+# Columns of each line of the plain text diag files, which are written by
+# GsiObTypeDiag.make_plain_text_diag_file() in the format of GSI's 
+# read_diag_conv utility. Lines of wind obs have all of them (the value and
+# bias being those of u), lines of other obs have all but the last two
+TEXT_DIAG_COLUMNS = ('type', 'station_id', 'time_delta', 'lat', 'lon', 'pres',
+                     'iuse', 'value', 'bias', 'v_value', 'v_bias')
+# Ob type of the lines with all of the TEXT_DIAG_COLUMNS
+TEXT_DIAG_WIND_TYPE = 'uv'
+TEXT_DIAG_SEPARATOR = ','
+# Number of (uncompressed) bytes of the plain text diag files parsed at once
+TEXT_DIAG_BLOCK_SIZE = 8 * 1024 * 1024
+# Column diag files start with the magic string, the format version and the
+# length of the JSON header. The data of each column starts at a multiple
+# of COLUMN_DIAG_ALIGNMENT bytes.
+COLUMN_DIAG_MAGIC = 'DAFFYCOL'
+COLUMN_DIAG_VERSION = 1
+COLUMN_DIAG_PREAMBLE = struct.Struct('<8sII')
+COLUMN_DIAG_ALIGNMENT = 64
+COLUMN_DIAG_COMPRESSION_LEVEL = 6
+
+
+class ColumnDiagError(Exception):
+    ''' Raised when a file is not a valid column diag file '''
+    pass
+
+
+class FortranRecordError(Exception):
+    ''' Raised when a file is not a valid Fortran sequential file '''
+    pass
+
+
+class FortranSequentialFile(object):
+    '''
+    Reads the records of a Fortran unformatted sequential file. Records
+    are returned as uint8 arrays backed by a memory map of the file, so
+    they are not copied unless they consist of several sub-records (i.e.
+    records larger than 2GB written by gfortran).
+    '''
+    def __init__(self, path, byte_order=None):
+        '''
+        Instantiate a FortranSequentialFile for the file at `path'. The
+        `byte_order' ('>' or '<') of the record markers and data is
+        determined from the first record if not given.
+        '''
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        self.offset = 0
+        if byte_order is None:
+            byte_order = self._detect_byte_order()
+        self.byte_order = byte_order
+        self.marker_type = np.dtype(byte_order + 'i4')
+
+    def _detect_byte_order(self):
+        '''
+        RETURN the byte order for which the first record's leading and
+        trailing markers are consistent
+        '''
+        for byteOrder in BYTE_ORDERS:
+            markerType = np.dtype(byteOrder + 'i4')
+            if len(self.data) < 8:
+                break
+            length = abs(int(self.data[:4].view(markerType)[0]))
+            end = 4 + length
+            if end + 4 <= len(self.data) and \
+                abs(int(self.data[end:end+4].view(markerType)[0])) == length:
+                return byteOrder
+        raise FortranRecordError("{} is not a Fortran sequential file"
+                                 .format(self.path))
+
+    def _read_marker(self, offset):
+        if offset + 4 > len(self.data):
+            raise FortranRecordError("Truncated record at byte {} of {}"
+                                     .format(offset, self.path))
+        return int(self.data[offset:offset+4].view(self.marker_type)[0])
+
+    def at_end(self):
+        ''' RETURN True if there are no more records '''
+        return self.offset >= len(self.data)
+
+    def read_record(self):
+        ''' RETURN the next record, as a uint8 array '''
+        parts = []
+        while True:
+            leading = self._read_marker(self.offset)
+            length = abs(leading)
+            start = self.offset + 4
+            end = start + length
+            if abs(self._read_marker(end)) != length:
+                raise FortranRecordError("Inconsistent record markers at "
+                                         "byte {} of {}"
+                                         .format(self.offset, self.path))
+            parts.append(self.data[start:end])
+            self.offset = end + 4
+            # gfortran splits records larger than 2GB into sub-records,
+            # whose leading markers are negative except for the last one
+            if leading >= 0:
+                break
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def read_uniform_records(self):
+        '''
+        Read all remaining records at once, provided they all have the same
+        length (e.g. one record per observation).
+        RETURN a 2-d uint8 array with one row per record, or None (without
+        reading anything) if the records do not have the same length
+        '''
+        remaining = self.data[self.offset:]
+        if len(remaining) == 0:
+            return np.empty((0, 0), dtype=np.uint8)
+        length = self._read_marker(self.offset)
+        if length < 0 or len(remaining) % (length + 8) != 0:
+            return None
+        rows = remaining.reshape(-1, length + 8)
+        markers = np.concatenate((rows[:, :4], rows[:, -4:]))
+        markers = np.ascontiguousarray(markers).view(self.marker_type)
+        if not (markers == length).all():
+            return None
+        self.offset = len(self.data)
+        return rows[:, 4:-4]
+
+    def unpack(self, record, fields):
+        '''
+        Decode the given `record' according to the given `fields', a list
+        of (name, format) tuples (e.g. ('nobs', 'i4')) with formats in the
+        byte order of this file. Fields past the end of the record are not
+        decoded.
+        RETURN a dictionary mapping the names of the decoded fields to
+        their values
+        '''
+        ret = {}
+        offset = 0
+        for (name, fmt) in fields:
+            dtype = np.dtype(fmt if fmt.startswith('S')
+                             else self.byte_order + fmt)
+            if offset + dtype.itemsize > len(record):
+                break
+            value = record[offset:offset+dtype.itemsize].view(dtype)[0]
+            if fmt.startswith('S'):
+                value = value.strip()
+            else:
+                value = value.item()
+            ret[name] = value
+            offset += dtype.itemsize
+        return ret
+
+
+def read_conv_diag(path, byte_order=None):
+    '''
+    Read the conventional observation diag file at `path', which consists
+    of the analysis date followed by a header record and a data record for
+    each ob type and MPI task that processed observations.
+    RETURN a 2-tuple consisting of the analysis date (YYYYMMDDHH integer)
+    and a dictionary mapping each of the CONV_COLUMNS to an array with one
+    element per observation. The v_value and v_bias of non-uv obs are NaN.
+    '''
+    f = FortranSequentialFile(path, byte_order=byte_order)
+    idate = f.unpack(f.read_record(), [('idate', 'i4')])['idate']
+    infoType = np.dtype(f.byte_order + 'f4')
+    blocks = []
+    while not f.at_end():
+        header = f.unpack(f.read_record(),
+                          [('type', 'S3'), ('nchar', 'i4'), ('ninfo', 'i4'),
+                           ('nobs', 'i4'), ('mype', 'i4'), ('ioff', 'i4')])
+        record = f.read_record()
+        (nchar, ninfo, nobs) = (header['nchar'], header['ninfo'],
+                                header['nobs'])
+        charBytes = 8 * nchar * nobs
+        if len(record) != charBytes + 4 * ninfo * nobs:
+            raise FortranRecordError("Unexpected length of the data record "
+                                     "for ob type '{}' in {}"
+                                     .format(header['type'], path))
+        if nobs == 0:
+            continue
+        stationIds = record[:charBytes].view('S8').reshape(nobs, nchar)[:, 0]
+        info = record[charBytes:].view(infoType).reshape(nobs, ninfo)
+        blocks.append((header['type'], stationIds, info))
+    columns = {}
+    columns['type'] = np.concatenate(
+            [ np.repeat(np.array([t]), len(s)) for (t, s, i) in blocks ]
+            or [ np.empty(0, dtype='S3') ])
+    columns['station_id'] = np.char.strip(np.concatenate(
+            [ s for (t, s, i) in blocks ] or [ np.empty(0, dtype='S8') ]))
+    for (field, idx) in CONV_INFO_FIELDS.iteritems():
+        parts = []
+        for (obType, stationIds, info) in blocks:
+            if idx < info.shape[1] and (not field.startswith('v_')
+                                        or obType == 'uv'):
+                parts.append(info[:, idx].astype(float))
+            else:
+                parts.append(np.empty(info.shape[0]) * np.nan)
+        columns[field] = np.concatenate(parts or [ np.empty(0) ])
+    for field in ('itype', 'iuse'):
+        columns[field] = columns[field].astype(int)
+    return (idate, columns)
+
+
+class RadianceDiag(object):
+    '''
+    Encapsulates the contents of a radiance diag file (see read_rad_diag()):
+     - header: dictionary with the values of the file header (isis, dplat,
+               obstype, jiter, nchanl, npred, idate, ireal, ipchan, iextra,
+               jextra and, for newer versions, idiag, angord, iversion,
+               inewpc and isens)
+     - channels: dictionary mapping each of the channel header fields
+                 (freq, pol, wave, varch, tlap, iuse, nuchan, ich) to an
+                 array with one element per channel
+     - obs: dictionary mapping each of the RAD_INFO_FIELDS to an array with
+            one element per observation
+     - channel_data: dictionary mapping each of the RAD_CHANNEL_FIELDS to
+                     an array of shape (observations, channels)
+    '''
+    def __init__(self, header, channels, obs, channel_data):
+        self.header = header
+        self.channels = channels
+        self.obs = obs
+        self.channel_data = channel_data
+
+    def __len__(self):
+        return len(self.obs['lat'])
+
+
+def read_rad_diag(path, byte_order=None):
+    '''
+    Read the radiance diag file at `path', which consists of a header
+    record, a header record for each channel and a data record for each
+    observation.
+    RETURN a RadianceDiag
+    '''
+    f = FortranSequentialFile(path, byte_order=byte_order)
+    header = f.unpack(f.read_record(),
+                      [('isis', 'S20'), ('dplat', 'S10'), ('obstype', 'S10'),
+                       ('jiter', 'i4'), ('nchanl', 'i4'), ('npred', 'i4'),
+                       ('idate', 'i4'), ('ireal', 'i4'), ('ipchan', 'i4'),
+                       ('iextra', 'i4'), ('jextra', 'i4'), ('idiag', 'i4'),
+                       ('angord', 'i4'), ('iversion', 'i4'),
+                       ('inewpc', 'i4'), ('isens', 'i4')])
+    if not 'jextra' in header:
+        raise FortranRecordError("Unexpected header in {}".format(path))
+    nchanl = header['nchanl']
+    channelFields = [('freq', 'f4'), ('pol', 'f4'), ('wave', 'f4'),
+                     ('varch', 'f4'), ('tlap', 'f4'), ('iuse', 'i4'),
+                     ('nuchan', 'i4'), ('ich', 'i4')]
+    channelRecords = [ f.unpack(f.read_record(), channelFields)
+                       for i in range(nchanl) ]
+    channels = {}
+    for (name, fmt) in channelFields:
+        channels[name] = np.array([ r[name] for r in channelRecords ],
+                                  dtype=(int if fmt == 'i4' else float))
+    records = f.read_uniform_records()
+    if records is None:
+        records = []
+        while not f.at_end():
+            records.append(f.read_record())
+        if len(set(len(r) for r in records)) > 1:
+            raise FortranRecordError("Data records of {} have different "
+                                     "lengths".format(path))
+        records = np.array(records)
+    ireal = header['ireal']
+    extraSize = header['iextra'] * header['jextra']
+    if records.size == 0:
+        # so that all the RAD_CHANNEL_FIELDS are returned, without any obs
+        numValues = ireal + nchanl * len(RAD_CHANNEL_FIELDS) + extraSize
+        records = np.empty((0, 4 * numValues), dtype=np.uint8)
+    values = np.ascontiguousarray(records).view(f.byte_order + 'f4')
+    numPerChannel = max(values.shape[1] - ireal - extraSize, 0) // max(nchanl, 1)
+    obs = dict((k, values[:, i].astype(float))
+               for (k, i) in RAD_INFO_FIELDS.iteritems())
+    chanValues = values[:, ireal:ireal + nchanl * numPerChannel]\
+                   .reshape(len(values), nchanl, numPerChannel)
+    channelData = dict((k, chanValues[:, :, i].astype(float))
+                       for (k, i) in RAD_CHANNEL_FIELDS.iteritems()
+                       if i < numPerChannel)
+    return RadianceDiag(header, channels, obs, channelData)
+
+
+def _get_substrings(chars, starts, ends):
+    '''
+    RETURN a string array with the substrings [`starts',`ends') of the
+    given `chars' (uint8 array), without leading and trailing whitespace
+    '''
+    width = max(int((ends - starts).max()), 1) if len(starts) > 0 else 1
+    idx = starts[:, np.newaxis] + np.arange(width)
+    inside = idx < ends[:, np.newaxis]
+    substrings = np.where(inside, chars[np.minimum(idx, len(chars) - 1)], 0)
+    substrings = substrings.astype(np.uint8).view('S%i' %width).ravel()
+    return np.char.strip(substrings)
+
+
+def parse_text_diag_lines(text):
+    '''
+    Parse the given `text', consisting of complete lines of a plain text
+    diag file (see TEXT_DIAG_COLUMNS), without splitting it into lines:
+    the positions of the line ends and separators are found with NumPy,
+    the two string fields are gathered with them, and all numeric fields
+    are converted at once by np.fromstring().
+    RETURN a dictionary mapping each of the TEXT_DIAG_COLUMNS to an array
+    with one element per line. The v_value and v_bias of non-wind obs are 
+    NaN.
+    Raises a ValueError if a line does not have the number of fields of its
+    ob type or if its numeric fields cannot be parsed.
+    '''
+    text = text.strip('\n')
+    if not text:
+        return dict((name, np.empty(0, dtype=('S1' if i < 2 else
+                                               int if name == 'iuse' else
+                                               float)))
+                    for (i, name) in enumerate(TEXT_DIAG_COLUMNS))
+    text += '\n'
+    chars = np.frombuffer(text, dtype=np.uint8)
+    lineEnds = np.flatnonzero(chars == ord('\n'))
+    lineStarts = np.concatenate(([0], lineEnds[:-1] + 1))
+    separators = np.flatnonzero(chars == ord(TEXT_DIAG_SEPARATOR))
+    firstSeparator = np.searchsorted(separators, lineStarts)
+    numFields = np.searchsorted(separators, lineEnds) - firstSeparator + 1
+    windFields = len(TEXT_DIAG_COLUMNS)
+    badLines = ~np.in1d(numFields, (windFields - 2, windFields))
+    if not badLines.any():
+        sep1 = separators[firstSeparator]
+        sep2 = separators[firstSeparator + 1]
+        columns = {}
+        columns['type'] = _get_substrings(chars, lineStarts, sep1)
+        columns['station_id'] = _get_substrings(chars, sep1 + 1, sep2)
+        isWind = (columns['type'] == TEXT_DIAG_WIND_TYPE)
+        badLines = (numFields != np.where(isWind, windFields, windFields - 2))
+    if badLines.any():
+        raise ValueError("Unrecognized input line in diag file [%s]"
+                         %text.splitlines()[np.flatnonzero(badLines)[0]])
+    # drop the string fields (up to and including the second separator)
+    # of every line and parse the rest as a single list of numbers
+    inStrings = np.zeros(len(chars) + 1, dtype=np.int8)
+    inStrings[lineStarts] = 1
+    inStrings[sep2 + 1] = -1
+    numericChars = chars[np.cumsum(inStrings[:-1], dtype=np.int8) == 0]
+    numericChars[numericChars == ord('\n')] = ord(TEXT_DIAG_SEPARATOR)
+    values = np.fromstring(numericChars[:-1].tostring(),
+                           sep=TEXT_DIAG_SEPARATOR)
+    numValues = numFields - 2
+    if len(values) != numValues.sum():
+        raise ValueError("Unable to parse numeric fields of diag file lines")
+    valueStarts = np.concatenate(([0], np.cumsum(numValues)[:-1]))
+    for (i, name) in enumerate(TEXT_DIAG_COLUMNS[2:]):
+        if i < windFields - 4:
+            columns[name] = values[valueStarts + i]
+        else:
+            columns[name] = np.empty(len(numValues))
+            columns[name].fill(np.nan)
+            columns[name][isWind] = values[valueStarts[isWind] + i]
+    columns['iuse'] = columns['iuse'].astype(int)
+    return columns
+
+
+def iter_text_diag_blocks(path, block_size=TEXT_DIAG_BLOCK_SIZE):
+    '''
+    Read the plain text diag file at `path' (gzipped if its name ends with
+    .gz) in blocks of about `block_size' uncompressed bytes, so that the
+    memory used does not depend on the size of the file.
+    Yield the columns of the complete lines of each block, as returned by
+    parse_text_diag_lines()
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        remainder = ''
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            block = remainder + block
+            end = block.rfind('\n') + 1
+            remainder = block[end:]
+            if end > 0:
+                yield parse_text_diag_lines(block[:end])
+        if remainder.strip():
+            yield parse_text_diag_lines(remainder)
+
+
+def read_text_diag(path, block_size=TEXT_DIAG_BLOCK_SIZE):
+    '''
+    Read the plain text diag file at `path' (see iter_text_diag_blocks()).
+    RETURN a dictionary mapping each of the TEXT_DIAG_COLUMNS to an array
+    with one element per observation
+    '''
+    blocks = list(iter_text_diag_blocks(path, block_size=block_size))
+    if len(blocks) == 0:
+        blocks = [ parse_text_diag_lines('') ]
+    return dict((name, np.concatenate([ b[name] for b in blocks ]))
+                for name in TEXT_DIAG_COLUMNS)
+
+
+def _align(offset):
+    ''' RETURN the first multiple of COLUMN_DIAG_ALIGNMENT >= `offset' '''
+    return -(-offset // COLUMN_DIAG_ALIGNMENT) * COLUMN_DIAG_ALIGNMENT
+
+
+def write_column_diag(path, columns, ob_type, step, date, compress=False):
+    '''
+    Write the given `columns' (a dictionary mapping names to 1-D arrays of
+    numbers or strings with one element per observation) of the diags of
+    `ob_type' for `step' (i.e. 'anl' or 'ges') and `date' (seconds since
+    epoch) to a column diag file at `path'. If `compress' is True, the
+    data of each column is compressed with zlib; otherwise, the columns
+    can be memory-mapped by read_column_diag().
+    '''
+    names = sorted(columns)
+    arrays = [ np.ascontiguousarray(columns[name]) for name in names ]
+    numObs = len(arrays[0]) if arrays else 0
+    header = { 'version': COLUMN_DIAG_VERSION, 'ob_type': ob_type,
+               'step': step, 'date': int(date), 'num_obs': numObs,
+               'columns': [] }
+    data = []
+    offset = 0
+    for (name, array) in zip(names, arrays):
+        if array.ndim != 1 or len(array) != numObs:
+            raise ValueError("Column %s has shape %s instead of (%i,)"
+                             %(name, array.shape, numObs))
+        if array.dtype.kind not in 'biufS':
+            raise ValueError("Column %s has unsupported type %s"
+                             %(name, array.dtype))
+        buf = array.tostring()
+        if compress:
+            buf = zlib.compress(buf, COLUMN_DIAG_COMPRESSION_LEVEL)
+        offset = _align(offset)
+        header['columns'].append({ 'name': name, 'dtype': array.dtype.str,
+                                   'offset': offset, 'nbytes': len(buf),
+                                   'compression': 'zlib' if compress
+                                                  else None })
+        data.append( (offset, buf) )
+        offset += len(buf)
+    headerText = json.dumps(header, sort_keys=True)
+    dataStart = _align(COLUMN_DIAG_PREAMBLE.size + len(headerText))
+    with atomic_write(path) as f:
+        f.write(COLUMN_DIAG_PREAMBLE.pack(COLUMN_DIAG_MAGIC, COLUMN_DIAG_VERSION,
+                                          len(headerText)))
+        f.write(headerText)
+        for (offset, buf) in data:
+            f.seek(dataStart + offset)
+            f.write(buf)
+
+
+def _read_column_diag_header(f, path):
+    '''
+    RETURN the header of the column diag file `f' (see
+    read_column_diag_header()), which is at `path'
+    '''
+    preamble = f.read(COLUMN_DIAG_PREAMBLE.size)
+    if len(preamble) < COLUMN_DIAG_PREAMBLE.size:
+        raise ColumnDiagError("%s is not a column diag file" %path)
+    (magic, version, headerLength) = COLUMN_DIAG_PREAMBLE.unpack(preamble)
+    if magic != COLUMN_DIAG_MAGIC:
+        raise ColumnDiagError("%s is not a column diag file" %path)
+    if version > COLUMN_DIAG_VERSION:
+        raise ColumnDiagError("%s has unsupported format version %i"
+                              %(path, version))
+    header = json.loads(f.read(headerLength))
+    header['ob_type'] = str(header['ob_type'])
+    header['step'] = str(header['step'])
+    for column in header['columns']:
+        column['name'] = str(column['name'])
+        column['dtype'] = np.dtype(str(column['dtype']))
+    header['data_offset'] = _align(COLUMN_DIAG_PREAMBLE.size + headerLength)
+    return header
+
+
+def read_column_diag_header(path):
+    '''
+    RETURN the header of the column diag file at `path': a dictionary with
+    the ob_type, step, date (seconds since epoch) and num_obs, and a list of
+    the columns, each described by a dictionary with its name, dtype, offset
+    and nbytes (relative to data_offset) and compression (None or 'zlib')
+    '''
+    with open(path, 'rb') as f:
+        return _read_column_diag_header(f, path)
+
+
+def read_column_diag(path, columns=None, mmap=True):
+    '''
+    Read the given `columns' (default: all) of the column diag file at
+    `path'. Only the data of these columns is read. If `mmap' is True,
+    uncompressed columns are memory-mapped (read-only) rather than read.
+    RETURN a 2-tuple consisting of the header (see read_column_diag_header())
+    and a dictionary mapping the name of each column to an array
+    '''
+    with open(path, 'rb') as f:
+        header = _read_column_diag_header(f, path)
+        info = dict((c['name'], c) for c in header['columns'])
+        if columns is None:
+            columns = [ c['name'] for c in header['columns'] ]
+        numObs = header['num_obs']
+        data = {}
+        for name in columns:
+            if name not in info:
+                raise KeyError("Column %s is not in %s" %(name, path))
+            column = info[name]
+            offset = header['data_offset'] + column['offset']
+            if column['compression'] is None:
+                if mmap and numObs > 0:
+                    data[name] = np.memmap(path, dtype=column['dtype'],
+                                           mode='r', offset=offset,
+                                           shape=(numObs,))
+                else:
+                    f.seek(offset)
+                    data[name] = np.fromfile(f, dtype=column['dtype'],
+                                             count=numObs)
+            elif column['compression'] == 'zlib':
+                f.seek(offset)
+                buf = zlib.decompress(f.read(column['nbytes']))
+                data[name] = np.frombuffer(buf, dtype=column['dtype'])
+            else:
+                raise ColumnDiagError("Column %s of %s has unsupported "
+                                      "compression %s"
+                                      %(name, path, column['compression']))
+            if len(data[name]) != numObs:
+                raise ColumnDiagError("Column %s of %s is truncated"
+                                      %(name, path))
+    return (header, data)
@@ -7,20 +7,33 @@ from date_utils import epoch_to_yyyymmddHHMM
 import subprocess
 import logging as log
 import sys
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from gsi_diag_reader import read_conv_diag, read_rad_diag, read_text_diag, \
+                            read_column_diag, write_column_diag, \
+                            FortranRecordError
 
 '''
 This module provides methods that encapsulate properties of a GSI run.
 
         contains                 contains
-GsiRun ---------> GsiObTypeDiag ---------->  GsiObservation
+GsiRun ---------> GsiObTypeDiag ---------->  ObservationTable ----> GsiObservation
+  |                    |                          |             (iteration)
   |                    |                          |
-  |                    |                          |
-  |                  build()                (various SubTypes)
-various getters  make_plain_text_diag_file()   to_csv()
+  |                  build()                  filter()        (various SubTypes)
+various getters  make_plain_text_diag_file()                    to_csv()
+                 make_column_diag_file()
                 process_rad_diag_reader_output()
                 process_conv_diag_reader_output()
                    various getters
 
+The GSI-generated diag files are read with the gsi_diag_reader module, as are
+the plain text and column diag files exported with make_plain_text_diag_file()
+and make_column_diag_file(). Column diag files are the fastest to read, so they
+are preferred when present.
+
 TODO: Get more details about the radiance observations. For now, I'm just getting
 the number assimilated. I need a better understanding of how things work.
 e.g. there is a separate iuse for each channel, but I don't know which channel
@@ -33,6 +46,8 @@ DIAG_FILE_PREFIX = 'diag_'
 DIAG_FILE_SUFFIX = ''
 TEXT_DIAG_PREFIX = 'diag_'
 TEXT_DIAG_SUFFIX = '.dat.gz'
+COLUMN_DIAG_PREFIX = 'diag_'
+COLUMN_DIAG_SUFFIX = '.cols'
 
 log.basicConfig( level=log.DEBUG)
 
@@ -44,14 +59,15 @@ class GsiRun(object):
     This class provides high level methods to retrieve obs.
     '''
 
-    def __init__(self, products_dir, date=None, ob_types=None, num_iterations=None,  rundir=None, diag_reader_rad=None, diag_reader_conv=None):
+    def __init__(self, products_dir, date=None, ob_types=None, num_iterations=None,  rundir=None, diag_reader_rad=None, diag_reader_conv=None, jobs=1):
         '''
         Instantiate a GsiRun using product located in the given `products_dir`
         and populate the firstguess_diagnostics and (if applicable) analysis_diagnostics,
         which are lists of GsiObTypeDiag objects.
         The products dir can be any directory containing GSI diagnostics in either the
-        native format produced by GSI or the text-based format created using
-        GsiObTypeDiag::dump_to_ascii
+        native format produced by GSI, the text-based format created using
+        GsiObTypeDiag::make_plain_text_diag_file or the column format created using
+        GsiObTypeDiag::make_column_diag_file (which is preferred if present)
 
         Optional arguments:
            date - The experiment/cycle date, in seconds since epoch.
@@ -63,9 +79,14 @@ class GsiRun(object):
                             If none given, attempt to figure out from namelist or from available
                             diagnostic files
            rundir - The directory where GSI was run, which may be different from where the products are.
+           diag_reader_rad/diag_reader_conv - Paths to the read_diag_rad/read_diag_conv executables,
+                      which are only used for diag files that cannot be read with the gsi_diag_reader
+           jobs - Number of diag files (i.e. ob types and steps) to process concurrently, using a
+                  pool of threads
         '''
 
         self.use_plaintext_diag = False # will be set to True if using plaintext diag files
+        self.use_column_diag = False # will be set to True if using column diag files
 
         self.products_dir = products_dir
         if rundir is None: rundir = self.products_dir
@@ -84,11 +105,26 @@ class GsiRun(object):
         if ob_types: self.ob_types = ob_types
         else: self.ob_types = self._get_obTypes_from_products_dir()
 
-        for obType in self.ob_types:
-            #import pdb ; pdb.set_trace()
-            self.firstguess_diags[obType] = GsiObTypeDiag(self.products_dir, obType, date, GES_DIAGFILE_SUFFIX, self.use_plaintext_diag, diag_reader_conv, diag_reader_rad)
-            if self.is_analysis:
-                self.analysis_diags[obType] = GsiObTypeDiag(self.products_dir, obType, date, ANL_DIAGFILE_SUFFIX, self.use_plaintext_diag, diag_reader_conv, diag_reader_rad )
+        steps = [GES_DIAGFILE_SUFFIX]
+        if self.is_analysis: steps.append(ANL_DIAGFILE_SUFFIX)
+        diagKeys = [ (obType, step) for obType in self.ob_types for step in steps ]
+        build_diag = lambda key: GsiObTypeDiag(self.products_dir, key[0], date, key[1], self.use_plaintext_diag, diag_reader_conv, diag_reader_rad, self.use_column_diag)
+        numWorkers = min(jobs, len(diagKeys))
+        if numWorkers <= 1:
+            diags = [ build_diag(key) for key in diagKeys ]
+        else:
+            log.debug("Processing %i diag files using %i threads" %(len(diagKeys), numWorkers))
+            pool = ThreadPool(numWorkers)
+            try:
+                diags = pool.map(build_diag, diagKeys, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        for ((obType, step), diag) in zip(diagKeys, diags):
+            if step == GES_DIAGFILE_SUFFIX:
+                self.firstguess_diags[obType] = diag
+            else:
+                self.analysis_diags[obType] = diag
 
         @property
         def firstguess_obs(self):
@@ -126,6 +162,13 @@ class GsiRun(object):
             log.info("Guessing this is an analysis run based on existence of text diag files for analysis")
             return 2
 
+        # and with the column diag files
+        pattern = COLUMN_DIAG_PREFIX + "*" + "_" + ANL_DIAGFILE_SUFFIX + "." +  epoch_to_yyyymmddHHMM(self.date) + COLUMN_DIAG_SUFFIX
+        matches = glob.glob(os.path.join(workdir, pattern) )
+        if len(matches) > 0:
+            log.info("Guessing this is an analysis run based on existence of column diag files for analysis")
+            return 2
+
         # assume its ges only
         return 0
 
@@ -133,18 +176,28 @@ class GsiRun(object):
         '''
          RETURN A list of obTypes by looking in self.products_dir for files matching the diag
             file naming convention.
-            First, look for the binary diag files. If none are found, look for the plaintext
-            diag files. If none are found, raise an exception
+            First, look for the column diag files, then for the binary diag files and then for
+            the plaintext diag files. If none are found, raise an exception
             If this is an analysis experiment, use the "_anl" files to get the obTypes.
             Otherwise use the "_ges" files
-            TODO: Create unit test for this (1)with binary diag files (2) plaintext diag files
         '''
+        # the ob type is what is between the prefix and suffix of the file name
+        get_ob_type = lambda path, prefix, suffix: \
+            os.path.basename(path)[len(prefix):-len(suffix)]
         if self.is_analysis:
             diag_step = ANL_DIAGFILE_SUFFIX
             log.info("Since this is an analysis run, will only process ob types for which a diag file was created for the analysis")
         else:
             diag_step = GES_DIAGFILE_SUFFIX
 
+        file_prefix = COLUMN_DIAG_PREFIX
+        file_suffix = "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(self.date) + COLUMN_DIAG_SUFFIX
+        diag_files = glob.glob( os.path.join(self.products_dir, file_prefix + "*" + file_suffix) )
+        if len(diag_files) > 0:
+            self.use_column_diag = True
+            log.debug("Using column diagnostic files")
+            return [ get_ob_type(x, file_prefix, file_suffix) for x in diag_files ]
+
         file_prefix = DIAG_FILE_PREFIX
         file_suffix = "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(self.date) + DIAG_FILE_SUFFIX
         pattern = file_prefix + "*" + file_suffix # diag_cris_npp_anl.200508010600
@@ -152,16 +205,16 @@ class GsiRun(object):
         diag_files = glob.glob( os.path.join(self.products_dir, pattern)  )
         if len(diag_files) > 0:
             log.debug("Using GSI-generated binary diagnostic files")
-            return [ x[x.index(file_prefix)+len(file_prefix):x.index(file_suffix)] for x in diag_files ]
+            return [ get_ob_type(x, file_prefix, file_suffix) for x in diag_files ]
         else: # attempt to find plaintext diag files
             file_prefix = TEXT_DIAG_PREFIX
             file_suffix = "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(self.date) + TEXT_DIAG_SUFFIX
-            pattern = file_prefix + "*" + diag_step + file_suffix
+            pattern = file_prefix + "*" + file_suffix
             diag_files = glob.glob( os.path.join(self.products_dir, pattern  ) )
             if len(diag_files) > 0:
                 self.use_plaintext_diag = True
                 log.debug("Using plaintext diagnostic files")
-                return [ x[x.index(len(file_prefix)):x.index(file_suffix)] for x in diag_files ]
+                return [ get_ob_type(x, file_prefix, file_suffix) for x in diag_files ]
             else:
                 raise Exception("Could not find any diagnostic files")
 
@@ -172,29 +225,34 @@ class GsiObTypeDiag(object):
     This class encapsulates the diagnostics for a specific ob type from a GsiRun.
     It stores everything of interest written in the pe*/diag* files.
     '''
-    def __init__(self, path, ob_type, date, step, use_plaintext_diag=False, diag_reader_conv=None, diag_reader_rad=None):
+    def __init__(self, path, ob_type, date, step, use_plaintext_diag=False, diag_reader_conv=None, diag_reader_rad=None, use_column_diag=False):
         '''
         Instantiate a GsiObTypeDiag object, which will be populated based on diag file
         inside the given `path`. The `ob_type` should correspond to the GSI naming convention,
         which is <obType>_<platform>. The cycle is `date` and step `step` (i.e. 'anl' or 'ges'),
-        If using plaintext diag files to build the object, `use_plaintext_diag` should be True
-        If using binary diag files generated by GSI, the optional arguments diag_reader_conv
-        and diag_reader_rad must be passed in. These point to the executables that extract ob stats
-        from the diag files. THey are included in the GSI distribution under util/Analysis_Utilities.
+        If using plaintext diag files to build the object, `use_plaintext_diag` should be True.
+        If using column diag files, `use_column_diag` should be True
+        Binary diag files generated by GSI are read with the gsi_diag_reader. The optional
+        arguments diag_reader_conv and diag_reader_rad point to the executables that extract ob stats
+        from the diag files, which are only used if the gsi_diag_reader cannot read them (e.g. for
+        diag file layouts of other GSI versions). They are included in the GSI distribution under 
+        util/Analysis_Utilities.
         '''
         self.path = path
         self.ob_type = ob_type
         self.date = date # seconds since epoch
         self.step = step
         self.use_plaintext_diag = use_plaintext_diag
+        self.use_column_diag = use_column_diag
         self.gsi_diag_reader_conv = diag_reader_conv # may be None
         self.gsi_diag_reader_rad = diag_reader_rad # may be None
+        self.radiance_diag = None # RadianceDiag, for radiance ob types
         #import pdb ; pdb.set_trace()
         self.build_obs_list()
 
     @property
     def diag_file_name(self):
-        return get_diag_file_name(self.ob_type, self.step, self.date, self.use_plaintext_diag)
+        return get_diag_file_name(self.ob_type, self.step, self.date, self.use_plaintext_diag, self.use_column_diag)
 
     # TODO : THIS IS no longer needed, may be useful elsewhere
     def _add_obs(self, obs):
@@ -207,10 +265,13 @@ class GsiObTypeDiag(object):
             else: raise Exception("Unknown or unsupported observation type: %s" %ob)
 
 
-    def _create_diag_reader_namelist(self, ob_string, in_file_name, out_file_name):
+    def _create_diag_reader_namelist(self, ob_string, in_file_name, out_file_name, workdir):
+        '''
+        Create the namelist read by the diag reader executables in directory `workdir`
+        '''
         if ob_string == 'conv': suffix = 'conv'
         else: suffix = 'rad'
-        elfilename = 'namelist.' + suffix
+        elfilename = os.path.join(workdir, 'namelist.' + suffix)
         elfile = open(elfilename, 'w')
         elfile.write('&iosetup\n')
         elfile.write("  infilename='%s',\n" %in_file_name)
@@ -304,47 +365,64 @@ class GsiObTypeDiag(object):
         ## or I can just go with the ob-centric approach and output the corresponding channels' stats in each line
 
 
-    #def _extract_gsi_diag(self, diag_file_path, cycle, diag_step, diag_reader_conv, diag_reader_rad, gzip=True):
     def _extract_gsi_diag(self):
         '''
-        Read GSI diag file using a reader, convert entries into GsiObservation objects, and return
-         a list containing these objects
+        Read GSI diag file using the gsi_diag_reader and return an ObservationTable containing
+        its entries. For radiance diags, the RadianceDiag is stored
+        in self.radiance_diag and None is returned (see process_rad_diag_reader_output()).
+        If the file cannot be read and the external diag readers were given, use them instead.
         '''
-        #in_file_name = 'diag_' + ob_string + '_' + diag_step + '.' + epoch_to_yyyymmddHHMM(cycle)
-        intermediate_file_name = 'results_' + self.ob_type + '_' + self.step + '.' + epoch_to_yyyymmddHHMM(self.date)
-        # determine ob type
+        diag_path = os.path.join(self.path, self.diag_file_name)
         log.debug("Processing ob type: %s for step %s" %(self.ob_type, self.step) )
-
-        # create intermediate text file
+        if self.ob_type == 'oz':
+            raise Exception("Not implemented for oz obs")
         try:
-            owd = os.getcwd()
-            os.chdir(self.path)
-        except:
-            log.error("Unable to change to directory: %s" %self.path)
-            sys.exit(13)
+            if self.ob_type == 'conv':
+                (idate, columns) = read_conv_diag(diag_path)
+                return ObservationTable(columns)
+            else: # assume radiance
+                self.radiance_diag = read_rad_diag(diag_path)
+                return None
+        except FortranRecordError as e:
+            if self.gsi_diag_reader_conv is None or self.gsi_diag_reader_rad is None:
+                raise
+            log.warn("Unable to read diag file (%s). Using external diag reader" %e)
+            return self._extract_gsi_diag_with_reader()
 
-        self._create_diag_reader_namelist(self.ob_type, self.diag_file_name, intermediate_file_name)
+    def _extract_gsi_diag_with_reader(self):
+        '''
+        Read GSI diag file using the external reader executables and return an ObservationTable
+        containing its entries
+        '''
+        intermediate_file_name = 'results_' + self.ob_type + '_' + self.step + '.' + epoch_to_yyyymmddHHMM(self.date)
         if self.ob_type == 'conv':
-            ret = subprocess.call([self.gsi_diag_reader_conv], shell=True, stdout=open("/dev/null", 'w') )
+            reader = self.gsi_diag_reader_conv
         elif self.ob_type == 'oz':
             raise Exception("Not implemented for oz obs")
         else: # assume radiance
-            ret = subprocess.call([self.gsi_diag_reader_rad], shell=True, stdout=open("/dev/null", 'w') )
-        # TODO  ensure it returns with exit code 9999    AND    have option of sending output to a file instead of /dev/null
-
-        # process output
-        if self.ob_type == 'conv':
-            obs = self.process_conv_diag_reader_output(intermediate_file_name)
-        else: # assume rad
-            obs = self.process_rad_diag_reader_output(intermediate_file_name)
+            reader = self.gsi_diag_reader_rad
 
+        # The readers look for the namelist in their working directory, so each run of a reader
+        # gets its own scratch directory (with a link to the diag file), which allows running
+        # several of them concurrently
+        scratchDir = tempfile.mkdtemp(prefix='daffy_diag_')
         try:
-            os.chdir(owd)
-        except:
-            log.error("Unable to switch back to original directory: %s" %owd)
-            sys.exit(13)
+            os.symlink(os.path.abspath(os.path.join(self.path, self.diag_file_name)),
+                       os.path.join(scratchDir, self.diag_file_name))
+            self._create_diag_reader_namelist(self.ob_type, self.diag_file_name, intermediate_file_name, scratchDir)
+            # TODO  ensure it returns with exit code 9999    AND    have option of sending output to a file instead of /dev/null
+            with open(os.devnull, 'w') as devnull:
+                ret = subprocess.call([reader], cwd=scratchDir, stdout=devnull)
+
+            # process output
+            intermediate_path = os.path.join(scratchDir, intermediate_file_name)
+            if self.ob_type == 'conv':
+                obs = ObservationTable.from_observations(
+                        self.process_conv_diag_reader_output(intermediate_path))
+            else: # assume rad
+                obs = self.process_rad_diag_reader_output(intermediate_path)
         finally:
-            os.unlink(os.path.join(self.path,intermediate_file_name))
+            shutil.rmtree(scratchDir, ignore_errors=True)
 
         return obs
 
@@ -365,45 +443,36 @@ class GsiObTypeDiag(object):
 
     def _extract_gsi_textdiag(self):
         '''
-        RETURN a GsiObTypeDiag object encapsulating the parameters output in the plain text diag
-                file
-        ARGS
-            - diag_file_path - Path to the diag file
-            - date - Date of experiment, in seconds since epoch
-            - diag_step - 'anl' or 'ges'
-            - TODO : allow for non-gziped files
+        RETURN an ObservationTable with the observations in the plain text diag
+                file. The file is decompressed and parsed in fixed-size blocks 
+                (see gsi_diag_reader.read_text_diag()), so the whole text is 
+                never held in memory.
         '''
-        obs = []
         diag_file_path = os.path.join(self.path, self.diag_file_name)
         if not os.path.exists(diag_file_path):
             raise Exception("Path to diag file does not exist: [%s]" %diag_file_path)
-        with gzip.open(diag_file_path, 'rb') as diagFile:
-            for line in diagFile.readlines():
-                # TODO : verify line numbers and limits
-                toks = line.strip().split()
-                ob_var = toks[0]
-                ob_meta = toks[1] # could be platform,subtype,etc.
-                (lat,lon,pres,time_delta) = (float(x) for x in toks[2:6])
-                iuse = int(toks[6])
-                if self.ob_type == 'conv':
-                    if not (9,11) in len(toks): # 11 for uv, 9 for others: # TODO get exact size
-                        raise Exception("Unrecognized input line in diag file [%s] " %diag_file_name)
-                    if len(toks) == 9: # non-uv
-                        assert toks[0] not in ('u', 'v')
-                        obs.append(GsiConventionalObservation(ob_var, ob_meta, time_delta, lat, lon, pres, iuse,
-                                                float(toks[7]), float(toks[8])))
-                    elif len(toks) == 11: # uv
-                        assert toks[0] in ('u', 'v')
-                        obs.append(GsiWindObservation(ob_var, ob_meta, time_delta, lat, lon, pres, iuse,
-                                          float(toks[7]), float(toks[8]), float(toks[9]), float(toks[10])))
-                else: # assume radiance
-                    raise Exception("not implemented")
+        if self.ob_type != 'conv': # assume radiance
+            raise Exception("not implemented")
+        return ObservationTable(read_text_diag(diag_file_path))
+
+
+    def _extract_column_diag(self):
+        '''
+        RETURN an ObservationTable with the observations in the column diag file.
+                Uncompressed columns are memory-mapped rather than read.
+        '''
+        diag_file_path = os.path.join(self.path, self.diag_file_name)
+        (header, columns) = read_column_diag(diag_file_path)
+        if header['ob_type'] != self.ob_type or header['step'] != self.step:
+            raise Exception("Column diag file [%s] is for ob type %s and step %s"
+                            %(diag_file_path, header['ob_type'], header['step']))
+        return ObservationTable(columns)
 
 
     #def build_obs_list(self, path, ob_type, date, diag_step, use_plaintext_diag, gsi_diag_reader_conv=None, gsi_diag_reader_rad=None):
     def build_obs_list(self):
         '''
-        Populate the self.obs list
+        Populate self.obs, an ObservationTable (or None for radiance diags)
 
         ARGS   TODO :: uPDATE this now uses the class fields
             - path - Path to the diag file
@@ -425,12 +494,13 @@ class GsiObTypeDiag(object):
         diag_path = os.path.join(self.path, self.diag_file_name )
         if not os.path.exists(diag_path): raise Exception("Diag file not found: [%s]" %diag_path)
 
-        if self.use_plaintext_diag:
-            log.debug("Using plaintext diag to build GsiObTypeDiag object for obtype %s" %ob_type)
+        if self.use_column_diag:
+            log.debug("Using column diag to build GsiObTypeDiag object for obtype %s" %self.ob_type)
+            self.obs = self._extract_column_diag()
+        elif self.use_plaintext_diag:
+            log.debug("Using plaintext diag to build GsiObTypeDiag object for obtype %s" %self.ob_type)
             self.obs = self._extract_gsi_textdiag()
         else:
-            if self.gsi_diag_reader_conv is None or self.gsi_diag_reader_rad is None:
-                raise Exception("Diag readers were not specified in the constructor. Try setting use_plaintext_diag to True if plaintext diag files are available")
             self.obs = self._extract_gsi_diag()
 
 
@@ -445,43 +515,198 @@ class GsiObTypeDiag(object):
          - include_skipped (Default False) - include skipped (i.e. iuse != 1) observations in the output
         '''
         #import pdb ; pdb.set_trace()
+        if self.obs is None:
+            log.warn("No obs for ob type %s" %self.ob_type)
+            return
         if len(outdir) == 0:
             outdir = os.getcwd()
         if len(outfile) == 0:
             outfile = TEXT_DIAG_PREFIX + self.ob_type + "_" + self.step + "." + epoch_to_yyyymmddHHMM(self.date) + TEXT_DIAG_SUFFIX
         if gz:
-            outfile = gzip.open( os.path.join(outdir, outfile), 'wb')
+            opener = gzip.open
         else:
-            outfile = open( os.path.join(dataset.get_gsi_output_path(cycle), outfile), 'w')
+            opener = open
         if include_skipped:
             #all_obs = self.conv_obs + self.rad_obs + self.oz_obs
             all_obs = self.obs
         else:
             #all_obs = self.non_skipped_conv_obs + self.non_skipped_rad_obs + self.non_skipped_oz_obs
-            all_obs = [ ob for ob in self.obs if not ob.skipped ]
-        for ob in all_obs:
-            outfile.write( ob.to_csv() + "\n")
+            all_obs = self.obs.filter(skipped=False)
+        with opener( os.path.join(outdir, outfile), 'wb') as f:
+            for ob in all_obs:
+                f.write( ob.to_csv() + "\n")
+
+    def make_column_diag_file(self, outfile='', outdir='', compress=False, include_skipped=False):
+        '''
+        Make a column diag file (see gsi_diag_reader.write_column_diag()) given a GSI-generated
+        "binary" diagnostic file. These are much faster to read than the plain-text ones.
+
+        PARAMETERS
+         - outfile - Specify an output file name. If none is chosen, use get_diag_file_name()
+         - outdir - Specify an output directory. If none is given, use CWD
+         - compress (Default False) - compress each column using zlib. Uncompressed
+                    files are larger, but their columns can be memory-mapped
+         - include_skipped (Default False) - include skipped (i.e. iuse != 1) observations in the output
+        '''
+        if self.obs is None:
+            log.warn("No obs for ob type %s" %self.ob_type)
+            return
+        if len(outdir) == 0:
+            outdir = os.getcwd()
+        if len(outfile) == 0:
+            outfile = get_diag_file_name(self.ob_type, self.step, self.date, False, True)
+        if include_skipped:
+            obs = self.obs
+        else:
+            obs = self.obs.filter(skipped=False)
+        write_column_diag(os.path.join(outdir, outfile), obs.columns, self.ob_type,
+                          self.step, self.date, compress=compress)
 
 
     @property
-    def non_skipped_conv_obs(self):
-        return [ob for ob in self.conv_obs if ob.skipped == False]
-    @property
-    def non_skipped_rad_obs(self):
-        return [ob for ob in self.rad_obs if ob.skipped == False]
-    @property
-    def non_skipped_oz_obs(self):
-        return [ob for ob in self.oz_obs if ob.skipped == False]
+    def all_obs(self):
+        return self.obs
     @property
-    def conv_obs(self):
-        return [ob for ob in self.conv_obs]
+    def non_skipped_obs(self):
+        return self.obs.filter(skipped=False)
     @property
-    def rad_obs(self):
-        return [ob for ob in self.rad_obs]
+    def skipped_obs(self):
+        return self.obs.filter(skipped=True)
+
+
+
+class ObservationTable(object):
+    '''
+    Stores observations as columns: each of the COLUMNS is a NumPy array
+    with one element per observation, which can be accessed as an attribute
+    (e.g. table.lat). The v_value and v_bias of non-wind obs are NaN.
+    Subsets are selected with boolean masks (see filter() and select()).
+    Iterating over a table yields a GsiConventionalObservation (or
+    GsiWindObservation) for each observation.
+    '''
+    COLUMNS = ('type', 'station_id', 'itype', 'time_delta', 'lat', 'lon',
+               'pres', 'iuse', 'value', 'bias', 'v_value', 'v_bias')
+    # columns that are filled in if not given (e.g. by the text diags)
+    OPTIONAL_COLUMNS = { 'itype': -1, 'v_value': np.nan, 'v_bias': np.nan }
+
+    def __init__(self, columns):
+        '''
+        Instantiate an ObservationTable from the given `columns', a
+        dictionary mapping each of the COLUMNS to a sequence of values
+        '''
+        n = len(columns['type'])
+        self.columns = {}
+        for name in self.COLUMNS:
+            if name in columns:
+                col = np.asarray(columns[name])
+            elif name in self.OPTIONAL_COLUMNS:
+                col = np.empty(n, dtype=type(self.OPTIONAL_COLUMNS[name]))
+                col.fill(self.OPTIONAL_COLUMNS[name])
+            else:
+                raise KeyError("Column %s was not given" %name)
+            if len(col) != n:
+                raise ValueError("Column %s has %i elements instead of %i"
+                                 %(name, len(col), n))
+            self.columns[name] = col
+
+    @classmethod
+    def from_observations(cls, obs):
+        '''
+        RETURN an ObservationTable containing the given list of 
+        GsiConventionalObservation/GsiWindObservation objects
+        '''
+        columns = dict((name, []) for name in cls.COLUMNS)
+        for ob in obs:
+            isWind = isinstance(ob, GsiWindObservation)
+            columns['type'].append(ob.type)
+            columns['station_id'].append(ob.station_id)
+            columns['itype'].append(-1)
+            for name in ('time_delta', 'lat', 'lon', 'pres'):
+                columns[name].append(getattr(ob, name))
+            columns['iuse'].append(0 if ob.skipped else 1)
+            columns['value'].append(ob.u_value if isWind else ob.value)
+            columns['bias'].append(ob.u_bias if isWind else ob.bias)
+            columns['v_value'].append(ob.v_value if isWind else np.nan)
+            columns['v_bias'].append(ob.v_bias if isWind else np.nan)
+        columns['type'] = np.array(columns['type'], dtype='S3')
+        columns['station_id'] = np.array(columns['station_id'], dtype='S8')
+        for name in ('itype', 'iuse'):
+            columns[name] = np.array(columns[name], dtype=int)
+        return cls(columns)
+
+    def __len__(self):
+        return len(self.columns['type'])
+
+    def __getattr__(self, name):
+        if name != 'columns' and name in self.columns:
+            return self.columns[name]
+        raise AttributeError(name)
+
     @property
-    def oz_obs(self):
-        return [ob for ob in self.oz_obs]
+    def skipped(self):
+        ''' Boolean array indicating which observations were not used '''
+        return self.columns['iuse'] < 1
 
+    def select(self, mask):
+        '''
+        RETURN an ObservationTable with the observations for which the 
+        given boolean `mask' (or array of indices) is set
+        '''
+        return ObservationTable(dict((name, col[mask]) 
+                                     for (name, col) in self.columns.iteritems()))
+
+    def get_mask(self, skipped=None, types=None, pres_range=None, 
+                 time_range=None):
+        '''
+        RETURN a boolean array indicating which observations meet all of
+        the given criteria (see filter())
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        if skipped is not None:
+            mask &= (self.skipped == skipped)
+        if types is not None:
+            mask &= np.in1d(self.columns['type'], list(types))
+        if pres_range is not None:
+            mask &= (self.columns['pres'] >= pres_range[0]) & \
+                    (self.columns['pres'] <= pres_range[1])
+        if time_range is not None:
+            mask &= (self.columns['time_delta'] >= time_range[0]) & \
+                    (self.columns['time_delta'] <= time_range[1])
+        return mask
+
+    def filter(self, skipped=None, types=None, pres_range=None,
+               time_range=None):
+        '''
+        RETURN an ObservationTable with the observations that meet all of 
+        the given criteria:
+          skipped - If True (False), only the skipped (non-skipped) obs
+          types - Only obs of these types (e.g. ['ps', 'uv'])
+          pres_range - Only obs whose pressure is within this (min,max)
+          time_range - Only obs whose time_delta (hours relative to the
+                       analysis time) is within this (min,max)
+        '''
+        return self.select(self.get_mask(skipped=skipped, types=types,
+                                         pres_range=pres_range,
+                                         time_range=time_range))
+
+    def __iter__(self):
+        '''
+        Yield a GsiConventionalObservation (or GsiWindObservation, for wind 
+        obs) for each observation
+        '''
+        rows = zip(*[ self.columns[k].tolist() for k in
+                      ('type', 'station_id', 'time_delta', 'lat', 'lon',
+                       'pres', 'iuse', 'value', 'bias', 'v_value', 'v_bias') ])
+        for (type, station_id, time_delta, lat, lon, pres, iuse, value, bias,
+             v, v_bias) in rows:
+            if type != 'uv':
+                yield GsiConventionalObservation(type, station_id, time_delta,
+                                                 lat, lon, pres, iuse, value,
+                                                 bias)
+            else:
+                yield GsiWindObservation(type, station_id, time_delta, lat,
+                                         lon, pres, iuse, value, v, bias,
+                                         v_bias)
 
 
 class AbstractGsiObservation(object):
@@ -494,6 +719,7 @@ class AbstractGsiObservation(object):
         self.lat = lat
         self.lon = lon
         self.pres = pres
+        self.iuse = iuse
         if iuse < 1:
             self.skipped = True
         else:
@@ -510,6 +736,11 @@ class AbstractConventionalGsiObservation(AbstractGsiObservation):
         super(AbstractConventionalGsiObservation, self).__init__(type,  time_delta, lat, lon, pres, iuse)
         self.station_id = station_id
 
+    def to_csv(self):
+        # same leading columns as the text diags of GSI's read_diag_conv utility
+        # (see gsi_diag_reader.TEXT_DIAG_COLUMNS)
+        return ('%s, %s, %f, %f, %f, %f, %i' %(self.type, self.station_id, self.time_delta, self.lat, self.lon, self.pres, self.iuse))
+
 class GsiConventionalObservation(AbstractConventionalGsiObservation):
     def __init__(self, type, station_id, time_delta, lat, lon, pres, skipped, value, bias):
         super(GsiConventionalObservation, self).__init__(type, station_id, time_delta, lat, lon, pres, skipped)
@@ -517,7 +748,7 @@ class GsiConventionalObservation(AbstractConventionalGsiObservation):
         self.bias = bias # o-g
 
     def to_csv(self):
-        return ('%s, %f, %f, %f, %f, %f, %f' %(self.type, self.time_delta, self.lat, self.lon, self.pres, self.value, self.bias))
+        return ('%s, %f, %f' %(super(GsiConventionalObservation, self).to_csv(), self.value, self.bias))
 
 
 class GsiWindObservation(AbstractConventionalGsiObservation):
@@ -527,10 +758,11 @@ class GsiWindObservation(AbstractConventionalGsiObservation):
         self.u_bias = u_bias ; self.v_bias = v_bias
 
     def to_csv(self):
-        return ('%s, %f, %f, %f, %f, %f, %f, %f, %f' %(self.type, self.time_delta, self.lat, self.lon, self.pres, self.u_value, self.v_value, self.u_bias, self.v_bias) )
+        # each component's value is followed by its bias, as in read_diag_conv
+        return ('%s, %f, %f, %f, %f' %(super(GsiWindObservation, self).to_csv(), self.u_value, self.u_bias, self.v_value, self.v_bias) )
 
 
-def get_diag_file_name(obType, diag_step, date, is_text_diag):
+def get_diag_file_name(obType, diag_step, date, is_text_diag, is_column_diag=False):
     '''
     Create the file name based on known GSI naming convention
     ARGS:
@@ -538,8 +770,11 @@ def get_diag_file_name(obType, diag_step, date, is_text_diag):
       diag_step - the keyword used by GSI to distinguish ges and analysis (i.e. 'ges' or 'anl')
       date - The cycle date in seconds since epoch
       is_text_diag - True if using plaintext diag files
+      is_column_diag - True if using column diag files
     '''
-    if is_text_diag:
+    if is_column_diag:
+        return COLUMN_DIAG_PREFIX + obType + "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(date) + COLUMN_DIAG_SUFFIX
+    elif is_text_diag:
         return TEXT_DIAG_PREFIX + obType + "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(date) + TEXT_DIAG_SUFFIX
     else:
         return DIAG_FILE_PREFIX + obType + "_" + diag_step + "." +  epoch_to_yyyymmddHHMM(date) + DIAG_FILE_SUFFIX
@@ -0,0 +1,233 @@
+'''
+Provides the BackgroundImageWriter class, which saves figures by rendering
+them to an in-memory RGBA buffer and handing the PNG compression and the
+file write to a pool of worker processes, so that the (slow) encoding of
+large figures overlaps with the work done for the next figure.
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import io
+import atexit
+import logging
+import multiprocessing
+
+import numpy as np
+import matplotlib
+import matplotlib.image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+try:
+    # the PNG encoder used by savefig() before matplotlib 3.3, which uses
+    # the public imsave() instead
+    from matplotlib import _png
+except ImportError:
+    _png = None
+from util import atomic_write
+
+# Maximum number of rendered images waiting to be encoded, per worker. When
+# it is reached, savefig() blocks until the oldest image is written, which
+# bounds the memory used by the pending images.
+MAX_PENDING_PER_JOB = 2
+# savefig() keyword arguments supported by the background writer. Figures
+# saved with others (e.g. bbox_inches) are saved synchronously.
+SUPPORTED_SAVEFIG_KWARGS = ('dpi', 'facecolor', 'edgecolor', 'transparent',
+                            'format')
+
+
+# Whether _encode_png() creates the same files as savefig() in this process
+# (see _encoder_matches_savefig()). None until checked
+_encoder_matches = None
+
+
+class ImageWriteError(Exception):
+    ''' Raised when an image could not be written by a worker process '''
+    pass
+
+
+def _encode_png(rgba, f, dpi):
+    '''
+    Encode the given `rgba' pixels (uint8 array of shape (rows, columns, 4))
+    as a PNG with the given `dpi' and write it to the file object `f', the
+    way savefig() does
+    '''
+    if _png is not None:
+        metadata = {'Software': 'matplotlib version {}, '
+                    'http://matplotlib.org/'.format(matplotlib.__version__)}
+        _png.write_png(rgba, f, dpi, metadata=metadata)
+    else:
+        matplotlib.image.imsave(f, rgba, format='png', origin='upper', 
+                                dpi=dpi)
+
+
+def _render_rgba(fig, **kwargs):
+    '''
+    RETURN the pixels of Figure `fig' as saved by fig.savefig() with the 
+    given `kwargs' (which must include the `dpi'), as a uint8 array of shape
+    (rows, columns, 4), or None if their size cannot be determined
+    '''
+    buf = io.BytesIO()
+    fig.savefig(buf, format='raw', **kwargs)
+    (width, height) = [ int(v) for v in fig.get_size_inches() * kwargs['dpi'] ]
+    rgba = np.frombuffer(buf.getvalue(), dtype=np.uint8)
+    if rgba.size != width * height * 4:
+        return None
+    return rgba.reshape(height, width, 4)
+
+
+def _encoder_matches_savefig():
+    '''
+    RETURN True if _encode_png() creates the same files as savefig() with 
+    the version of matplotlib in use (whose PNG encoder and metadata are not
+    part of its public API), which is checked with a small figure
+    '''
+    global _encoder_matches
+    if _encoder_matches is None:
+        fig = Figure(figsize=(1, 1))
+        FigureCanvasAgg(fig)
+        fig.text(0.5, 0.5, 'x')
+        expected = io.BytesIO()
+        fig.savefig(expected, format='png', dpi=20)
+        actual = io.BytesIO()
+        try:
+            _encode_png(_render_rgba(fig, dpi=20), actual, 20)
+            _encoder_matches = (actual.getvalue() == expected.getvalue())
+        except Exception:
+            _encoder_matches = False
+    return _encoder_matches
+
+
+def _write_png(rgba, path, dpi):
+    '''
+    Encode the given `rgba' pixels as a PNG with the given `dpi' (see 
+    _encode_png()) and write it to `path'.
+    RETURN the `path'
+    @raise ImageWriteError if the image cannot be written, with the `path'
+           in its message (since it is raised in another process)
+    '''
+    try:
+        with atomic_write(path, suffix='.tmp.png') as f:
+            _encode_png(rgba, f, dpi)
+    except Exception as e:
+        raise ImageWriteError("Unable to write {}: {}: {}"
+                              .format(path, type(e).__name__, e))
+    return path
+
+
+class BackgroundImageWriter(object):
+    '''
+    Saves PNG images of figures using a pool of `jobs' worker processes. The
+    figure is rendered in the calling process (so it may be modified or
+    closed as soon as savefig() returns); only the encoding and the file
+    write are done by the workers. Pending images are written by flush(),
+    which is called automatically when the interpreter exits. An image 
+    that could not be written makes the next call to savefig() or flush() 
+    raise an ImageWriteError with its path.
+    '''
+    def __init__(self, jobs=1, log=None):
+        '''
+        Instantiate a BackgroundImageWriter. The worker processes are not
+        created until the first image is saved.
+        '''
+        if log is None:
+            log = logging.getLogger()
+        self.log = log
+        self.jobs = jobs
+        self.max_pending = MAX_PENDING_PER_JOB * jobs
+        self._pool = None
+        self._pending = []
+        atexit.register(self.close)
+
+    def _is_supported(self, path, kwargs):
+        '''
+        RETURN True if a figure can be saved to `path' with the given
+        savefig() `kwargs' by the workers
+        '''
+        if self.jobs < 1:
+            return False
+        # daemonic processes (e.g. the workers of a multiprocessing.Pool)
+        # are not allowed to create child processes
+        if multiprocessing.current_process().daemon:
+            return False
+        if not all(k in SUPPORTED_SAVEFIG_KWARGS for k in kwargs):
+            return False
+        fmt = kwargs.get('format')
+        if fmt is None:
+            fmt = os.path.splitext(path)[1][1:] \
+                  or matplotlib.rcParams['savefig.format']
+        if fmt.lower() != 'png':
+            return False
+        if not _encoder_matches_savefig():
+            self.log.debug("PNG images are saved synchronously with "
+                           "matplotlib {}".format(matplotlib.__version__))
+            return False
+        return True
+
+    def savefig(self, fig, path, **kwargs):
+        '''
+        Save Figure `fig' to `path' as fig.savefig(path, **kwargs) would.
+        If the image is a PNG, it is rendered now and encoded and written in
+        the background. Otherwise, it is saved synchronously.
+        @raise ImageWriteError if a previous image could not be written
+        '''
+        # report failures as soon as possible
+        while self._pending and self._pending[0].ready():
+            self._wait_oldest()
+        if not self._is_supported(path, kwargs):
+            fig.savefig(path, **kwargs)
+            return
+        dpi = kwargs.get('dpi')
+        if dpi is None or dpi == 'figure':
+            dpi = matplotlib.rcParams['savefig.dpi']
+            if dpi == 'figure':
+                dpi = fig.dpi
+        kwargs['dpi'] = dpi
+        kwargs.pop('format', None)
+        rgba = _render_rgba(fig, **kwargs)
+        if rgba is None:
+            # size could not be determined; should not happen
+            self.log.debug("Saving {} synchronously".format(path))
+            fig.savefig(path, **kwargs)
+            return
+        while len(self._pending) >= self.max_pending:
+            self._wait_oldest()
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.jobs)
+        self._pending.append(
+            self._pool.apply_async(_write_png, (rgba, path, dpi)))
+
+    def _wait_oldest(self):
+        '''
+        Wait until the oldest pending image is written
+        @raise ImageWriteError if it could not be written
+        '''
+        path = self._pending.pop(0).get()
+        self.log.debug("Wrote {}".format(path))
+
+    def flush(self):
+        '''
+        Wait until all pending images are written
+        @raise ImageWriteError if any of them could not be written (after 
+               waiting for the rest)
+        '''
+        error = None
+        while self._pending:
+            try:
+                self._wait_oldest()
+            except ImageWriteError as e:
+                self.log.error(str(e))
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+    def close(self):
+        ''' Write all pending images and shut down the worker processes '''
+        try:
+            self.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
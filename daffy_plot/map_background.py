@@ -0,0 +1,216 @@
+'''
+Provides routines for drawing the static background of maps (coastlines,
+countries, continents, oceans and gridlines) as a raster image, which is
+rendered once for each map configuration and figure layout and reused for
+every figure drawn with it (e.g. one track figure per cycle).
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import hashlib
+import logging
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from util import LRUCache, atomic_write
+
+# Increment this if the way backgrounds are rendered changes, so that
+# cached backgrounds created with previous versions are not used
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_SUFFIX = '.mapbg.npz'
+# map_options that affect the background
+BACKGROUND_MAP_OPTIONS = ('draw_coastlines', 'draw_countries', 'ocean_color',
+                          'continents_fill_color', 'lake_color',
+                          'southern_latitude', 'northern_latitude',
+                          'western_longitude', 'eastern_longitude',
+                          'latitude_line_freq', 'longitude_line_freq')
+
+# Maximum number of backgrounds, and their cumulative size in bytes, kept
+# in memory by each process
+MAX_CACHED_BACKGROUNDS = 16
+MAX_CACHED_BACKGROUND_BYTES = 256 * 1024 * 1024
+
+# Backgrounds rendered (or read from the cache_dir) by this process, keyed by
+# the hash of their settings
+_backgrounds = LRUCache(max_entries=MAX_CACHED_BACKGROUNDS,
+                        max_bytes=MAX_CACHED_BACKGROUND_BYTES,
+                        sizeof=lambda background: background[0].nbytes)
+
+
+def draw_map_layers(basemap, map_settings, ax=None):
+    '''
+    Draw the background of the map on the given Axes (default: that of the
+    `basemap') according to the given `map_settings' (i.e. the map_options
+    of a DaffyPlotConfig).
+    RETURN a 2-tuple with the dictionaries returned by drawparallels() and
+    drawmeridians()
+    '''
+    westLon = map_settings['western_longitude']
+    eastLon = map_settings['eastern_longitude']
+    upperLat = map_settings['northern_latitude']
+    lowerLat = map_settings['southern_latitude']
+
+    if map_settings['draw_coastlines']:
+        basemap.drawcoastlines(ax=ax)
+    if map_settings['draw_countries']:
+        basemap.drawcountries(ax=ax)
+    if map_settings['ocean_color'] != None:
+        basemap.drawmapboundary(fill_color=map_settings['ocean_color'], ax=ax)
+    basemap.fillcontinents(color=map_settings['continents_fill_color'],
+                           lake_color=map_settings['lake_color'], ax=ax)
+    parallels = basemap.drawparallels(
+                        np.arange(lowerLat, upperLat,
+                                  map_settings['latitude_line_freq']),
+                        labels=map_settings['latitude_label_mask'], ax=ax)
+    meridians = basemap.drawmeridians(
+                        np.arange(westLon, eastLon,
+                                  map_settings['longitude_line_freq']),
+                        labels=map_settings['longitude_label_mask'], ax=ax)
+    return (parallels, meridians)
+
+
+def draw_map_labels(basemap, map_settings, ax=None):
+    '''
+    Draw only the labels of the parallels and meridians of the map, which
+    fall outside of the Axes and are thus not part of the raster background
+    '''
+    westLon = map_settings['western_longitude']
+    eastLon = map_settings['eastern_longitude']
+    upperLat = map_settings['northern_latitude']
+    lowerLat = map_settings['southern_latitude']
+    parallels = basemap.drawparallels(
+                        np.arange(lowerLat, upperLat,
+                                  map_settings['latitude_line_freq']),
+                        labels=map_settings['latitude_label_mask'], ax=ax)
+    meridians = basemap.drawmeridians(
+                        np.arange(westLon, eastLon,
+                                  map_settings['longitude_line_freq']),
+                        labels=map_settings['longitude_label_mask'], ax=ax)
+    for gridlines in (parallels, meridians):
+        for (lines, labels) in gridlines.values():
+            for line in lines:
+                line.remove()
+
+
+def _get_dpi(fig):
+    ''' RETURN the resolution at which figures like `fig' will be saved '''
+    dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = fig.dpi
+    return dpi
+
+
+def _get_background_key(basemap, map_settings, ax):
+    '''
+    RETURN a hash of everything that determines the background of a map
+    drawn with the given `basemap' and `map_settings' on Axes `ax'
+    '''
+    fig = ax.figure
+    key = repr(([ (k, map_settings[k]) for k in BACKGROUND_MAP_OPTIONS ],
+                map_settings['latitude_label_mask'],
+                map_settings['longitude_label_mask'],
+                basemap.projection, basemap.resolution,
+                basemap.llcrnrx, basemap.llcrnry,
+                basemap.urcrnrx, basemap.urcrnry,
+                tuple(fig.get_size_inches()), _get_dpi(fig),
+                tuple(ax.get_position(original=True).bounds),
+                CACHE_FORMAT_VERSION))
+    return hashlib.md5(key).hexdigest()
+
+
+def render_map_background(basemap, map_settings, ax):
+    '''
+    Render the background of the map (see draw_map_layers()) on an
+    off-screen figure with the same layout as the figure of Axes `ax'.
+    RETURN a 2-tuple consisting of the RGBA pixels (uint8) of the Axes
+    region and its extent, in map coordinates, as expected by imshow()
+    '''
+    fig = ax.figure
+    offFig = Figure(figsize=fig.get_size_inches(), dpi=_get_dpi(fig))
+    canvas = FigureCanvasAgg(offFig)
+    offFig.patch.set_alpha(0.)
+    offAx = offFig.add_axes(ax.get_position(original=True))
+    offAx.set_axis_off()
+    draw_map_layers(basemap, map_settings, ax=offAx)
+    canvas.draw()
+    (width, height) = canvas.get_width_height()
+    pixels = np.frombuffer(canvas.buffer_rgba(), dtype=np.uint8)\
+               .reshape(height, width, 4)
+    # pixel region containing the Axes (display coordinates start at the
+    # bottom, rows of the pixels at the top)
+    (x0, y0, x1, y1) = offAx.bbox.extents
+    (col0, col1) = (int(np.floor(x0)), int(np.ceil(x1)))
+    (row0, row1) = (int(np.floor(y0)), int(np.ceil(y1)))
+    rgba = pixels[height - row1:height - row0, col0:col1].copy()
+    toData = offAx.transData.inverted()
+    (left, bottom) = toData.transform((col0, row0))
+    (right, top) = toData.transform((col1, row1))
+    return (rgba, (left, right, bottom, top))
+
+
+def get_map_background(basemap, map_settings, ax, cache_dir=None, log=None):
+    '''
+    RETURN the background of the map (see render_map_background()),
+    rendering it only if it was not rendered before by this process or, if
+    a `cache_dir' is given, by a previous process
+    '''
+    if log is None:
+        log = logging.getLogger()
+    key = _get_background_key(basemap, map_settings, ax)
+    background = _backgrounds.get(key)
+    if background is not None:
+        return background
+    entryPath = None
+    if cache_dir is not None:
+        entryPath = os.path.join(cache_dir, key + CACHE_FILE_SUFFIX)
+        try:
+            with open(entryPath, 'rb') as f:
+                entry = np.load(f)
+                background = (entry['rgba'], tuple(entry['extent']))
+            log.debug("Using cached map background {}".format(entryPath))
+            _backgrounds.put(key, background)
+            return background
+        except (IOError, OSError):
+            pass
+        except Exception as e:
+            log.warn("Ignoring unreadable map background {}: {}"
+                     .format(entryPath, e))
+    background = render_map_background(basemap, map_settings, ax)
+    _backgrounds.put(key, background)
+    if entryPath is not None:
+        _write_background(entryPath, background, log)
+    return background
+
+
+def _write_background(entryPath, background, log):
+    ''' Write the given `background' to the cache entry at `entryPath' '''
+    cacheDir = os.path.dirname(entryPath)
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        with atomic_write(entryPath) as f:
+            np.savez(f, rgba=background[0], extent=np.array(background[1]))
+    except (IOError, OSError) as e:
+        log.warn("Unable to write map background {}: {}"
+                 .format(entryPath, e))
+
+
+def draw_cached_map_background(basemap, map_settings, ax=None,
+                               cache_dir=None, log=None):
+    '''
+    Draw the background of the map on the given Axes (default: that of the
+    `basemap') as a raster image (see get_map_background()) below any other
+    artists, along with the gridline labels
+    '''
+    if ax is None:
+        ax = basemap.ax if basemap.ax is not None else plt.gca()
+    (rgba, extent) = get_map_background(basemap, map_settings, ax,
+                                        cache_dir=cache_dir, log=log)
+    ax.imshow(rgba, extent=extent, origin='upper', interpolation='nearest',
+              aspect=ax.get_aspect(), zorder=0)
+    draw_map_labels(basemap, map_settings, ax=ax)
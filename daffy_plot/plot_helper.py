@@ -16,14 +16,21 @@ import logging as log
 import matplotlib.dates as mpl_dates
 from matplotlib.dates import DateFormatter, WeekdayLocator, DayLocator, MONDAY, HourLocator
 from matplotlib.colors import ColorConverter
+from matplotlib.artist import Artist
+from matplotlib.text import Text
 import pytz
 from tzlocal import get_localzone # $ pip install tzlocal
 import datetime
 import glob
+import multiprocessing
 from daffy_dataset import DaffyExperimentDataset
 from daffy_plot_config import DaffyPlotConfig
+from basemap_cache import get_basemap
+from map_background import draw_map_layers, draw_cached_map_background
+from track_renderer import TrackCollectionBuilder
+from decimate import decimate_line, local_extrema
+from image_writer import BackgroundImageWriter
 #from map_plotter import plot_track # TODO : Use a pycane lib instead. This is in extern
-from pycane.postproc.viz.tcv import track_plotter
 from nwpy.viz.map import bling as pycane_bling
 from  pycane.postproc.viz.tcv import tcv_plot_helper
 from pycane.postproc.tracker import objects as trkobj
@@ -33,16 +40,73 @@ from pycane.postproc.tracker import utils as trkutils
 #
 
 BEST_TRACK_LABEL = "Best"
+# File names of the per-cycle track images, formatted with the cycle datetime
+CYCLE_TRACKS_FILE_PATTERN = "tracks-{0:%Y%m%d%H%M}.png"
 
 # set to the current timezone, since we use localtime() (note date is random
 # since we just need the tz name)
 #TIMEZONE = pytz.timezone( get_localzone().tzname( datetime.datetime(2012,1,1) ) )
 TIMEZONE = pytz.utc
 
+# DaffyTrackPlotHelper used by the worker processes of 
+# DaffyTrackPlotHelper.create_cycle_track_images(), which inherit it when forked
+_frame_plot_helper = None
+
 #
 # CLASSES
 #
 
+class PointLabels(Artist):
+    '''
+    Artist that draws the given `labels' (strings) above the given data 
+    points, each with its own color, as a single artist rather than one 
+    Text per label. As with Axes.annotate(), the labels of points that are 
+    outside of the Axes are not drawn.
+    '''
+    zorder = Text.zorder
+
+    def __init__(self, xVals, yVals, labels, colors, yOffset=0., **kwargs):
+        '''
+        Instantiate a PointLabels.
+        @param xVals, yVals Data coordinates of the points. The `xVals' may
+               be of any type supported by the Axes' x axis (e.g. datetimes)
+        @param labels The string drawn for each point
+        @param colors The color of each label
+        @param yOffset Offset of the labels from the points, in data units
+        @param kwargs Properties of the labels' Text (e.g. fontsize)
+        '''
+        Artist.__init__(self)
+        self.x_values = list(xVals)
+        self.y_values = np.asarray(yVals, dtype=float)
+        self.labels = list(labels)
+        self.colors = list(colors)
+        self.y_offset = yOffset
+        # drawn once per label. It is not added to the Axes.
+        self._text = Text(**kwargs)
+
+    def draw(self, renderer):
+        ''' Draw the labels of the points that are inside the Axes '''
+        if not self.get_visible() or len(self.labels) == 0:
+            return
+        ax = self.axes
+        text = self._text
+        text.set_figure(self.figure)
+        text.set_transform(ax.transData)
+        points = np.column_stack((
+                    np.asarray(ax.convert_xunits(self.x_values), dtype=float),
+                    self.y_values))
+        pixels = ax.transData.transform(points)
+        for (x, y), pixel, label, color in zip(points, pixels, 
+                                                self.labels, self.colors):
+            if not ax.contains_point(pixel):
+                continue
+            text.set_position((x, y + self.y_offset))
+            text.set_text(label)
+            text.set_color(color)
+            text.draw(renderer)
+        self.stale = False
+
+
 class DaffyPlotHelper(object):
 
     def __init__(self, usage_string=None):
@@ -58,6 +122,34 @@ class DaffyPlotHelper(object):
         except: # number given for log level
             log.basicConfig(level=int(self.cfg.log_level) )
         plt.style.use(self.cfg.style_paths)
+        self._image_writer = None
+
+    @property
+    def image_writer(self):
+        '''
+        The BackgroundImageWriter used by savefig(), created on first use
+        '''
+        if self._image_writer is None:
+            self._image_writer = BackgroundImageWriter(
+                                        jobs=self.cfg.image_writer_jobs)
+        return self._image_writer
+
+    def savefig(self, path, fig=None, **kwargs):
+        '''
+        Save the given Figure (default: the current one) to `path', like
+        fig.savefig(path, **kwargs). PNG images are compressed and written 
+        in the background (see the image_writer_jobs config option); call
+        flush_images() to wait until they are written. Pending images are
+        also written when the program exits.
+        '''
+        if fig is None:
+            fig = plt.gcf()
+        self.image_writer.savefig(fig, path, **kwargs)
+
+    def flush_images(self):
+        ''' Wait until all images passed to savefig() are written '''
+        if self._image_writer is not None:
+            self._image_writer.flush()
 
     def create_simple_legend(self, skip_duplicates=True):
         '''
@@ -80,6 +172,8 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
     def __init__(self, usage_string=None):
         ''' Instantiate a TCVPlotHelper '''
         super(DaffyTCVPlotHelper, self).__init__(usage_string=usage_string)
+        # (cycle, time_axis_parameter) -> time axis values of the Truth line
+        self._nature_time_values = {}
 
 
 
@@ -94,6 +188,23 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
         return original_kwargs
     
     
+    def _decimate_line(self, ax, xVals, yVals):
+        '''
+        RETURN a 2-tuple with the subsets of the given `xVals' and `yVals'
+        that are visually significant when plotted on Axes `ax', given
+        the decimation_tolerance in the config. Local extrema of the y
+        values are always kept. The x values may be datetime objects.
+        '''
+        if len(xVals) > 0 and isinstance(xVals[0], datetime.datetime):
+            xNums = mpl_dates.date2num(xVals)
+        else:
+            xNums = xVals
+        yNums = np.array([np.nan if y is None else y for y in yVals],
+                         dtype=float)
+        idc = decimate_line(ax, xNums, yNums, self.cfg.decimation_tolerance,
+                            keep_idc=local_extrema(yNums))
+        return ([xVals[i] for i in idc], [yVals[i] for i in idc])
+
     def line_plot_wrapper(self, xVals, yVals, ax=None, dataset=None, 
                           x_label=None, y_label=None,
                           **kwargs):
@@ -123,6 +234,9 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
         if not kwargs.has_key('linewidth'):
             kwargs['linewidth'] = self.cfg.line_width
 
+        if self.cfg.decimation_tolerance > 0:
+            (xVals, yVals) = self._decimate_line(ax, xVals, yVals)
+
         tcv_plot_helper.tcv_plot_basic(xVals, yVals, ax=ax, **kwargs)
 
         # add axis labels
@@ -149,6 +263,33 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
         if self.cfg.time_axis_parameter == 'fhr':
             ax.set_xticks(np.arange(0, self.cfg.forecast_duration/3600, 12))
 
+    def get_dataset_metric_track(self, dataset, cycle, metric_name):
+        '''
+        RETURN the ForecastTrack (if <metric_name> contains "_value") or 
+        ForecastTrackDiff (if it contains "_error") containing the 
+        <metric_name> values of the <dataset> for the given <cycle>, as 
+        plotted by plot_dataset_metric_vs_fhr()
+        '''
+        if not dataset in self.datasets: 
+           msg = 'Passed in dataset is not in self.datasets. Cowardly bailing'
+           raise Exception(msg)
+        if "_value" in metric_name:
+            # This will be a ForecastTrack object
+            return dataset.get_tc_value_stats(cycle) 
+        #elif metric_name.find("_error") > -1:
+        elif "_error" in metric_name:
+            if self.cfg.difference_type == "absolute":
+                is_absolute = True
+            elif self.cfg.difference_type == "relative":
+                is_absolute = False
+            else:
+                raise Exception("Unknown difference type")
+            return dataset.get_tc_error_stats(cycle, is_absolute=is_absolute)
+        else:
+            msg = "`metric_name` passed to `create_gridded_figure()` is "\
+                  "expected to have either '_value' or '_error' in its name"
+            raise ValueError(msg)
+
     def plot_dataset_metric_vs_fhr(self, dataset, cycle, metric_name, 
                                    axes=None, do_scatter=False, 
                                    x_label=None, y_label=None, 
@@ -173,27 +314,7 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
               MPL::plot()
 
         '''
-        if not dataset in self.datasets: 
-           msg = 'Passed in dataset is not in self.datasets. Cowardly bailing'
-           raise Exception(msg)
-        if "_value" in metric_name:
-            # This will be a ForecastTrack object
-            fcst_track = dataset.get_tc_value_stats(cycle) 
-            tracker_data = fcst_track.tracker_entries
-        #elif metric_name.find("_error") > -1:
-        elif "_error" in metric_name:
-            if self.cfg.difference_type == "absolute":
-                is_absolute = True
-            elif self.cfg.difference_type == "relative":
-                is_absolute = False
-            else:
-                raise Exception("Unknown difference type")
-            fcst_track = dataset.get_tc_error_stats(cycle, is_absolute=is_absolute)
-            tracker_data = fcst_track.tracker_entries
-        else:
-            msg = "`metric_name` passed to `create_gridded_figure()` is "\
-                  "expected to have either '_value' or '_error' in its name"
-            raise ValueError(msg)
+        fcst_track = self.get_dataset_metric_track(dataset, cycle, metric_name)
         #time_axis_values = self.get_time_axis_values(
                                         #cycle, metric_name, 
                                         #[ x.fhr for x in tracker_data ] )
@@ -233,29 +354,53 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
             self.plot_nature_run_values(cycle, metric_name)
 
 
+    def get_nature_run_values(self, cycle, metric_name):
+        '''
+        RETURN a 2-tuple consisting of the time axis values and the Truth 
+        values of the given `metric_name' for `cycle', as plotted by 
+        plot_nature_run_values()
+        '''
+        interval = int(self.cfg.history_interval)
+        nature_time_vals = self._get_nature_time_values(cycle)
+        nature_data = self.cfg.truth_index.get_series(
+                                cycle, len(nature_time_vals), interval,
+                                interpolate=self.cfg.interpolate_truth)
+        return (nature_time_vals, nature_data[metric_name])
+
+    def _get_nature_time_values(self, cycle):
+        '''
+        RETURN a list of the time axis values of the Truth line for `cycle'
+        (see get_nature_run_values()). They are computed once per cycle.
+        '''
+        key = (cycle, self.cfg.time_axis_parameter)
+        if not key in self._nature_time_values:
+            endFhr = int(self.cfg.forecast_duration)
+            interval = int(self.cfg.history_interval)
+            fhrs = np.arange(0, endFhr, interval)
+            if self.cfg.time_axis_parameter == 'epoch_zeta':
+                timeVals = mpl_dates.num2date(
+                                    mpl_dates.epoch2num(cycle + fhrs))
+            # This is causing breakage ever since I switched to UTC
+            elif self.cfg.time_axis_parameter == 'fhr':
+                timeVals = (fhrs // 3600).tolist()
+            else:
+                raise Exception("Unsupported time_axis_parameter: {}"
+                                .format(self.cfg.time_axis_parameter))
+            self._nature_time_values[key] = timeVals
+        return list(self._nature_time_values[key])
+
     def plot_nature_run_values(self, cycle, metric_name, label=BEST_TRACK_LABEL):
         '''
         Plot the Truth values for the given `metric_name', using the 
         corresponding absolute times for `cycle'.
         The time axis values will not really correspond to the forecast 
         times of the Nature Run, so just create an array using 
-        self.cfg.forecast_duration and self.cfg.history_interval
+        self.cfg.forecast_duration and self.cfg.history_interval.
+        Output times without a Truth value are left blank.
         ''' 
         log.debug('plotting nature run data')
-        epoch2num = lambda x: mpl_dates.num2date(mpl_dates.epoch2num(x))
-        natureTimesDict = self.cfg.truth_track.absolute_times_dict()
-        endFhr = int(self.cfg.forecast_duration)
-        interval = int(self.cfg.history_interval)
-        fhrs = range(0, endFhr, interval)
-        nature_data = [] #self.cfg.truth_track.tracker_entries
-        for outputTime in range(cycle, cycle + endFhr, interval):
-            nature_data.append(natureTimesDict[outputTime])
-        if self.cfg.time_axis_parameter == 'epoch_zeta':
-            nature_time_vals = [epoch2num(cycle+fhr) for fhr in fhrs]
-        # This is causing breakage ever since I switched to UTC
-        elif self.cfg.time_axis_parameter == 'fhr':
-            nature_time_vals = [t/3600 for t in fhrs]
-        nature_vals = [getattr(x,metric_name) for x in nature_data]
+        (nature_time_vals, nature_vals) = \
+                self.get_nature_run_values(cycle, metric_name)
         #import pdb ; pdb.set_trace()
         self.line_plot_wrapper(nature_time_vals,
                                nature_vals, 
@@ -268,9 +413,11 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
                                         x_label=None, y_label=None, **kwargs):
         '''
         Plots the mean value of <metric_name> values for the <dataset>. The means
-        are calculated for each lead time. The metric plotted is specified in 
-        <metric_name> and should be a field in the object returned by the 
-        plot_helper's dataset's get_tc_error_stats() methods. Since only averages 
+        are calculated for each lead time. The kind of mean (e.g. mean, rmse,
+        median, percentile) is given by the cfg's `average_type'. The metric 
+        plotted is specified in <metric_name> and should be a field in the 
+        object returned by the plot_helper's dataset's get_tc_error_stats() 
+        methods. Since only averages 
         for errors are supported, the metric name should have "_error" in its name.
         If the "annotate_unflagged_entries" parameter of the cfg is enabled, 
         annotate each point with the number of values that went into the average 
@@ -288,14 +435,13 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
         if "_value" in metric_name:
             raise Exception('Only averages of errors are supported at this time')
         elif "_error" in metric_name:
-            if self.cfg.average_type == 'mean':
-                (mean_tracker_data, unflagged_entries) = \
-                    dataset.get_mean_tc_error_stats()
-            elif self.cfg.average_type == 'rmse':
-                (mean_tracker_data, unflagged_entries) = \
-                    dataset.get_rms_tc_error_stats()
-            else:
+            # All statistics are calculated at once, so plotting several
+            # metrics or average types only processes the errors once
+            (stats, unflagged_entries) = \
+                dataset.get_tc_error_statistics(self.cfg.error_percentiles)
+            if not self.cfg.average_type in stats:
                 raise Exception("Unknown average_type")
+            mean_tracker_data = stats[self.cfg.average_type]
 
         else:
             raise ValueError(("`metric_name' in `create_gridded_figure()` is "
@@ -317,35 +463,50 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
         # Put text indicating number of unflagged values that went into each 
         # point. Only label if there were flagged entries to help keep the 
         # figure as reabable as possible.
-        # note: this is pretty time consuming
-        for i in range(len(values)):
-            # Annotate points that have at least one flagged entry
-            # lighten the text color in proportion to the number of unflagged entries.
-            # The maximum amount by which we can scale the value is (1-c)*scaleFactor+c,
-            # since they must all be in the range (0,1). The scaleFactor is basically the
-            # "step" of lightening, which will be #unflagged_entries/(number-of-forecasts).
-            if dataset.plot_options['annotate_unflagged_entries']:
-                log.debug('Annotating unflagged tracker entries in plot')
-                rgb = ColorConverter().to_rgb( dataset.plot_options['line_color'] )
-                scaleFactor =  float(unflagged_entries[i]) / len(dataset.cycles)
-                #rgb = [ (c + min(maxDelta)*scaleFactor) for c in rgb]
-                rgb = [ (c + (1-c)*scaleFactor) for c in rgb]
-                # set the offset from the line
-                yMin,yMax = axes.get_ylim()
-                offset = (yMax - yMin) * 0.02
-                if unflagged_entries[i] != len(dataset.cycles):
-                    axes.annotate(unflagged_entries[i], xy=(time_axis_values[i],values[i]),
-                                xytext=(time_axis_values[i],values[i]+offset),
-                                color=rgb, fontsize=10, alpha=0.5)
+        if dataset.plot_options['annotate_unflagged_entries']:
+            log.debug('Annotating unflagged tracker entries in plot')
+            self._annotate_unflagged_entries(axes, dataset, time_axis_values,
+                                             values, unflagged_entries)
 
+    def _annotate_unflagged_entries(self, axes, dataset, xVals, yVals,
+                                    unflagged_entries):
+        '''
+        Annotate the points (`xVals',`yVals') of the `dataset' that have at
+        least one flagged entry with their number of `unflagged_entries'.
+        The text color is the dataset's line color, lightened in proportion to
+        the number of unflagged entries. The colors of all labels are 
+        calculated at once and they are drawn by a single PointLabels.
+        '''
+        numCycles = len(dataset.cycles)
+        counts = np.asarray(unflagged_entries)
+        yVals = np.array(yVals, dtype=float)
+        idc = np.nonzero((counts != numCycles) & ~np.isnan(yVals))[0]
+        if len(idc) == 0:
+            return
+        # The maximum amount by which we can scale the value is 
+        # (1-c)*scaleFactor+c, since they must all be in the range (0,1). The
+        # scaleFactor is basically the "step" of lightening, which will be 
+        # #unflagged_entries/(number-of-forecasts).
+        rgb = np.array(ColorConverter().to_rgb(dataset.plot_options['line_color']))
+        scaleFactors = counts[idc].astype(float) / numCycles
+        colors = rgb + (1 - rgb) * scaleFactors[:, np.newaxis]
+        # set the offset from the line
+        yMin,yMax = axes.get_ylim()
+        offset = (yMax - yMin) * 0.02
+        labels = PointLabels([ xVals[i] for i in idc ], yVals[idc], 
+                             [ str(c) for c in counts[idc] ], 
+                             [ tuple(c) for c in colors ], yOffset=offset,
+                             fontsize=10, alpha=0.5)
+        axes.add_artist(labels)
 
 
     def set_y_limits(self, param):
         '''
         Set limits for y axis. For cases where the g_static_ylim_<param> 
         variable is True, use the corresponding y_limits_<param> value-pair. 
-        For cases where it's false, use the value returned by the 
-        get_min_<param> method.
+        For cases where it's false, use the min/max of all datasets, as 
+        given by their get_range() method. This may be called before 
+        plotting anything.
         '''
         min_idx = 0
         max_idx = 1
@@ -355,13 +516,13 @@ class DaffyTCVPlotHelper(DaffyPlotHelper):
             setattr(self, 'yMin_' + param, static_limits[min_idx] )
             setattr(self, 'yMax_' + param, static_limits[max_idx] )
         else:
-            # dynamic y limit based on min/max of all datasets 
-            setattr(self, 
-                    'yMin_' + param,   
-                    self.get_min_value_for_all_datasets('expt_min_' + param) )
-            setattr(self, 
-                    'yMax_' + param,  
-                    self.get_max_value_for_all_datasets('expt_max_' + param) )
+            # dynamic y limit based on min/max of all datasets, from their
+            # range index, so the stats need not have been plotted yet
+            is_absolute = (self.cfg.difference_type == 'absolute')
+            ranges = [ ds.get_range(param, is_absolute=is_absolute) 
+                       for ds in self.datasets ]
+            setattr(self, 'yMin_' + param, min(r[0] for r in ranges))
+            setattr(self, 'yMax_' + param, max(r[1] for r in ranges))
 
         ## Basically, this is what it's doing:
         #if self.cfg.static_y_limit_track_error:
@@ -406,46 +567,38 @@ class DaffyMapHelper(DaffyPlotHelper):
         Instantiate a DaffyMapHelper. This will create the `basemap' member
         variable according to the settings in self.cfg
         '''
-        from mpl_toolkits.basemap import Basemap
         super(DaffyMapHelper, self).__init__(usage_string=usage_string)
         if axes is None:
             axes = plt.gca()
-        self.basemap = Basemap(llcrnrlon=self.cfg.map_options['western_longitude'],
-                               llcrnrlat=self.cfg.map_options['southern_latitude'],
-                               urcrnrlon=self.cfg.map_options['eastern_longitude'],
-                               urcrnrlat=self.cfg.map_options['northern_latitude'],
-                               projection=self.cfg.map_options['projection'],
-                               resolution=self.cfg.map_options['resolution'],
-                               #area_thresh=AREA_THRESHOLD,
-                               ax=axes)
-
-    def decorate_map(self):
+        # Basemaps are read from the cache_dir, if set, since instantiating
+        # them takes a while at the higher resolutions
+        self.basemap = get_basemap(
+                        cache_dir=self.cfg.basemap_cache_dir,
+                        llcrnrlon=self.cfg.map_options['western_longitude'],
+                        llcrnrlat=self.cfg.map_options['southern_latitude'],
+                        urcrnrlon=self.cfg.map_options['eastern_longitude'],
+                        urcrnrlat=self.cfg.map_options['northern_latitude'],
+                        projection=self.cfg.map_options['projection'],
+                        resolution=self.cfg.map_options['resolution'],
+                        #area_thresh=AREA_THRESHOLD,
+                        ax=axes)
+
+    def decorate_map(self, axes=None):
         '''
         Decorates the map according to the settings in the DaffyPlotConfig
-        object (e.g. draw oceans, map boundaries, etc.)
+        object (e.g. draw oceans, map boundaries, etc.) on the given `axes'
+        (default: that of self.basemap). If the cache_background map option
+        is set, the decorations are drawn as a raster image that is only 
+        rendered once for each map configuration and figure layout.
         *NOTE: For conciseness, this method assumes that all parameters are
          present*
         '''
-        map_settings = self.cfg.map_options
-        westLon = map_settings['western_longitude']
-        eastLon = map_settings['eastern_longitude']
-        upperLat = map_settings['northern_latitude']
-        lowerLat = map_settings['southern_latitude']
-
-        if map_settings['draw_coastlines']:
-            self.basemap.drawcoastlines()
-        if map_settings['draw_countries']:
-            self.basemap.drawcountries()
-        if map_settings['ocean_color'] != None:
-            self.basemap.drawmapboundary(fill_color=map_settings['ocean_color'])
-        self.basemap.fillcontinents(color=map_settings['continents_fill_color'],
-                                    lake_color=map_settings['lake_color'])
-        self.basemap.drawparallels(np.arange(lowerLat, upperLat,
-                                             map_settings['latitude_line_freq']),
-                                   labels=map_settings['latitude_label_mask'])
-        self.basemap.drawmeridians(np.arange(westLon, eastLon,
-                                             map_settings['longitude_line_freq']),
-                                    labels=map_settings['longitude_label_mask'])
+        if self.cfg.map_options['cache_background']:
+            draw_cached_map_background(
+                        self.basemap, self.cfg.map_options, ax=axes, 
+                        cache_dir=self.cfg.map_background_cache_dir)
+        else:
+            draw_map_layers(self.basemap, self.cfg.map_options, ax=axes)
 
 
 class DaffyTrackPlotHelper(DaffyMapHelper):
@@ -468,20 +621,29 @@ class DaffyTrackPlotHelper(DaffyMapHelper):
         '''
         super(DaffyTrackPlotHelper, self).__init__(usage_string=usage_string)
         self.shade_lines_by_intensity = shadeLines
+        # whether the map has the nature run track for the entire duration
+        self.draw_nature_track = draw_nature_track
         self.decorate_map()
         if draw_nature_track:
             self.draw_nature_run_track(axes=axes)
 
     def draw_nature_run_track(self, zorder=2, shadeLines=True, axes=plt.gca(),
-                              lineAlpha=0.8):
+                              lineAlpha=0.8, start_time=None, end_time=None):
         '''
         Plot the nature run track for the entire duration stored in
         self.cfg.nature_track_helper (i.e. the duration within the
         start_date and end_date in the config)
         @param zorder Z-level ordering
+        @param start_time, end_time If given, only plot the entries valid 
+               within them (seconds since epoch, inclusive)
         '''
         log.debug('plotting nature run data')
         nature_data = self.cfg.truth_track.tracker_entries
+        if start_time is not None or end_time is not None:
+            timesDict = self.cfg.truth_track.absolute_times_dict()
+            nature_data = [ timesDict[t] for t in sorted(timesDict.keys())
+                            if (start_time is None or t >= start_time)
+                            and (end_time is None or t <= end_time) ]
         nrLats = [x.lat for x in nature_data]
         nrLons = [x.lon for x in nature_data]
         if self.shade_lines_by_intensity:
@@ -489,59 +651,159 @@ class DaffyTrackPlotHelper(DaffyMapHelper):
         else:
             nrWindSpeeds = None
         # TODO pass in the gridline frequency
-        #import pdb ; pdb.set_trace()
-        track_plotter.plot_track(
-                    nrLats, nrLons, windspeeds=nrWindSpeeds,
-                    basemap=self.basemap,
-                    line_color=self.cfg.nature_line_color,
-                    line_style=self.cfg.nature_line_style,
-                    line_width=self.cfg.line_width,
-                    label=BEST_TRACK_LABEL,
-                    zorder=zorder,
-                    alpha=lineAlpha,
-                    ax=axes)
+        builder = TrackCollectionBuilder(self.basemap, ax=axes,
+                                tolerance=self.cfg.decimation_tolerance)
+        builder.add_track(nrLats, nrLons, windspeeds=nrWindSpeeds)
+        builder.draw(line_color=self.cfg.nature_line_color,
+                     line_style=self.cfg.nature_line_style,
+                     line_width=self.cfg.line_width,
+                     label=BEST_TRACK_LABEL,
+                     zorder=zorder,
+                     alpha=lineAlpha,
+                     ax=axes)
 
 
     def plot_track_for_cycle(self, dataset, cycle, axes=plt.gca(), lineAlpha=0.8):
         '''
-        Plots the track for the given dataset and cycle using the external
-        plot_track() function from the map_plotter library
+        Plots the track for the given dataset and cycle. See 
+        plot_tracks_for_dataset()
         '''
-        # Get the ForecastTrack for the given dataset and cycle and
-        # extract its position, mslp, maxwind, and flag attributes
-        forecast_track = dataset.get_tc_value_stats(cycle)
-        lons = [entry.lon for entry in forecast_track.tracker_entries]
-        lats = [entry.lat for entry in forecast_track.tracker_entries]
-        fhrs = [entry.fhr for entry in forecast_track.tracker_entries]
-        if self.shade_lines_by_intensity:
-            maxwinds = [entry.maxwind_value for entry in forecast_track.tracker_entries]
-        else:
-            maxwinds = None
-        flagged = [entry.flagged for entry in forecast_track.tracker_entries]
-        flagged_idc = [ i for i,v in enumerate(flagged) if v is True ]
+        self.plot_tracks_for_dataset(dataset, cycles=[cycle], axes=axes,
+                                     lineAlpha=lineAlpha)
 
+    def plot_tracks_for_dataset(self, dataset, cycles=None, axes=plt.gca(), 
+                                lineAlpha=0.8):
+        '''
+        Plots the tracks of the given `cycles' (default: all cycles) of the
+        given dataset. The tracks of all cycles are drawn as a single
+        LineCollection (shaded by intensity, if self.shade_lines_by_intensity
+        is set), with a single set of markers for the flagged entries and
+        another one for the time indicators.
+        '''
+        if cycles is None:
+            cycles = dataset.cycles
         # plot markers every 24 hours (or whatever frequency given in config)
         freq = self.cfg.map_options['track_plot_time_indicator_freq']
-        if freq > 0:
-            day_idc = [idx for idx,fhr in enumerate(fhrs) if (fhr*3600)%freq == 0]
-            for i in day_idc:
-                self.basemap.scatter(lons[i], lats[i],
-                                     latlon=True,
-                                     color=dataset.plot_options['line_color'],
-                                     s=10.0)
+        builder = TrackCollectionBuilder(self.basemap, ax=axes,
+                                tolerance=self.cfg.decimation_tolerance)
+        for cycle in cycles:
+            # Get the ForecastTrack for the given dataset and cycle and
+            # extract its position, mslp, maxwind, and flag attributes
+            forecast_track = dataset.get_tc_value_stats(cycle)
+            entries = forecast_track.tracker_entries
+            lons = [entry.lon for entry in entries]
+            lats = [entry.lat for entry in entries]
+            if self.shade_lines_by_intensity:
+                maxwinds = [entry.maxwind_value for entry in entries]
+            else:
+                maxwinds = None
+            flagged_idc = [ i for i,entry in enumerate(entries) 
+                            if entry.flagged is True ]
+            if freq > 0:
+                day_idc = [ i for i,entry in enumerate(entries) 
+                            if (entry.fhr*3600) % freq == 0 ]
+            else:
+                day_idc = []
+            builder.add_track(lats, lons, windspeeds=maxwinds,
+                              flagged_idc=flagged_idc, indicator_idc=day_idc)
 
         # draw stuff
-        #import pdb ; pdb.set_trace()
-        track_plotter.plot_track(lats, lons, windspeeds=maxwinds,
-                   basemap=self.basemap,
-                   indicator_freq=day_idc,
-                   line_color=dataset.plot_options['line_color'],
-                   line_style=dataset.plot_options['line_style'],
-                   line_width=dataset.plot_options['line_width'],
-                   label=dataset.name,
-                   flagged_idc=flagged_idc,
-                   alpha=lineAlpha,
-                   ax=axes)
+        builder.draw(line_color=dataset.plot_options['line_color'],
+                     line_style=dataset.plot_options['line_style'],
+                     line_width=dataset.plot_options['line_width'],
+                     label=dataset.name,
+                     alpha=lineAlpha,
+                     ax=axes)
+
+    def create_cycle_track_images(self, file_pattern=CYCLE_TRACKS_FILE_PATTERN,
+                                  cycles=None, jobs=None):
+        '''
+        Create one image per cycle with the tracks of each dataset for that
+        cycle, on the map created when instantiating this object (i.e. with
+        the decorations). The datasets, truth track and map are loaded once
+        and reused for every image.
+        If this object was instantiated with draw_nature_track=False, each 
+        image also has the nature run track within the cycle's forecast 
+        (see plot_cycle_tracks_image()). Otherwise, they all have the 
+        nature run track for the entire duration.
+        @param file_pattern Pattern of the image file names, formatted with 
+               the datetime of the cycle
+        @param cycles Cycles (seconds since epoch) to create images for 
+               (default: all cycles of all datasets)
+        @param jobs Number of processes used to create the images (default:
+               the cfg's render_jobs). The workers inherit the loaded data.
+        RETURN the list of image paths
+        '''
+        if cycles is None:
+            cycles = sorted(set(c for ds in self.datasets for c in ds.cycles))
+        if jobs is None:
+            jobs = self.cfg.render_jobs
+        for dataset in self.datasets:
+            dataset.prefetch_tc_stats([c for c in cycles if c in dataset.cycles])
+        frames = [ (cycle, file_pattern.format(
+                                datetime.datetime.utcfromtimestamp(cycle)))
+                   for cycle in cycles ]
+        jobs = min(jobs, len(frames))
+        if jobs <= 1:
+            for frame in frames:
+                self.plot_cycle_tracks_image(*frame)
+        else:
+            global _frame_plot_helper
+            _frame_plot_helper = self
+            pool = multiprocessing.Pool(jobs)
+            try:
+                pool.map(_plot_cycle_tracks_image, frames, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+                _frame_plot_helper = None
+        return [ frame[1] for frame in frames ]
+
+    def plot_cycle_tracks_image(self, cycle, path, axes=None):
+        '''
+        Plot the tracks of each dataset for the given `cycle' on the given
+        `axes' (default: that of self.basemap), add a legend and save the 
+        figure to `path'. Unless the map already has the nature run track 
+        for the entire duration (see __init__()), the part of it valid 
+        between the `cycle' and the end of its forecast (i.e. the cfg's 
+        forecast_duration) is plotted too. Afterwards, the artists that 
+        were added are removed, so the figure can be reused for other 
+        cycles.
+        '''
+        if axes is None:
+            axes = self.basemap.ax if self.basemap.ax is not None else plt.gca()
+        fig = axes.figure
+        (numLines, numCollections, numTexts, numLegends) = \
+            (len(axes.lines), len(axes.collections), len(axes.texts), 
+             len(fig.legends))
+        origLegend = axes.legend_
+        # data/view limits are restored afterwards, so they do not depend on
+        # the cycles plotted before
+        origLimits = (axes.dataLim.frozen(), axes.viewLim.frozen(),
+                      axes.get_autoscalex_on(), axes.get_autoscaley_on(),
+                      axes.ignore_existing_data_limits)
+        plt.sca(axes)
+        if not self.draw_nature_track:
+            self.draw_nature_run_track(
+                        axes=axes, start_time=cycle,
+                        end_time=cycle + self.cfg.forecast_duration)
+        for dataset in self.datasets:
+            if cycle in dataset.cycles:
+                self.plot_track_for_cycle(dataset, cycle, axes=axes)
+        self.create_simple_legend()
+        self.savefig(path, fig=fig)
+        for artist in axes.lines[numLines:] + axes.collections[numCollections:] \
+                      + axes.texts[numTexts:]:
+            artist.remove()
+        if axes.legend_ is not origLegend:
+            axes.legend_.remove()
+            axes.legend_ = origLegend
+        del fig.legends[numLegends:]
+        axes.dataLim.set(origLimits[0])
+        axes.viewLim.set(origLimits[1])
+        axes.set_autoscalex_on(origLimits[2])
+        axes.set_autoscaley_on(origLimits[3])
+        axes.ignore_existing_data_limits = origLimits[4]
 
 
 class GsiDiagPlotHelper(DaffyPlotHelper):
@@ -587,8 +849,23 @@ class GsiDiagPlotHelper(DaffyPlotHelper):
                 num_obs[ob] = len(gsirun.diags[ob])
             # TODO : create barplot for this cycle
 
+
+#
+# FUNCTIONS
+#
+
+def _plot_cycle_tracks_image(frame):
+    '''
+    Create the image of the given `frame' (a (cycle, path) tuple) in a worker
+    process of DaffyTrackPlotHelper.create_cycle_track_images()
+    '''
+    _frame_plot_helper.plot_cycle_tracks_image(*frame)
+    return frame[1]
+
+
 #
 # TEST
 #
 if __name__ == '__main__':
     helper = DaffyPlotHelper('default.cfg')
+
@@ -0,0 +1,150 @@
+'''
+Provides the TrackFileCache class, which keeps parsed tracker files (i.e. the
+ForecastTrack objects created by pycane) on disk, so that subsequent runs of
+the plotting scripts do not need to parse them again.
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import glob
+import hashlib
+import zlib
+import cPickle as pickle
+import logging
+from util import atomic_write
+
+# Increment this if the format of the cached entries changes, so that
+# entries created with previous versions are not used
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_SUFFIX = '.trk.pkz'
+
+
+class TrackFileCache(object):
+    '''
+    Stores parsed tracker files in a cache directory. Each entry is keyed by
+    the path of the tracker file(s), their size and modification time, and
+    the options passed to the parser (e.g. whether flagged entries and land
+    points were filtered), so entries are invalidated automatically when
+    the tracker files change. Entries are stored as compressed pickles.
+    The file name of each entry consists of a hash of the paths and parser
+    options followed by a hash of the file sizes and modification times,
+    so that stale entries can be found and removed when replaced.
+    '''
+    def __init__(self, cache_dir, log=None):
+        '''
+        Instantiate a TrackFileCache, creating `cache_dir' if it does not
+        exist
+        '''
+        if log is None:
+            log = logging.getLogger()
+        self.log = log
+        self.cache_dir = cache_dir
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # may have been created concurrently
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def _get_entry_path(self, paths, options):
+        '''
+        RETURN a 2-tuple consisting of the path of the cache entry for the
+        given tracker file `paths' and parser `options' and the prefix
+        shared by all entries for the same `paths' and `options'. None
+        values in `paths' are allowed (i.e. for optional files).
+        @raise OSError if any of the `paths' does not exist
+        '''
+        stamps = []
+        for path in paths:
+            if path is None:
+                stamps.append(None)
+            else:
+                st = os.stat(path)
+                stamps.append((st.st_size, repr(st.st_mtime)))
+        fileKey = repr(([ p if p is None else os.path.abspath(p)
+                          for p in paths ],
+                        sorted(options.items()), CACHE_FORMAT_VERSION))
+        prefix = hashlib.md5(fileKey).hexdigest()
+        stamp = hashlib.md5(repr(stamps)).hexdigest()[:16]
+        entryPath = os.path.join(self.cache_dir,
+                                 prefix + '-' + stamp + CACHE_FILE_SUFFIX)
+        return (entryPath, prefix)
+
+    def get(self, paths, options):
+        '''
+        RETURN the object cached for the given tracker file `paths' and
+        parser `options', or None if there is no valid entry
+        '''
+        try:
+            (entryPath, prefix) = self._get_entry_path(paths, options)
+            with open(entryPath, 'rb') as f:
+                return pickle.loads(zlib.decompress(f.read()))
+        except (IOError, OSError):
+            return None
+        except Exception as e:
+            self.log.warn("Ignoring unreadable tracker cache entry for {}: {}"
+                          .format(paths, e))
+            return None
+
+    def put(self, paths, options, track):
+        '''
+        Cache the given `track' (parsed from the tracker file `paths' using
+        the given parser `options'), replacing any stale entries for the
+        same `paths' and `options'
+        '''
+        try:
+            (entryPath, prefix) = self._get_entry_path(paths, options)
+            data = zlib.compress(pickle.dumps(track, pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            self.log.debug("Not caching track for {}: {}".format(paths, e))
+            return
+        try:
+            with atomic_write(entryPath) as f:
+                f.write(data)
+        except (IOError, OSError) as e:
+            self.log.warn("Unable to write tracker cache entry {}: {}"
+                          .format(entryPath, e))
+            return
+        for stalePath in glob.glob(os.path.join(self.cache_dir,
+                                   prefix + '-*' + CACHE_FILE_SUFFIX)):
+            if stalePath != entryPath:
+                try:
+                    os.unlink(stalePath)
+                except OSError:
+                    pass
+
+    def get_or_parse(self, paths, options, parse_func):
+        '''
+        RETURN the object cached for the given tracker file `paths' and
+        parser `options'. If there is none, call `parse_func' to create it
+        and cache it.
+        '''
+        track = self.get(paths, options)
+        if track is None:
+            track = parse_func()
+            self.put(paths, options, track)
+        else:
+            self.log.debug("Using cached track for {}".format(paths))
+        return track
+
+    def get_size(self):
+        '''
+        RETURN a 2-tuple consisting of the number of entries in the cache
+        and their total size in bytes
+        '''
+        entries = glob.glob(os.path.join(self.cache_dir,
+                                         '*' + CACHE_FILE_SUFFIX))
+        size = 0
+        for entry in entries:
+            try:
+                size += os.path.getsize(entry)
+            except OSError:
+                pass
+        return (len(entries), size)
+
+    def __str__(self):
+        (numEntries, size) = self.get_size()
+        return "TrackFileCache(dir={}, entries={}, size={:.1f} MiB)"\
+               .format(self.cache_dir, numEntries, size / 1048576.0)
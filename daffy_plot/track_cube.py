@@ -0,0 +1,311 @@
+'''
+Provides the TrackCube class, which stores the tracker data of every cycle of
+an experiment in NumPy arrays so that statistics across all cycles (e.g. the
+mean error for each forecast hour) can be calculated using vectorized
+operations instead of iterating over TrackerData objects.
+
+Javier.Delgado@noaa.gov
+'''
+
+import logging
+import numpy as np
+from pycane.postproc.tracker import objects as trkobj
+
+# Fields stored along the last axis of TrackCube.values
+VALUE_FIELDS = ('lat', 'lon', 'mslp_value', 'maxwind_value', 'flagged')
+# Fields stored along the last axis of TrackCube.errors
+ERROR_FIELDS = ('track_error', 'maxwind_error', 'mslp_error', 'flagged')
+# Statistics always calculated by TrackCube.get_error_statistics(). 
+# Percentiles may also be requested; see percentile_name()
+ERROR_STATISTICS = ('mean', 'rmse', 'median', 'std')
+
+
+class TrackCube(object):
+    '''
+    Encapsulates the tracker values and errors (relative to the truth track)
+    of all cycles of an experiment. The data are stored in two arrays:
+      values - cycle x forecast hour x VALUE_FIELDS
+      errors - cycle x forecast hour x ERROR_FIELDS
+    Slots for which the tracker did not produce an entry contain NaN.
+    The forecast hour axis has one element per history interval, from 0 to
+    the forecast duration.
+    Errors are stored as experiment-truth (i.e. relative) differences. The
+    absolute differences are derived from these when requested.
+    '''
+    def __init__(self, cycles, history_interval, forecast_duration, log=None):
+        '''
+        Instantiate an empty TrackCube
+        @param cycles List of cycles (seconds since epoch)
+        @param history_interval Interval between tracker entries (seconds)
+        @param forecast_duration Length of the forecasts (seconds)
+        '''
+        if log is None:
+            log = logging.getLogger()
+        self.log = log
+        self.cycles = list(cycles)
+        self.history_interval = history_interval
+        numFhrs = int(forecast_duration / history_interval + 1)
+        self.fhrs = np.arange(numFhrs) * history_interval / 3600.0
+        shape = (len(self.cycles), numFhrs)
+        self.values = np.empty(shape + (len(VALUE_FIELDS),))
+        self.values.fill(np.nan)
+        self.errors = np.empty(shape + (len(ERROR_FIELDS),))
+        self.errors.fill(np.nan)
+        self._cycle_idx = dict((c,i) for i,c in enumerate(self.cycles))
+        # maps get_error_statistics() arguments to its return value
+        self._statistics = {}
+        # maps is_absolute to the get_range_index() return value
+        self._range_index = {}
+
+    def fhr_index(self, fhr):
+        '''
+        RETURN the index along the forecast hour axis corresponding to
+        forecast hour `fhr'
+        '''
+        return int(fhr / (self.history_interval / 3600.0))
+
+    def _set_entries(self, arr, fields, cycle, tracker_entries):
+        '''
+        Populate the row of `arr' corresponding to `cycle' with the
+        `fields' of each of the given `tracker_entries'
+        '''
+        cycleIdx = self._cycle_idx[cycle]
+        row = arr[cycleIdx]
+        for entry in tracker_entries:
+            fhrIdx = self.fhr_index(entry.fhr)
+            if fhrIdx >= len(self.fhrs):
+                self.log.debug("Ignoring entry beyond forecast duration "
+                               "(fhr={})".format(entry.fhr))
+                continue
+            if not np.isnan(row[fhrIdx, 0]):
+                self.log.warn("More than one tracker entry maps to fhr {}. "
+                              "Is the history_interval set correctly?"
+                              .format(self.fhrs[fhrIdx]))
+            row[fhrIdx] = [ float(getattr(entry, f)) for f in fields ]
+
+    def set_track(self, cycle, forecast_track):
+        ''' Store the entries of the given ForecastTrack for `cycle' '''
+        self._set_entries(self.values, VALUE_FIELDS, cycle,
+                          forecast_track.tracker_entries)
+        self._range_index = {}
+
+    def set_errors(self, cycle, forecast_track_diff):
+        '''
+        Store the entries of the given ForecastTrackDiff for `cycle'. It
+        should contain relative (i.e. experiment-truth) differences
+        '''
+        self._set_entries(self.errors, ERROR_FIELDS, cycle,
+                          forecast_track_diff.tracker_entries)
+        self._statistics = {}
+        self._range_index = {}
+
+    def get_cycles_without_errors(self):
+        ''' RETURN the list of cycles for which there are no errors '''
+        missing = np.isnan(self.errors[..., 0]).all(axis=1)
+        return [ c for c,m in zip(self.cycles, missing) if m ]
+
+    def get_values(self, field, include_flagged=False):
+        '''
+        RETURN a masked array (cycle x fhr) of the given value `field'.
+        Missing entries are masked, as are flagged entries unless
+        `include_flagged' is True
+        '''
+        return self._get_masked(self.values, VALUE_FIELDS, field,
+                                include_flagged)
+
+    def get_errors(self, field, is_absolute=False, include_flagged=False):
+        '''
+        RETURN a masked array (cycle x fhr) of the given error `field'.
+        Missing entries are masked, as are flagged entries unless
+        `include_flagged' is True.
+        @param is_absolute If True, return abs(experiment-truth)
+        '''
+        errors = self._get_masked(self.errors, ERROR_FIELDS, field,
+                                  include_flagged)
+        if is_absolute:
+            errors = np.ma.abs(errors)
+        return errors
+
+    def _get_masked(self, arr, fields, field, include_flagged):
+        data = arr[..., fields.index(field)]
+        mask = np.isnan(data)
+        if not include_flagged:
+            mask |= (arr[..., fields.index('flagged')] == 1)
+        return np.ma.masked_array(data, mask=mask)
+
+    def get_value_range(self, field):
+        '''
+        RETURN (min,max) of the unflagged values of `field' across all
+        cycles, or (None,None) if there are no unflagged values
+        '''
+        return self.get_range_index()[(field, False)]
+
+    def get_error_range(self, field, is_absolute=False):
+        '''
+        RETURN (min,max) of the errors in `field' across all cycles,
+        including flagged entries, or (None,None) if there are no entries
+        '''
+        return self.get_range_index(is_absolute)[(field, True)]
+
+    def get_error_statistics(self, percentiles=(), is_absolute=False):
+        '''
+        Calculate the statistics of all cycles' unflagged errors for each
+        forecast hour. All statistics are calculated in a single pass over
+        the errors. The supported statistics are the ERROR_STATISTICS and
+        the given `percentiles' (in the range [0,100]), whose names are
+        given by percentile_name().
+        The results are cached, so subsequent calls with the same
+        arguments do not recalculate them.
+        RETURN a 2-tuple consisting of a dictionary mapping each statistic
+        name to a list of TrackerDataDiff objects and a list with the number
+        of unflagged entries for each forecast hour.
+        See ExperimentDataset.get_mean_tc_error_stats()
+        '''
+        percentiles = tuple(sorted(set(float(q) for q in percentiles)))
+        cacheKey = (percentiles, is_absolute)
+        if cacheKey in self._statistics:
+            return self._statistics[cacheKey]
+        counts = self.get_errors(ERROR_FIELDS[0]).count(axis=0)
+        stats = dict((name, {}) for name in ERROR_STATISTICS)
+        for q in percentiles:
+            stats[percentile_name(q)] = {}
+        for field in ERROR_FIELDS[:-1]:
+            errors = self.get_errors(field, is_absolute=is_absolute)
+            stats['mean'][field] = errors.mean(axis=0)
+            stats['rmse'][field] = np.ma.sqrt((errors**2).mean(axis=0))
+            stats['std'][field] = errors.std(axis=0)
+            # masked elements are placed at the end of each column, so the
+            # first fieldCounts[i] elements of column i are the sorted errors.
+            # The masks of the fields may differ (e.g. missing mslp values)
+            fieldCounts = errors.count(axis=0)
+            sortedErrors = np.ma.sort(errors, axis=0, endwith=True).data
+            stats['median'][field] = _sorted_percentile(sortedErrors,
+                                                        fieldCounts, 50)
+            for q in percentiles:
+                stats[percentile_name(q)][field] = \
+                    _sorted_percentile(sortedErrors, fieldCounts, q)
+        counts = [ int(c) for c in counts ]
+        ret = (dict((name, self._to_tracker_diffs(fieldStats, counts))
+                    for name,fieldStats in stats.iteritems()),
+               counts)
+        self._statistics[cacheKey] = ret
+        return ret
+
+    def get_range_index(self, is_absolute=False):
+        '''
+        RETURN a dictionary mapping (param, include_flagged) to the 
+        (min,max) of `param' across all cycles, where param is any of the
+        value or error fields (e.g. 'mslp_value', 'track_error') and
+        include_flagged indicates whether flagged entries were considered.
+        (None,None) is used for params with no entries. 
+        @param is_absolute If True, the ranges of the errors are those of
+               their absolute values
+        '''
+        if not is_absolute in self._range_index:
+            index = {}
+            for include_flagged in (True, False):
+                for field in VALUE_FIELDS[:-1]:
+                    index[(field, include_flagged)] = _masked_range(
+                            self.get_values(field, 
+                                            include_flagged=include_flagged))
+                for field in ERROR_FIELDS[:-1]:
+                    index[(field, include_flagged)] = _masked_range(
+                            self.get_errors(field, is_absolute=is_absolute,
+                                            include_flagged=include_flagged))
+            self._range_index[is_absolute] = index
+        return self._range_index[is_absolute]
+
+    def get_mean_errors(self, is_absolute=False):
+        '''
+        Calculate the mean error of all cycles' unflagged entries for
+        each forecast hour.
+        RETURN a 2-tuple consisting of a list of TrackerDataDiff objects
+        and a list with the number of unflagged entries for each forecast
+        hour. See ExperimentDataset.get_mean_tc_error_stats()
+        '''
+        (stats, counts) = self.get_error_statistics(is_absolute=is_absolute)
+        return (stats['mean'], counts)
+
+    def get_rms_errors(self, is_absolute=False):
+        '''
+        Same as get_mean_errors(), but calculate the root mean square error
+        '''
+        (stats, counts) = self.get_error_statistics(is_absolute=is_absolute)
+        return (stats['rmse'], counts)
+
+    def _to_tracker_diffs(self, stats, counts):
+        '''
+        Create a list of TrackerDataDiff objects, one for each forecast hour,
+        populated with the values of the `stats' dictionary, which maps each
+        error field to an array with one value per forecast hour.
+        For forecast hours in which all values are flagged, set the value
+        to the previous fhr's value, to keep the plots smooth. If they're
+        all flagged for the first forecast hour, set the value to None
+        '''
+        tracker_entries = []
+        for i in range(len(self.fhrs)):
+            currFhr = i * self.history_interval / 3600
+            entry = trkobj.TrackerDataDiff(currFhr, False, 0, 0, 0)
+            for field,values in stats.iteritems():
+                values = np.ma.masked_invalid(values)
+                if counts[i] > 0 and values[i] is not np.ma.masked:
+                    setattr(entry, field, float(values[i]))
+                elif i == 0:
+                    setattr(entry, field, None)
+                else:
+                    setattr(entry, field,
+                            getattr(tracker_entries[i-1], field))
+            tracker_entries.append(entry)
+        return tracker_entries
+
+
+def percentile_name(q):
+    '''
+    RETURN the name of the statistic corresponding to the `q'th percentile
+    (e.g. 'p90' or 'p2.5')
+    '''
+    return 'p%g' %float(q)
+
+def parse_percentile_name(name):
+    '''
+    RETURN the percentile corresponding to the statistic `name' (see
+    percentile_name()) or None if `name' does not denote a percentile
+    '''
+    if not name.startswith('p'):
+        return None
+    try:
+        q = float(name[1:])
+    except ValueError:
+        return None
+    if not 0 <= q <= 100:
+        return None
+    return q
+
+def _sorted_percentile(sortedArr, counts, q):
+    '''
+    RETURN a masked array containing the `q'th percentile of each column of 
+    `sortedArr', whose first counts[i] elements in column i are valid
+    and sorted. Values are linearly interpolated between the closest ranks
+    (i.e. like numpy.percentile()). Columns with no valid elements are
+    masked.
+    '''
+    counts = np.asarray(counts)
+    if sortedArr.shape[0] == 0:
+        return np.ma.masked_all(counts.shape)
+    cols = np.arange(sortedArr.shape[1])
+    rank = np.maximum(counts - 1, 0) * (q / 100.0)
+    lo = np.floor(rank).astype(int)
+    hi = np.ceil(rank).astype(int)
+    loVals = sortedArr[lo, cols]
+    hiVals = sortedArr[hi, cols]
+    vals = loVals + (hiVals - loVals) * (rank - lo)
+    return np.ma.masked_array(vals, mask=(counts == 0))
+
+def _masked_range(arr):
+    '''
+    RETURN (min,max) of the given masked array, or (None,None) if all of
+    its elements are masked
+    '''
+    if arr.count() == 0:
+        return (None, None)
+    return (float(arr.min()), float(arr.max()))
@@ -0,0 +1,138 @@
+'''
+Provides routines for drawing hurricane tracks on a Basemap using a single
+LineCollection per set of tracks (e.g. all cycles of a dataset), rather than
+one line per sub-segment, with each sub-segment shaded according to the
+storm's intensity.
+
+Javier.Delgado@noaa.gov
+'''
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import ColorConverter
+from decimate import decimate_line, local_extrema
+
+# Number of points of each of the sub-lines whose shade is determined by the
+# mean maximum wind speed of its points
+SUBLINE_LENGTH = 3
+# Size of the markers indicating flagged entries and time indicators
+FLAGGED_MARKER_SIZE = 35.0
+TIME_MARKER_SIZE = 10.0
+
+
+def get_track_sublines(num_points):
+    '''
+    RETURN a list of (start,end) indices of the sub-lines of a track with
+    `num_points' points. Consecutive sub-lines share one point, and the last
+    one is extended to include the remaining points, so that all sub-lines
+    have at least SUBLINE_LENGTH points.
+    '''
+    sublines = []
+    sublineLength = SUBLINE_LENGTH
+    for i in range(0, num_points - 2, SUBLINE_LENGTH):
+        # if next subline would have less than 3 elements, extend the
+        # current subline correspondingly
+        if (i + sublineLength) >= (num_points - (SUBLINE_LENGTH - 1)):
+            sublineLength = sublineLength + (num_points % SUBLINE_LENGTH)
+        sublines.append( (i, min(i + sublineLength + 1, num_points)) )
+    return sublines
+
+
+class TrackCollectionBuilder(object):
+    '''
+    Accumulates the tracks of several cycles so that they are drawn with a
+    single LineCollection, a single scatter() for the flagged entries and a
+    single scatter() for the time indicators
+    '''
+    def __init__(self, basemap, tolerance=0, ax=None):
+        '''
+        Instantiate a TrackCollectionBuilder that projects the points using
+        the given `basemap'.
+        @param tolerance If greater than 0, the tracks are decimated so that
+               they deviate at most this many pixels from the original when
+               drawn on the given Axes `ax' (default: that of the basemap).
+               Flagged entries, time indicators and intensity extrema are
+               always kept.
+        '''
+        self.basemap = basemap
+        self.tolerance = tolerance
+        if ax is None:
+            ax = basemap.ax if basemap.ax is not None else plt.gca()
+        self.ax = ax
+        self.segments = []
+        self.alphas = []
+        self.flagged_points = []
+        self.indicator_points = []
+
+    def add_track(self, lats, lons, windspeeds=None, flagged_idc=(),
+                  indicator_idc=()):
+        '''
+        Add the track with the given `lats' and `lons'. If `windspeeds' are
+        given, the alpha of each sub-line is its mean wind speed relative to
+        the maximum of the track. The points at `flagged_idc' and
+        `indicator_idc' are marked.
+        '''
+        assert len(lats) == len(lons)
+        if len(lats) == 0:
+            return
+        (x, y) = self.basemap(np.asarray(lons, dtype=float),
+                              np.asarray(lats, dtype=float))
+        points = np.column_stack((np.atleast_1d(x), np.atleast_1d(y)))
+        if windspeeds is not None:
+            assert len(windspeeds) == len(lats)
+            windspeeds = np.asarray(windspeeds, dtype=float)
+        if self.tolerance > 0:
+            keepIdc = list(flagged_idc) + list(indicator_idc)
+            if windspeeds is not None:
+                keepIdc.extend(local_extrema(windspeeds))
+            basemap = self.basemap
+            idc = decimate_line(self.ax, points[:,0], points[:,1],
+                                self.tolerance, keep_idc=keepIdc,
+                                xRange=basemap.urcrnrx - basemap.llcrnrx,
+                                yRange=basemap.urcrnry - basemap.llcrnry,
+                                equal_aspect=True)
+            points = points[idc]
+            if windspeeds is not None:
+                windspeeds = windspeeds[idc]
+            flagged_idc = np.searchsorted(idc, flagged_idc)
+            indicator_idc = np.searchsorted(idc, indicator_idc)
+        if windspeeds is not None:
+            maxWindspeed = windspeeds.max()
+            if not maxWindspeed > 0:
+                windspeeds = None
+        for (start, end) in get_track_sublines(len(points)):
+            self.segments.append(points[start:end])
+            if windspeeds is None:
+                self.alphas.append(None)
+            else:
+                self.alphas.append(windspeeds[start:end].mean() / maxWindspeed)
+        self.flagged_points.extend(points[i] for i in flagged_idc)
+        self.indicator_points.extend(points[i] for i in indicator_idc)
+
+    def draw(self, line_color='black', line_style='-', line_width=1.5,
+             alpha=1.0, label=None, zorder=2, ax=None):
+        '''
+        Draw the tracks that were added on the given Axes (default: the one
+        given when instantiating this object).
+        RETURN the LineCollection
+        '''
+        if ax is None:
+            ax = self.ax
+        colors = np.tile(ColorConverter().to_rgba(line_color),
+                         (len(self.segments), 1))
+        colors[:, 3] = [ alpha if a is None else a for a in self.alphas ]
+        lines = LineCollection(self.segments, colors=colors,
+                               linewidths=line_width, linestyles=line_style,
+                               label=label, zorder=zorder)
+        ax.add_collection(lines)
+        if len(self.flagged_points) > 0:
+            flagged = np.array(self.flagged_points)
+            ax.scatter(flagged[:, 0], flagged[:, 1], s=FLAGGED_MARKER_SIZE,
+                       facecolors='red', edgecolors=line_color)
+        if len(self.indicator_points) > 0:
+            indicators = np.array(self.indicator_points)
+            ax.scatter(indicators[:, 0], indicators[:, 1], color=line_color,
+                       s=TIME_MARKER_SIZE)
+        self.basemap.set_axes_limits(ax=ax)
+        return lines
@@ -0,0 +1,109 @@
+'''
+Provides the TruthIndex class, which stores the "truth" track (i.e. nature
+run or best track) as NumPy arrays sorted by time, so that the truth values
+corresponding to many valid times can be looked up at once.
+
+Javier.Delgado@noaa.gov
+'''
+
+import numpy as np
+
+# Fields of the truth track's entries stored by the TruthIndex
+TRUTH_FIELDS = ('lat', 'lon', 'mslp_value', 'maxwind_value', 'flagged')
+
+
+class TruthIndex(object):
+    '''
+    Encapsulates the entries of a truth ForecastTrack. The valid times
+    (seconds since epoch) of the entries are kept in the sorted `times'
+    array and the values of each of the TRUTH_FIELDS in the `columns'
+    dictionary, whose arrays are parallel to `times'.
+    '''
+    def __init__(self, truth_track):
+        '''
+        Instantiate a TruthIndex from the given `truth_track' (a
+        ForecastTrack)
+        '''
+        timesDict = truth_track.absolute_times_dict()
+        self.times = np.array(sorted(timesDict.keys()), dtype=float)
+        entries = [ timesDict[t] for t in sorted(timesDict.keys()) ]
+        self.columns = {}
+        for field in TRUTH_FIELDS:
+            self.columns[field] = np.array([ float(getattr(e, field))
+                                             for e in entries ])
+        # truth values aligned to regular series of times (see get_series())
+        self._series = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def align(self, times, interpolate=False):
+        '''
+        Get the truth values corresponding to the given valid `times'
+        (seconds since epoch, as an array of any shape).
+        @param interpolate If True, times that fall between two truth
+               entries are linearly interpolated (e.g. if the truth track's
+               output frequency is lower than the forecasts'). Otherwise,
+               only times for which there is a truth entry are matched.
+        RETURN a dictionary mapping each of the TRUTH_FIELDS to an array
+        with the same shape as `times'. Elements that could not be matched
+        are NaN. The 'flagged' of interpolated elements is set if either of
+        the surrounding entries is flagged.
+        '''
+        times = np.asarray(times, dtype=float)
+        ret = {}
+        for field in TRUTH_FIELDS:
+            ret[field] = np.empty(times.shape)
+            ret[field].fill(np.nan)
+        if len(self.times) == 0:
+            return ret
+        idx = np.searchsorted(self.times, times)
+        clippedIdx = np.minimum(idx, len(self.times) - 1)
+        exact = self.times[clippedIdx] == times
+        for field in TRUTH_FIELDS:
+            ret[field][exact] = self.columns[field][clippedIdx[exact]]
+        if interpolate:
+            between = ~exact & (idx > 0) & (idx < len(self.times))
+            hi = idx[between]
+            lo = hi - 1
+            weight = (times[between] - self.times[lo]) / \
+                     (self.times[hi] - self.times[lo])
+            for field in TRUTH_FIELDS:
+                col = self.columns[field]
+                if field == 'flagged':
+                    ret[field][between] = np.maximum(col[lo], col[hi])
+                else:
+                    ret[field][between] = col[lo] + (col[hi] - col[lo]) * weight
+        return ret
+
+    def get_series(self, start, count, interval, interpolate=False):
+        '''
+        Get the truth values corresponding to the `count' valid times
+        `start', `start'+`interval', ... (seconds since epoch), as align()
+        would. The first time a series of times with a given `interval' and
+        phase is requested, the truth values are aligned to a regular series
+        of times spanning the whole truth track, so that subsequent windows
+        (e.g. the forecast hours of each cycle) are sliced from it.
+        RETURN a dictionary mapping each of the TRUTH_FIELDS to an array
+        of length `count'
+        '''
+        if interval <= 0 or len(self.times) == 0:
+            return self.align(start + interval * np.arange(count),
+                              interpolate=interpolate)
+        first = self.times[0]
+        base = start - np.floor((start - first) / interval) * interval
+        key = (interval, base - first, interpolate)
+        if not key in self._series:
+            numTimes = int(np.floor((self.times[-1] - base) / interval)) + 1
+            self._series[key] = \
+                self.align(base + interval * np.arange(max(numTimes, 0)),
+                           interpolate=interpolate)
+        series = self._series[key]
+        idx = int(round((start - base) / interval)) + np.arange(count)
+        valid = (idx >= 0) & (idx < len(series['lat']))
+        ret = {}
+        for field in TRUTH_FIELDS:
+            ret[field] = np.empty(count)
+            ret[field].fill(np.nan)
+            ret[field][valid] = series[field][idx[valid]]
+        return ret
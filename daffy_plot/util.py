@@ -1,3 +1,10 @@
+import os
+import sys
+import tempfile
+import threading
+import contextlib
+from odict import OrderedDict
+
 def get_marked_indices(inputList):
     '''
     RETURN the indices of elements in <inputList> whose value is True
@@ -6,3 +13,106 @@ def get_marked_indices(inputList):
     for i in range(len(inputList)):
         if inputList[i]: ret.append(i)
     return ret
+
+
+@contextlib.contextmanager
+def atomic_write(path, suffix='.tmp'):
+    '''
+    Context manager that RETURNs a file object, opened for writing in 
+    binary mode, to a temporary file in the directory of `path'. When the 
+    block exits without an exception, the file is renamed to `path', so 
+    readers never see a partially-written file; otherwise it is removed.
+    As with open(), the file permissions are those allowed by the umask.
+    '''
+    (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                     suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        # mkstemp() creates the file readable only by its owner
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmpPath, 0o666 & ~umask)
+        os.rename(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.unlink(tmpPath)
+
+
+class LRUCache(object):
+    '''
+    Dictionary-like cache that evicts the least recently used entries when 
+    it holds more than `max_entries' entries or more than `max_bytes' bytes.
+    The size of each value is determined by the `sizeof' function passed to
+    the constructor. The number of lookups that were found (`hits') and not
+    found (`misses') in the cache are kept track of.
+    It is safe to use from multiple threads.
+    '''
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        '''
+        Instantiate an empty LRUCache
+        @param max_entries Maximum number of entries. None means no limit
+        @param max_bytes Maximum cumulative size of the values, as given by
+               `sizeof'. None means no limit
+        @param sizeof Function that returns the size of a value, in bytes.
+               If not passed in, sys.getsizeof() is used
+        '''
+        if sizeof is None:
+            sizeof = sys.getsizeof
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        # maps key to (value, size), least recently used first
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        RETURN the value cached for `key' (marking it as the most recently
+        used) or `default' if it is not cached
+        '''
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        ''' Cache `value' for `key', evicting entries as needed '''
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > 1 and \
+                  ((self.max_entries is not None 
+                    and len(self._entries) > self.max_entries) or
+                   (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                self.nbytes -= self._entries.popitem(0)[1][1]
+            if self.max_entries == 0:
+                self._entries.clear()
+                self.nbytes = 0
+
+    def clear(self):
+        ''' Remove all entries. The hit/miss counters are not reset '''
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "LRUCache(entries={}, bytes={}, hits={}, misses={})"\
+               .format(len(self), self.nbytes, self.hits, self.misses)
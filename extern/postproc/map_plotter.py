@@ -15,7 +15,10 @@ from matplotlib.pyplot import gca
 from mpl_toolkits.basemap import Basemap
 #from util import get_marked_indices
 from matplotlib.colors import ColorConverter
+from matplotlib.collections import LineCollection
 import logging as log
+# DaffyPlot needs to be in the PYTHONPATH
+from daffy_plot.track_renderer import get_track_sublines
 
 WEST_CORNER = -85.0
 EAST_CORNER = -35.0
@@ -66,6 +69,9 @@ def plot_track(lats, lons, **kwargs):
                      [lowerLat, westLon, upperLat, eastLon]
                  If not passed in, use the global variables defined in
                  this module
+     - basemap_cache_dir - If set and basemap is not passed in, read the
+                 Basemap object from/add it to the DaffyPlot BasemapCache 
+                 in this directory
      - indicator_freq - If set, mark points corresponding to this
                         interval.
                         e.g. if passing in values ever 6 hours and you want
@@ -136,11 +142,18 @@ def plot_track(lats, lons, **kwargs):
             westLon = WEST_CORNER
             upperLat = NORTH_CORNER
             eastLon = EAST_CORNER
-        m = Basemap(llcrnrlon=westLon,llcrnrlat=lowerLat,
-                    urcrnrlon=eastLon,urcrnrlat=upperLat,
-                    projection=MAP_PROJECTION, resolution=MAP_RESOLUTION,
-                    area_thresh=AREA_THRESHOLD,
-                    ax=ax)
+        basemap_kwargs = dict(llcrnrlon=westLon,llcrnrlat=lowerLat,
+                              urcrnrlon=eastLon,urcrnrlat=upperLat,
+                              projection=MAP_PROJECTION, 
+                              resolution=MAP_RESOLUTION,
+                              area_thresh=AREA_THRESHOLD)
+        if kwargs.has_key('basemap_cache_dir'):
+            # only available when DaffyPlot is in the PYTHONPATH
+            from daffy_plot.basemap_cache import get_basemap
+            m = get_basemap(cache_dir=kwargs['basemap_cache_dir'], ax=ax,
+                            **basemap_kwargs)
+        else:
+            m = Basemap(ax=ax, **basemap_kwargs)
 
     #
     # plot track
@@ -159,34 +172,32 @@ def plot_track(lats, lons, **kwargs):
     # multiple times, the effect of different colors/alphas is greatly diminished.
     # a better temporary scheme is to only do each 3-point 'subline' once
     # and use the average of the 3 points' maxwind values to determine the shading.
-    #for i in range(len(lats) - 2):
-    subline_length = 3
-    for i in range(0, len(lats) - 2, subline_length):
-        # if next subline would have less than 3 elements, extend the
-        # current subline correspondingly
-        if (i+subline_length) >= ( len(lats) - (subline_length - 1) ):
-            subline_length = subline_length + (len(lats) % subline_length)
+    # All sublines are drawn as a single LineCollection, with the points
+    # projected at once and the alpha of each subline in its color
+    (xs, ys) = m(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    points = np.column_stack((np.atleast_1d(xs), np.atleast_1d(ys)))
+    segments = []
+    alphas = []
+    for (start, end) in get_track_sublines(len(points)):
         if len(maxwinds) > 0:
-            #scale_factor = maxwinds[i] / max_maxwind
-            scale_factor = np.mean(maxwinds[i:i+subline_length+1]) / max_maxwind
+            scale_factor = np.mean(maxwinds[start:end]) / max_maxwind
             # This scheme only works with black and other mixed colors...
             # not the common red,green,blue, etc.
-            #currColor = [ max(0,c - scale_factor) for c in rgb]
-            #print currColor
             # for now, just use alpha
-            if line_alpha != 1:
-                log.debug('Note: currently using a crude scheme for line color'\
-                       ' that just modifies the alpha')
-            currColor = line_color
-            line_alpha =  scale_factor
-            log.debug(line_alpha)
+            alphas.append(scale_factor)
         else:
-            currColor = line_color
-        m.plot(lons[i:i+subline_length+1], lats[i:i+subline_length+1],
-               latlon=True, color=currColor,
-               linewidth=line_width, alpha=line_alpha, ls=line_style,
-               zorder=zorder,
-               **mpl_plot_kwargs)
+            alphas.append(line_alpha)
+        segments.append(points[start:end])
+    if len(maxwinds) > 0 and line_alpha != 1:
+        log.debug('Note: currently using a crude scheme for line color'\
+               ' that just modifies the alpha')
+    colors = np.tile(ColorConverter().to_rgba(line_color), (len(segments), 1))
+    colors[:, 3] = alphas
+    ax.add_collection(LineCollection(segments, colors=colors, 
+                                     linewidths=line_width, 
+                                     linestyles=line_style, zorder=zorder,
+                                     **mpl_plot_kwargs))
+    m.set_axes_limits(ax=ax)
 
     # plot markers on flagged points - this is slow!
     if kwargs.has_key('flagged_idc') and len(kwargs['flagged_idc']) > 0:
@@ -206,9 +217,10 @@ def plot_track(lats, lons, **kwargs):
                   facecolors='red', edgecolors=line_color)
 
     # plot markers every 24 hours
-    if kwargs.has_key('indicator_freq'):
-        for i in kwargs['indicator_freq']:
-            m.scatter(lons[i], lats[i], latlon=True, color=line_color, s=10.0)
+    if kwargs.has_key('indicator_freq') and len(kwargs['indicator_freq']) > 0:
+        idc = kwargs['indicator_freq']
+        m.scatter([lons[i] for i in idc], [lats[i] for i in idc], latlon=True, 
+                  color=line_color, s=10.0)
     # make color coded line, with higher wind speeds having darker color
 
     # draw coastlines, meridians and parallels.
@@ -14,7 +14,7 @@ import matplotlib
 matplotlib.use('Agg')
 from matplotlib.pyplot import savefig, show
 from daffy_plot.plot_helper import DaffyTCVPlotHelper
-from common import create_grid_of_plots
+from common import create_grids_of_plots
 
 USAGE_STRING = ("Usage: %prog [options].\nCreate images consisting of "
                "grids of errors for each cycle in the specified range "
@@ -33,22 +33,23 @@ if __name__ == '__main__':
    else:
         diffStr = "(Experiment - Nature)"
    
-   create_grid_of_plots(plot_helper, 'track_error', x_label="Forecast Hour", 
-                        y_label="Track Error", figure_title="Track Error", 
-                        legend_position = plot_helper.cfg.legend_position, 
-                        plots_per_page=16, save_prefix='track_error_grid')
-
-   create_grid_of_plots(plot_helper, 'maxwind_error', x_label="Forecast Hour", 
-                        y_label="Max 10m Wind Error", 
-                        figure_title="Max Wind Error {}.".format(diffStr),
-                        legend_position = plot_helper.cfg.legend_position,
-                        plots_per_page=16, save_prefix='maxwind_error_grid')
-
-   create_grid_of_plots(plot_helper, 'mslp_error', x_label="Forecast Hour", 
-                        y_label="MSLP Error (mb)", 
-                        figure_title="MSLP Error {}".format(diffStr),
-                        legend_position = plot_helper.cfg.legend_position,
-                        plots_per_page=16, save_prefix='mslp_error_grid')
+   # all three metrics are rendered together, so that their pages may be
+   # rendered concurrently (see the render_jobs config option)
+   create_grids_of_plots(plot_helper, [
+        dict(metric_name='track_error', x_label="Forecast Hour", 
+             y_label="Track Error", figure_title="Track Error", 
+             legend_position = plot_helper.cfg.legend_position, 
+             plots_per_page=16, save_prefix='track_error_grid'),
+        dict(metric_name='maxwind_error', x_label="Forecast Hour", 
+             y_label="Max 10m Wind Error", 
+             figure_title="Max Wind Error {}.".format(diffStr),
+             legend_position = plot_helper.cfg.legend_position,
+             plots_per_page=16, save_prefix='maxwind_error_grid'),
+        dict(metric_name='mslp_error', x_label="Forecast Hour", 
+             y_label="MSLP Error (mb)", 
+             figure_title="MSLP Error {}".format(diffStr),
+             legend_position = plot_helper.cfg.legend_position,
+             plots_per_page=16, save_prefix='mslp_error_grid') ])
    #savefig('maxwind_error_grid.png')
    #savefig('maxwind_error_grid.png')
    #savefig('mslp_error_grid.png')
@@ -19,7 +19,7 @@ Javier.Delgado@noaa.gov
 
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, savefig, axhline, ylim, gca, scatter
+from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, axhline, ylim, gca, scatter
 import logging as log
 from daffy_plot.tracker_utils import get_experiment_diapost_data, get_nature_track_data
 from daffy_plot.plot_helper import DaffyTCVPlotHelper
@@ -48,6 +48,6 @@ for metric_name in ('track_error', 'mslp_error', 'maxwind_error'):
          else: alpha = max(0.2, float(cycleIdx)/(len(dataset.cycles)-1) )
          plot_helper.plot_dataset_metric_vs_fhr(dataset, cycle, metric_name, y_label=metric_name, alpha=alpha) 
    plot_helper.create_simple_legend()
-   savefig(metric_name + '.png')
+   plot_helper.savefig(metric_name + '.png')
    
 
@@ -12,7 +12,7 @@ Usage: %prog [options].
 
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, savefig, axhline, ylim, gca, scatter
+from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, axhline, ylim, gca, scatter
 import logging as log
 from daffy_plot.plot_helper import DaffyTCVPlotHelper
 
@@ -32,7 +32,7 @@ def main():
        for dataset in plot_helper.datasets:
           plot_helper.plot_mean_dataset_metric_vs_fhr(dataset, metric_name, y_label=metric_name)
        plot_helper.create_simple_legend()
-       savefig(outputfile_prefix + metric_name + '.png')
+       plot_helper.savefig(outputfile_prefix + metric_name + '.png')
        
 if __name__ == '__main__':
     main()
@@ -20,7 +20,7 @@ Javier.Delgado@noaa.gov
 
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, savefig, axhline, ylim, gca, scatter
+from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, axhline, ylim, gca, scatter
 import logging as log
 from daffy_plot.plot_helper import DaffyTCVPlotHelper
 
@@ -57,6 +57,6 @@ for metric_name in ('mslp_value', 'maxwind_value'):
          plot_helper.plot_dataset_metric_vs_fhr(dataset, cycle, metric_name, y_label=metric_name, alpha=alpha) 
          #plot_helper.plot_dataset_metric_vs_fhr(dataset, cycle, metric_name, y_label=metric_name, alpha=0.5)
    plot_helper.create_simple_legend()
-   savefig(metric_name + '.png')
+   plot_helper.savefig(metric_name + '.png')
    
 
@@ -10,7 +10,7 @@ options.
 
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, show, legend, figure, savefig, gca
+from matplotlib.pyplot import plot, show, legend, figure, gca
 import logging as log
 from daffy_plot.plot_helper import DaffyTrackPlotHelper
 
@@ -24,12 +24,12 @@ plot_helper = DaffyTrackPlotHelper(usage_string=USAGE, shadeLines=False)
 
    
 #figure()
+# all cycles of each dataset are drawn as a single collection
 for dataset in plot_helper.datasets:
-    for cycle in dataset.cycles:
-        plot_helper.plot_track_for_cycle(dataset, cycle)
+    plot_helper.plot_tracks_for_dataset(dataset)
 log.info("Overriding alpha level for legend")
 plot_helper.cfg.legend_alpha = 0.97
 plot_helper.create_simple_legend() # TODO : can we use same one from tcvplothelper?
-savefig('tracks.png')  
+plot_helper.savefig('tracks.png')  
 #savefig('/home/Javier.Delgado/www/img/tracks.png')
 
@@ -6,6 +6,9 @@
 from subprocess import call, Popen, STDOUT
 import sys
 import os
+import glob
+import time
+import ConfigParser
 
 # Location of top-level directory of daffyplot distribution to test
 TEST_DISTRIBUTION = '../trunk'
@@ -39,6 +42,12 @@ test_cases = \
        'plot_tcvValues_with_Nature.py' : ( 'maxwind_value.png', 'mslp_value.png'),
        'plot_tracks.py' : ['tracks.png'],
     }
+# scripts whose pages are rendered concurrently if render_jobs > 1. Their 
+# outputs should be the same as when rendering serially
+PARALLEL_RENDER_SCRIPTS = ['grid_fhr_vs_tcvError_multipleForecasts.py']
+# render_jobs to compare the serial outputs of PARALLEL_RENDER_SCRIPTS to
+PARALLEL_RENDER_JOBS = 3
+
 # map configurations to dataset(s) they should use for testing
 dataset_mappings = \
     { 'cfg1' : '1cs1gsi2enkf_1',
@@ -47,6 +56,57 @@ dataset_mappings = \
       'cfg4' : 'different_model_configs',
     }
 
+def run_script(scriptName, config_file, logfile_name):
+    '''
+    Run the given script of the TEST_DISTRIBUTION with the given
+    `config_file', logging its output to `logfile_name'.
+    RETURN the PNG files it created
+    '''
+    startTime = time.time() - 1
+    with open(logfile_name, 'w') as logfile:
+        p = Popen( [TEST_DISTRIBUTION+'/'+scriptName,"-c",config_file],
+                   stdout=logfile, stderr=STDOUT )
+        p.wait()
+    return [ f for f in glob.glob('*.png') if os.path.getmtime(f) >= startTime ]
+
+def compare_render_jobs(config_file):
+    '''
+    Run each of the PARALLEL_RENDER_SCRIPTS serially and with 
+    PARALLEL_RENDER_JOBS render_jobs.
+    RETURN the output files that differ
+    '''
+    differences = []
+    configs = {}
+    for jobs in (1, PARALLEL_RENDER_JOBS):
+        conf = ConfigParser.RawConfigParser()
+        conf.read(config_file)
+        if not conf.has_section('basic_settings'):
+            conf.add_section('basic_settings')
+        conf.set('basic_settings', 'render_jobs', str(jobs))
+        configs[jobs] = 'render_jobs_%d.cfg' %jobs
+        with open(configs[jobs], 'w') as f:
+            conf.write(f)
+    for scriptName in PARALLEL_RENDER_SCRIPTS:
+        logfile_name = scriptName + '.render_jobs.log'
+        serialOutputs = run_script(scriptName, configs[1], logfile_name)
+        for outFile in serialOutputs:
+            os.rename(outFile, 'serial_' + outFile)
+        parallelOutputs = run_script(scriptName, configs[PARALLEL_RENDER_JOBS],
+                                     logfile_name)
+        if sorted(parallelOutputs) != sorted(serialOutputs):
+            differences.append(scriptName)
+        for outFile in serialOutputs:
+            if outFile in parallelOutputs \
+               and call(["diff", outFile, 'serial_' + outFile]) == 0:
+                os.unlink('serial_' + outFile)
+                os.unlink(outFile)
+            else:
+                differences.append(outFile)
+        os.unlink(logfile_name)
+    for path in configs.values():
+        os.unlink(path)
+    return differences
+
 # run tests to compare each script's output to the existing output
 for config in CONFIGS:
     print 'Testing configuration "%s" with dataset "%s"' \
@@ -63,10 +123,7 @@ for config in CONFIGS:
     regressions = []
     for scriptName,outputs in test_cases.iteritems():
         logfile_name = scriptName + '.log'
-        with open(logfile_name, 'w') as logfile:
-            p = Popen( [TEST_DISTRIBUTION+'/'+scriptName,"-c",config_file],
-                       stdout=logfile, stderr=STDOUT )
-            p.wait()
+        run_script(scriptName, config_file, logfile_name)
         #if x != 0:
         #   print "Error with ", scriptName
         for outFile in outputs:
@@ -81,6 +138,8 @@ for config in CONFIGS:
             regressions.append(logfile_name)
         else:
             os.unlink(logfile_name)
+    # the outputs should not depend on the number of rendering processes
+    regressions.extend(compare_render_jobs(config_file))
 
     # Since the user will probably want to look at the output, 
     # terminate execution if differences were found, lest we 
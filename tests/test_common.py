@@ -0,0 +1,171 @@
+'''
+Unit tests for the grids of plots created by the common module of the
+plotting scripts, using a PlotHelper that plots made-up tracker data
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import unit_env
+try:
+    import common
+    import matplotlib.pyplot as plt
+except ImportError:
+    common = None # pycane or other DaffyPlot dependencies are not installed
+
+METRIC = 'mslp_error'
+CYCLES = [ 1122854400 + i * 21600 for i in range(7) ]
+
+
+class Entry(object):
+    def __init__(self, fhr, value, flagged):
+        self.fhr = fhr
+        setattr(self, METRIC, value)
+        self.flagged = flagged
+
+
+class Track(object):
+    def __init__(self, entries):
+        self.tracker_entries = entries
+
+
+class TrackCube(object):
+    def get_range_index(self, is_absolute):
+        pass
+
+
+class Dataset(object):
+    def __init__(self, name, seed):
+        self.name = name
+        self.seed = seed
+        self.cycles = CYCLES
+        self.track_cube = TrackCube()
+
+    def prefetch_tc_stats(self, errors, is_absolute):
+        pass
+
+
+class Config(object):
+    render_jobs = 1
+    difference_type = 'absolute'
+    legend_alpha = 0.5
+    plot_flagged_tracker_entries = True
+
+
+class PlotHelper(object):
+    '''
+    Plots the made-up tracker data of each dataset like a DaffyTCVPlotHelper,
+    flagging the first and last entries of the cycles in `flagged_cycles'
+    '''
+    def __init__(self, flagged_cycles=()):
+        self.cfg = Config()
+        self.datasets = [ Dataset('exp1', 1), Dataset('exp2', 2) ]
+        self.flagged_cycles = flagged_cycles
+
+    def get_dataset_metric_track(self, dataset, cycle, metric_name):
+        rs = np.random.RandomState(dataset.seed * 100 + cycle % 100)
+        numEntries = 5 + (cycle // 21600 % 4) * 6
+        return Track([ Entry(6 * i, rs.rand() * 20,
+                             cycle in self.flagged_cycles
+                             and i in (0, numEntries - 1))
+                       for i in range(numEntries) ])
+
+    def plot_dataset_metric_vs_fhr(self, dataset, cycle, metric_name,
+                                   x_label, y_label, axes):
+        entries = self.get_dataset_metric_track(dataset, cycle,
+                                                metric_name).tracker_entries
+        axes.plot([ e.fhr for e in entries ],
+                  [ getattr(e, metric_name) for e in entries ],
+                  label=dataset.name)
+        flagged = [ e for e in entries if e.flagged ]
+        if flagged:
+            axes.scatter([ e.fhr for e in flagged ],
+                         [ getattr(e, metric_name) for e in flagged ],
+                         s=80, facecolors='none')
+        axes.set_xlabel(x_label)
+        axes.set_ylabel(y_label)
+
+    def set_y_limits(self, metric_name):
+        setattr(self, 'yMin_' + metric_name, 0)
+        setattr(self, 'yMax_' + metric_name, 20)
+
+    def savefig(self, path, fig=None, **kwargs):
+        fig.savefig(path, **kwargs)
+
+
+@unittest.skipIf(common is None, "DaffyPlot dependencies not installed")
+class GridOfPlotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        plt.close('all')
+
+    def tearDown(self):
+        plt.close('all')
+        shutil.rmtree(self.tmpdir)
+
+    def create_grids(self, plot_helper, prefixes, jobs=1):
+        '''
+        Create a grid of 4 plots per page for each of the given `prefixes'
+        (relative to self.tmpdir), or a grid that is not saved for each None
+        '''
+        common.create_grids_of_plots(plot_helper, [
+                dict(metric_name=METRIC, figure_title='Grid %i' %i,
+                     plots_per_page=4,
+                     save_prefix=None if prefix is None
+                                 else os.path.join(self.tmpdir, prefix))
+                for (i, prefix) in enumerate(prefixes) ], jobs=jobs)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir, name), 'rb') as f:
+            return f.read()
+
+    def test_unsaved_pages_stay_open(self):
+        self.create_grids(PlotHelper(), [None])
+        figures = [ plt.figure(num) for num in plt.get_fignums() ]
+        self.assertEqual(len(figures), 2)
+        self.assertFalse(figures[0] is figures[1])
+        # the empty cells of the last page have no title
+        titles = [ [ ax.get_title() for ax in fig.axes if ax.get_title() ]
+                   for fig in figures ]
+        self.assertEqual(titles[0], [ common.epoch_to_pretty_time_string(c)
+                                      for c in CYCLES[:4] ])
+        self.assertEqual(titles[1], [ common.epoch_to_pretty_time_string(c)
+                                      for c in CYCLES[4:] ])
+
+    def test_saved_pages_are_closed(self):
+        self.create_grids(PlotHelper(), ['a', None])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['a_0.png', 'a_1.png'])
+        self.assertEqual(len(plt.get_fignums()), 2)
+
+    def test_reused_figures_match_new_ones(self):
+        # 8 cycles, so both pages have the same layout and the figure of
+        # the first one is reused, unless there are flagged entries
+        for flaggedCycles in ((), CYCLES[5:6]):
+            plot_helper = PlotHelper(flaggedCycles)
+            for dataset in plot_helper.datasets:
+                dataset.cycles = CYCLES + [ CYCLES[-1] + 21600 ]
+            self.create_grids(plot_helper, ['reused'])
+            for i in range(2):
+                fig = common._create_one_grid(
+                            plot_helper.datasets[0].cycles[4*i:4*(i+1)],
+                            plot_helper, METRIC, 'fhr', '', 'Grid 0')
+                fig.savefig(os.path.join(self.tmpdir, 'new_%i.png' %i))
+                self.assertEqual(self.read('reused_%i.png' %i),
+                                 self.read('new_%i.png' %i))
+
+    def test_parallel_pages_match_serial(self):
+        plot_helper = PlotHelper(CYCLES[1:2])
+        self.create_grids(plot_helper, ['serial_a', 'serial_b'], jobs=1)
+        self.create_grids(plot_helper, ['parallel_a', 'parallel_b'], jobs=3)
+        self.assertEqual(len(plt.get_fignums()), 0)
+        for name in ('a_0', 'a_1', 'b_0', 'b_1'):
+            self.assertEqual(self.read('serial_' + name + '.png'),
+                             self.read('parallel_' + name + '.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
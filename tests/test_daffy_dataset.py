@@ -0,0 +1,127 @@
+'''
+Unit tests for the daffy_dataset module
+'''
+
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+import unit_env
+try:
+    import daffy_dataset
+    from daffy_dataset import DirectoryIndex, get_products_conf
+except ImportError:
+    daffy_dataset = None # nwpy, pycane or pyhwrf is not installed
+
+
+def touch(path):
+    with open(path, 'w'):
+        pass
+
+
+@unittest.skipIf(daffy_dataset is None, "DaffyPlot dependencies not installed")
+class DirectoryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.topDir = tempfile.mkdtemp()
+        for cycle in ('2005080100', '2005080106'):
+            os.mkdir(os.path.join(self.topDir, cycle))
+            touch(os.path.join(self.topDir, cycle, 'fort.64'))
+        touch(os.path.join(self.topDir, '2005080100', '.hidden.64'))
+        self.index = DirectoryIndex()
+
+    def tearDown(self):
+        shutil.rmtree(self.topDir)
+
+    def set_mtime(self, path, mtime):
+        os.utime(path, (mtime, mtime))
+
+    def test_glob_matches_glob_module(self):
+        for pattern in ('*/fort.64', '2005080100/*', '2005080100/.*',
+                        '200508010?/fort.*', '*/missing*', '2005080100',
+                        '2005080100/fort.64', 'missing/fort.64'):
+            self.assertEqual(
+                sorted(self.index.glob(os.path.join(self.topDir, pattern))),
+                sorted(glob.glob(os.path.join(self.topDir, pattern))),
+                pattern)
+
+    def test_listing_is_reused_until_mtime_changes(self):
+        cycleDir = os.path.join(self.topDir, '2005080100')
+        pattern = os.path.join(cycleDir, '*.69')
+        self.set_mtime(cycleDir, 1000000000)
+        self.assertEqual(self.index.glob(pattern), [])
+        # a new file is not seen as long as the mtime is the same...
+        touch(os.path.join(cycleDir, 'fort.69'))
+        self.set_mtime(cycleDir, 1000000000)
+        self.assertEqual(self.index.glob(pattern), [])
+        # ...and is seen once the mtime changes
+        self.set_mtime(cycleDir, 1000000060)
+        self.assertEqual(self.index.glob(pattern),
+                         [os.path.join(cycleDir, 'fort.69')])
+        os.unlink(os.path.join(cycleDir, 'fort.69'))
+        self.set_mtime(cycleDir, 1000000120)
+        self.assertEqual(self.index.glob(pattern), [])
+
+    def test_removed_directory(self):
+        cycleDir = os.path.join(self.topDir, '2005080106')
+        self.assertEqual(len(self.index.listdir(cycleDir)), 1)
+        shutil.rmtree(cycleDir)
+        self.assertEqual(self.index.listdir(cycleDir), [])
+        self.assertEqual(self.index.glob(os.path.join(cycleDir, '*')), [])
+
+
+@unittest.skipIf(daffy_dataset is None, "DaffyPlot dependencies not installed")
+class ProductsConfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.confDir = tempfile.mkdtemp()
+        self.commonFile = os.path.join(self.confDir, 'products_common.cfg')
+        self.typeFile = os.path.join(self.confDir, 'products_type.cfg')
+        with open(self.commonFile, 'w') as f:
+            f.write("[DEFAULT]\nroot = /data\n"
+                    "[gfdltrk_track]\ndir = {general/cycle_products_dir}\n"
+                    "filePattern = atcf_trk.txt\n")
+        with open(self.typeFile, 'w') as f:
+            f.write("[general]\nproducts = gfdltrk_track\n"
+                    "[gfdltrk_track]\nfilePattern = %(root)s/trk_*.txt\n"
+                    "dateFormat = %Y%m%d%H\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.confDir)
+
+    def test_settings_of_all_files(self):
+        conf = get_products_conf([self.commonFile, self.typeFile])
+        self.assertEqual(conf.getraw('gfdltrk_track', 'dir'),
+                         '{general/cycle_products_dir}')
+        # the later file overrides the earlier one
+        self.assertEqual(conf.getraw('gfdltrk_track', 'filePattern'),
+                         '%(root)s/trk_*.txt')
+        self.assertEqual(conf.getraw('general', 'root'), '/data')
+        # values are copied without checking their interpolation syntax
+        self.assertEqual(conf.getraw('gfdltrk_track', 'dateFormat'),
+                         '%Y%m%d%H')
+
+    def test_copies_are_independent(self):
+        conf = get_products_conf([self.commonFile, self.typeFile])
+        conf.add_section('dynamic')
+        conf.set_options('dynamic', expt_rundir='/expt1')
+        conf.set_options('gfdltrk_track', dir='/changed')
+        other = get_products_conf([self.commonFile, self.typeFile])
+        self.assertFalse(other.has_section('dynamic'))
+        self.assertEqual(other.getraw('gfdltrk_track', 'dir'),
+                         '{general/cycle_products_dir}')
+
+    def test_modified_file_is_read_again(self):
+        conf = get_products_conf([self.commonFile])
+        self.assertFalse(conf.has_section('general'))
+        with open(self.commonFile, 'a') as f:
+            f.write("[general]\nproducts = gfdltrk_track\n")
+        mtime = os.path.getmtime(self.commonFile) + 60
+        os.utime(self.commonFile, (mtime, mtime))
+        conf = get_products_conf([self.commonFile])
+        self.assertEqual(conf.getraw('general', 'products'), 'gfdltrk_track')
+
+
+if __name__ == '__main__':
+    unittest.main()
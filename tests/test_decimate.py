@@ -0,0 +1,109 @@
+'''
+Unit tests for the decimate module
+'''
+
+import unittest
+import unit_env
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from decimate import rdp_mask, local_extrema, decimation_mask, decimate_line
+
+
+def _line_distances(x, y, keep):
+    '''
+    RETURN the distance of each point (`x',`y') to the line through the kept
+    points that surround it (0 for the kept points)
+    '''
+    dists = np.zeros(len(x))
+    kept = np.nonzero(keep)[0]
+    for (start, end) in zip(kept[:-1], kept[1:]):
+        (dx, dy) = (x[end] - x[start], y[end] - y[start])
+        for i in range(start + 1, end):
+            dists[i] = abs((x[i] - x[start]) * dy - (y[i] - y[start]) * dx) \
+                       / np.hypot(dx, dy)
+    return dists
+
+
+class DecimationMaskTest(unittest.TestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(42)
+        self.x = np.cumsum(rs.uniform(0.5, 1.5, 200))
+        self.y = np.cumsum(rs.normal(0, 1, 200))
+
+    def test_empty(self):
+        self.assertEqual(len(decimation_mask([], [], 1.)), 0)
+
+    def test_collinear_points_are_dropped(self):
+        keep = decimation_mask(np.arange(10), 2 * np.arange(10), 0.1)
+        self.assertEqual(np.nonzero(keep)[0].tolist(), [0, 9])
+
+    def test_endpoints_are_kept(self):
+        keep = decimation_mask(self.x, self.y, 1000.)
+        self.assertEqual(np.nonzero(keep)[0].tolist(), [0, len(self.x) - 1])
+
+    def test_deviation_is_within_tolerance(self):
+        for tolerance in (0.1, 1., 5.):
+            keep = decimation_mask(self.x, self.y, tolerance)
+            self.assertTrue(keep.sum() < len(self.x))
+            self.assertTrue(_line_distances(self.x, self.y, keep).max() 
+                            <= tolerance)
+
+    def test_keep_idc_are_kept(self):
+        keepIdc = [3, 50, 51, 120, 198]
+        for tolerance in (0.1, 1000.):
+            keep = decimation_mask(self.x, self.y, tolerance, 
+                                   keep_idc=np.array(keepIdc))
+            self.assertTrue(keep[keepIdc].all())
+            self.assertTrue(keep[0] and keep[-1])
+        # the line is simplified separately between the kept points
+        keep = decimation_mask(self.x, self.y, 1., keep_idc=keepIdc)
+        self.assertTrue(_line_distances(self.x, self.y, keep).max() <= 1.)
+
+    def test_missing_values_and_their_neighbors_are_kept(self):
+        y = self.y.copy()
+        y[[0, 40, 41, 100]] = np.nan
+        keep = decimation_mask(self.x, y, 1000.)
+        self.assertEqual(np.nonzero(keep)[0].tolist(),
+                         [0, 1, 39, 40, 41, 42, 99, 100, 101, 199])
+
+    def test_rdp_mask_keeps_endpoints(self):
+        keep = rdp_mask(self.x, self.y, 1000.)
+        self.assertEqual(np.nonzero(keep)[0].tolist(), [0, len(self.x) - 1])
+
+
+class LocalExtremaTest(unittest.TestCase):
+
+    def test_extrema(self):
+        self.assertEqual(local_extrema([1, 3, 2, 2, 5, 4]).tolist(), 
+                         [1, 2, 3, 4])
+
+    def test_short_values(self):
+        self.assertEqual(local_extrema([1, 2]).tolist(), [0, 1])
+
+
+class DecimateLineTest(unittest.TestCase):
+
+    def test_keeps_requested_indices(self):
+        fig = Figure(figsize=(4, 3), dpi=100)
+        ax = fig.add_subplot(111)
+        x = np.linspace(0, 10, 500)
+        y = np.sin(x)
+        idc = decimate_line(ax, x, y, 0.5, keep_idc=[7, 250])
+        self.assertTrue(len(idc) < len(x))
+        self.assertTrue(7 in idc and 250 in idc)
+        self.assertEqual(idc[0], 0)
+        self.assertEqual(idc[-1], len(x) - 1)
+        self.assertEqual(idc.tolist(), sorted(idc))
+
+    def test_no_tolerance_keeps_everything(self):
+        fig = Figure()
+        ax = fig.add_subplot(111)
+        self.assertEqual(decimate_line(ax, range(5), range(5), 0).tolist(),
+                         range(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,423 @@
+'''
+Unit tests for the gsi_diag_reader module. The diag files are small 
+synthetic fixtures written with the record layouts that the module expects.
+'''
+
+import os
+import zlib
+import struct
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import unit_env
+from gsi_diag_reader import FortranSequentialFile, FortranRecordError, \
+                            read_conv_diag, read_rad_diag, CONV_INFO_FIELDS, \
+                            parse_text_diag_lines, read_text_diag, \
+                            TEXT_DIAG_COLUMNS, write_column_diag, \
+                            read_column_diag, read_column_diag_header, \
+                            ColumnDiagError, COLUMN_DIAG_ALIGNMENT
+
+IDATE = 2005080112
+NINFO = 21
+
+
+def fortran_record(payload, byte_order, num_parts=1):
+    '''
+    RETURN the given `payload' (string) as a Fortran sequential record with
+    the given `byte_order'. If `num_parts' > 1, it is split into that many
+    sub-records, as gfortran does for records larger than 2GB: the leading
+    marker of all but the last sub-record and the trailing marker of all but
+    the first one are negative.
+    '''
+    size = max(-(-len(payload) // num_parts), 1)
+    parts = [ payload[i:i+size] for i in range(0, len(payload), size) ] \
+            or [ payload ]
+    ret = ''
+    for (i, part) in enumerate(parts):
+        leading = -len(part) if i < len(parts) - 1 else len(part)
+        trailing = -len(part) if i > 0 else len(part)
+        ret += struct.pack(byte_order + 'i', leading) + part \
+               + struct.pack(byte_order + 'i', trailing)
+    return ret
+
+
+def conv_block(obType, stationIds, info, byte_order, nchar=1):
+    '''
+    RETURN the header and data records of a block of conventional obs with
+    the given `stationIds' and `info' (array of shape (obs, NINFO))
+    '''
+    info = np.asarray(info, dtype=byte_order + 'f4').reshape(-1, NINFO)
+    header = struct.pack(byte_order + '3s5i', obType, nchar, NINFO, 
+                         len(info), 0, 0)
+    chars = ''.join(struct.pack('8s', s) * nchar for s in stationIds)
+    return fortran_record(header, byte_order) + \
+           fortran_record(chars + info.tostring(), byte_order)
+
+
+def conv_info(itype, values, v_values=None):
+    ''' RETURN an info array with one row per value of the given `values' '''
+    info = np.zeros((len(values), NINFO))
+    info[:, CONV_INFO_FIELDS['itype']] = itype
+    info[:, CONV_INFO_FIELDS['lat']] = 20. + np.arange(len(values))
+    info[:, CONV_INFO_FIELDS['lon']] = 300.
+    info[:, CONV_INFO_FIELDS['pres']] = 850.
+    info[:, CONV_INFO_FIELDS['time_delta']] = -1.5
+    info[:, CONV_INFO_FIELDS['iuse']] = 1.
+    info[:, CONV_INFO_FIELDS['value']] = values
+    info[:, CONV_INFO_FIELDS['bias']] = np.asarray(values) / 10.
+    if v_values is not None:
+        info[:, CONV_INFO_FIELDS['v_value']] = v_values
+        info[:, CONV_INFO_FIELDS['v_bias']] = np.asarray(v_values) / 10.
+    return info
+
+
+class DiagFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return path
+
+
+class FortranSequentialFileTest(DiagFileTestCase):
+
+    def test_byte_order_detection(self):
+        for byteOrder in ('>', '<'):
+            path = self.write('f', fortran_record('abcdefgh', byteOrder) +
+                                   fortran_record('xyz', byteOrder))
+            f = FortranSequentialFile(path)
+            self.assertEqual(f.byte_order, byteOrder)
+            self.assertEqual(f.read_record().tostring(), 'abcdefgh')
+            self.assertEqual(f.read_record().tostring(), 'xyz')
+            self.assertTrue(f.at_end())
+
+    def test_split_record(self):
+        payload = ''.join(chr(i % 256) for i in range(1000))
+        path = self.write('f', fortran_record(payload, '>', num_parts=3) +
+                               fortran_record('end', '>'))
+        f = FortranSequentialFile(path)
+        self.assertEqual(f.read_record().tostring(), payload)
+        self.assertEqual(f.read_record().tostring(), 'end')
+
+    def test_uniform_records(self):
+        path = self.write('f', ''.join(fortran_record(c * 4, '<') 
+                                       for c in 'abc'))
+        rows = FortranSequentialFile(path).read_uniform_records()
+        self.assertEqual([ r.tostring() for r in rows ], 
+                         ['aaaa', 'bbbb', 'cccc'])
+        path = self.write('g', fortran_record('aaaa', '<') + 
+                               fortran_record('bb', '<'))
+        self.assertEqual(FortranSequentialFile(path).read_uniform_records(),
+                         None)
+
+    def test_invalid_files(self):
+        path = self.write('f', 'not a fortran file')
+        self.assertRaises(FortranRecordError, FortranSequentialFile, path)
+        # truncated trailing marker of the second record
+        path = self.write('g', fortran_record('abcd', '>') + 
+                               fortran_record('efgh', '>')[:-2])
+        f = FortranSequentialFile(path)
+        f.read_record()
+        self.assertRaises(FortranRecordError, f.read_record)
+
+
+class ReadConvDiagTest(DiagFileTestCase):
+
+    def write_conv_diag(self, byte_order):
+        contents = fortran_record(struct.pack(byte_order + 'i', IDATE), 
+                                  byte_order)
+        contents += conv_block(' ps', ['STN1', 'STN2'], 
+                               conv_info(181, [1000., 1010.]), byte_order)
+        # a task without any observations of the type
+        contents += conv_block(' ps', [], np.zeros((0, NINFO)), byte_order)
+        contents += conv_block(' uv', ['WND1'], 
+                               conv_info(220, [5.], v_values=[-3.]), 
+                               byte_order, nchar=2)
+        return self.write('diag_conv', contents)
+
+    def test_both_byte_orders(self):
+        for byteOrder in ('>', '<'):
+            path = self.write_conv_diag(byteOrder)
+            (idate, columns) = read_conv_diag(path)
+            self.assertEqual(idate, IDATE)
+            self.assertEqual(columns['type'].tolist(), ['ps', 'ps', 'uv'])
+            self.assertEqual(columns['station_id'].tolist(), 
+                             ['STN1', 'STN2', 'WND1'])
+            self.assertEqual(columns['itype'].tolist(), [181, 181, 220])
+            self.assertEqual(columns['iuse'].tolist(), [1, 1, 1])
+            self.assertEqual(columns['lat'].tolist(), [20., 21., 20.])
+            self.assertEqual(columns['value'].tolist(), [1000., 1010., 5.])
+            np.testing.assert_allclose(columns['bias'], [100., 101., .5],
+                                       rtol=1e-6)
+            # the byte order may also be passed in
+            self.assertEqual(read_conv_diag(path, byte_order=byteOrder)[1]
+                             ['value'].tolist(), [1000., 1010., 5.])
+
+    def test_uv_block(self):
+        (idate, columns) = read_conv_diag(self.write_conv_diag('>'))
+        self.assertTrue(np.isnan(columns['v_value'][:2]).all())
+        self.assertTrue(np.isnan(columns['v_bias'][:2]).all())
+        self.assertEqual(columns['v_value'][2], -3.)
+        self.assertAlmostEqual(columns['v_bias'][2], -.3, places=6)
+
+    def test_zero_obs(self):
+        contents = fortran_record(struct.pack('>i', IDATE), '>') + \
+                   conv_block(' t', [], np.zeros((0, NINFO)), '>')
+        (idate, columns) = read_conv_diag(self.write('diag_conv', contents))
+        self.assertEqual(idate, IDATE)
+        for column in columns.values():
+            self.assertEqual(len(column), 0)
+
+    def test_inconsistent_data_record(self):
+        header = struct.pack('>3s5i', '  t', 1, NINFO, 2, 0, 0)
+        contents = fortran_record(struct.pack('>i', IDATE), '>') + \
+                   fortran_record(header, '>') + \
+                   fortran_record('x' * 20, '>')
+        self.assertRaises(FortranRecordError, read_conv_diag,
+                          self.write('diag_conv', contents))
+
+
+class ReadRadDiagTest(DiagFileTestCase):
+
+    NCHANL = 2
+    IREAL = 26
+    NUM_PER_CHANNEL = 7
+
+    def write_rad_diag(self, byte_order, numObs=3, splitObs=None, 
+                       obLengths=None):
+        '''
+        Write a radiance diag file with `numObs' observations. The record of
+        ob `splitObs' is split into gfortran sub-records. `obLengths' 
+        overrides the number of values of each ob's record.
+        '''
+        bo = byte_order
+        header = struct.pack(bo + '20s10s10s8i', 'amsua_n15', 'n15', 'amsua',
+                             1, self.NCHANL, 5, IDATE, self.IREAL, 
+                             self.NUM_PER_CHANNEL, 0, 0)
+        contents = fortran_record(header, bo)
+        for ch in range(self.NCHANL):
+            contents += fortran_record(
+                    struct.pack(bo + '5f3i', 50. + ch, 1., 2., 3., 4., 
+                                1, ch + 1, ch + 4), bo)
+        numValues = self.IREAL + self.NCHANL * self.NUM_PER_CHANNEL
+        for ob in range(numObs):
+            values = np.arange(numValues, dtype=float) + 100 * ob
+            if obLengths is not None:
+                values = values[:obLengths[ob]]
+            numParts = 2 if ob == splitObs else 1
+            contents += fortran_record(values.astype(bo + 'f4').tostring(), 
+                                       bo, num_parts=numParts)
+        return self.write('diag_amsua', contents)
+
+    def check_diag(self, diag, numObs=3):
+        self.assertEqual(diag.header['obstype'], 'amsua')
+        self.assertEqual(diag.header['nchanl'], self.NCHANL)
+        self.assertEqual(diag.channels['ich'].tolist(), [4, 5])
+        self.assertEqual(diag.channels['freq'].tolist(), [50., 51.])
+        self.assertEqual(len(diag), numObs)
+        self.assertEqual(diag.obs['lat'].tolist(), 
+                         [ 100. * ob for ob in range(numObs) ])
+        self.assertEqual(diag.obs['time_delta'].tolist(), 
+                         [ 100. * ob + 3 for ob in range(numObs) ])
+        self.assertEqual(diag.channel_data['tb_obs'].shape, 
+                         (numObs, self.NCHANL))
+        self.assertEqual(diag.channel_data['tb_obs'][:, 1].tolist(),
+                         [ 100. * ob + self.IREAL + self.NUM_PER_CHANNEL 
+                           for ob in range(numObs) ])
+        self.assertEqual(diag.channel_data['emissivity'][:, 0].tolist(),
+                         [ 100. * ob + self.IREAL + 5 
+                           for ob in range(numObs) ])
+
+    def test_both_byte_orders(self):
+        for byteOrder in ('>', '<'):
+            self.check_diag(read_rad_diag(self.write_rad_diag(byteOrder)))
+
+    def test_split_record(self):
+        # the records cannot be read at once, so they are read one by one
+        self.check_diag(read_rad_diag(self.write_rad_diag('<', splitObs=1)))
+
+    def test_zero_obs(self):
+        diag = read_rad_diag(self.write_rad_diag('>', numObs=0))
+        self.check_diag(diag, numObs=0)
+
+    def test_non_uniform_records(self):
+        numValues = self.IREAL + self.NCHANL * self.NUM_PER_CHANNEL
+        path = self.write_rad_diag('>', obLengths=[numValues, numValues - 1,
+                                                   numValues])
+        self.assertRaises(FortranRecordError, read_rad_diag, path)
+
+
+class TextDiagTest(DiagFileTestCase):
+
+    LINES = ['ps, STN1, -1.500000, 20.000000, 300.000000, 1000.250000, 1, '
+             '1000.250000, 0.500000',
+             'uv, WND1, 2.000000, 21.000000, 301.000000, 850.000000, -1, '
+             '5.500000, 0.250000, -3.250000, -0.125000',
+             '  t, 78982, 0.000000, 22.000000, 302.000000, 500.000000, 1, '
+             '270.000000, -1.000000']
+
+    def test_parse_lines(self):
+        columns = parse_text_diag_lines('\n'.join(self.LINES) + '\n')
+        self.assertEqual(sorted(columns.keys()), sorted(TEXT_DIAG_COLUMNS))
+        self.assertEqual(columns['type'].tolist(), ['ps', 'uv', 't'])
+        self.assertEqual(columns['station_id'].tolist(), 
+                         ['STN1', 'WND1', '78982'])
+        self.assertEqual(columns['time_delta'].tolist(), [-1.5, 2., 0.])
+        self.assertEqual(columns['pres'].tolist(), [1000.25, 850., 500.])
+        self.assertEqual(columns['iuse'].tolist(), [1, -1, 1])
+        self.assertEqual(columns['value'].tolist(), [1000.25, 5.5, 270.])
+        self.assertEqual(columns['bias'].tolist(), [.5, .25, -1.])
+        self.assertEqual(columns['v_value'][1], -3.25)
+        self.assertEqual(columns['v_bias'][1], -.125)
+        self.assertTrue(np.isnan(columns['v_value'][[0, 2]]).all())
+        self.assertTrue(np.isnan(columns['v_bias'][[0, 2]]).all())
+
+    def test_empty(self):
+        columns = parse_text_diag_lines('')
+        for name in TEXT_DIAG_COLUMNS:
+            self.assertEqual(len(columns[name]), 0)
+
+    def test_unknown_line_shapes_raise(self):
+        badLines = [
+            # wind ob without the v fields and non-wind ob with them
+            'uv, WND1, 2.0, 21.0, 301.0, 850.0, 1, 5.5, 0.25',
+            'ps, STN1, -1.5, 20.0, 300.0, 1000.0, 1, 1000.0, 0.5, 1.0, 2.0',
+            # without station_id and iuse
+            'ps, -1.5, 20.0, 300.0, 1000.0, 1000.0, 0.5',
+            'uv, 2.0, 21.0, 301.0, 850.0, 5.5, -3.25, 0.25, -0.125',
+            'ps, STN1, -1.5',
+            # unparseable number
+            'ps, STN1, -1.5, 20.0, 300.0, abc, 1, 1000.0, 0.5']
+        for line in badLines:
+            text = '\n'.join([self.LINES[0], line, self.LINES[1]])
+            self.assertRaises(ValueError, parse_text_diag_lines, text)
+
+    def test_read_in_blocks(self):
+        lines = self.LINES * 50
+        path = self.write('diag.dat', '\n'.join(lines) + '\n')
+        whole = read_text_diag(path)
+        self.assertEqual(len(whole['type']), len(lines))
+        # blocks that end in the middle of lines; no trailing newline
+        path = self.write('diag2.dat', '\n'.join(lines))
+        for blockSize in (7, 100, 1000):
+            columns = read_text_diag(path, block_size=blockSize)
+            for name in TEXT_DIAG_COLUMNS:
+                np.testing.assert_array_equal(columns[name], whole[name])
+
+    def test_sample_files(self):
+        # created with GSI's read_diag_conv utility
+        path = os.path.join(unit_env.TOP_DIR, 'daffy_plot', 
+                            'diag_conv_ges.200508010600.dat.gz')
+        columns = read_text_diag(path, block_size=4096)
+        self.assertEqual(len(columns['type']), 2762)
+        isWind = (columns['type'] == 'uv')
+        self.assertEqual(isWind.sum(), 708)
+        self.assertTrue(np.isfinite(columns['v_value'][isWind]).all())
+        self.assertTrue(np.isnan(columns['v_value'][~isWind]).all())
+        self.assertEqual(columns['station_id'][0], 'TNCC')
+        self.assertEqual(columns['value'][0], 1002.7)
+
+
+class ColumnDiagTest(DiagFileTestCase):
+
+    COLUMNS = { 'type': np.array(['ps', 'uv', 't'], dtype='S3'),
+                'station_id': np.array(['STN1', 'WND1', ''], dtype='S8'),
+                'iuse': np.array([1, -1, 1]),
+                'lat': np.array([20., 21.5, -22.25]),
+                'v_value': np.array([np.nan, -3.25, np.nan]),
+                'count': np.array([3, 2, 1], dtype='>i2') }
+
+    def write_columns(self, columns, compress, name='diag.cols', 
+                      ob_type='conv', step='ges'):
+        path = os.path.join(self.tmpdir, name)
+        write_column_diag(path, columns, ob_type, step, 1122897600, 
+                          compress=compress)
+        return path
+
+    def assertSameColumns(self, data, expected):
+        self.assertEqual(sorted(data.keys()), sorted(expected.keys()))
+        for name in expected:
+            self.assertEqual(data[name].dtype, expected[name].dtype)
+            np.testing.assert_array_equal(data[name], expected[name])
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            path = self.write_columns(self.COLUMNS, compress)
+            for mmap in (True, False):
+                (header, data) = read_column_diag(path, mmap=mmap)
+                self.assertSameColumns(data, self.COLUMNS)
+                self.assertEqual(header['ob_type'], 'conv')
+                self.assertEqual(header['step'], 'ges')
+                self.assertEqual(header['date'], 1122897600)
+                self.assertEqual(header['num_obs'], 3)
+                # only uncompressed columns are memory-mapped
+                self.assertEqual(isinstance(data['lat'], np.memmap),
+                                 mmap and not compress)
+
+    def test_header(self):
+        for compress in (False, True):
+            header = read_column_diag_header(
+                            self.write_columns(self.COLUMNS, compress))
+            self.assertEqual([ c['name'] for c in header['columns'] ],
+                             sorted(self.COLUMNS))
+            for column in header['columns']:
+                self.assertEqual(column['dtype'], 
+                                 self.COLUMNS[column['name']].dtype)
+                self.assertEqual(column['offset'] % COLUMN_DIAG_ALIGNMENT, 0)
+                self.assertEqual(column['compression'], 
+                                 'zlib' if compress else None)
+            self.assertEqual(header['data_offset'] % COLUMN_DIAG_ALIGNMENT, 0)
+
+    def test_column_subset(self):
+        for compress in (False, True):
+            path = self.write_columns(self.COLUMNS, compress)
+            for mmap in (True, False):
+                (header, data) = read_column_diag(path, columns=['v_value', 
+                                                                 'type'],
+                                                  mmap=mmap)
+                self.assertSameColumns(data, dict(
+                        (k, self.COLUMNS[k]) for k in ('v_value', 'type')))
+                self.assertRaises(KeyError, read_column_diag, path, 
+                                  columns=['lat', 'foo'], mmap=mmap)
+
+    def test_zero_obs(self):
+        columns = dict((k, v[:0]) for (k, v) in self.COLUMNS.iteritems())
+        for compress in (False, True):
+            path = self.write_columns(columns, compress)
+            for mmap in (True, False):
+                (header, data) = read_column_diag(path, mmap=mmap)
+                self.assertEqual(header['num_obs'], 0)
+                self.assertSameColumns(data, columns)
+
+    def test_invalid_columns(self):
+        self.assertRaises(ValueError, self.write_columns, 
+                          dict(a=np.arange(3), b=np.arange(2)), False)
+        self.assertRaises(ValueError, self.write_columns, 
+                          dict(a=np.array([None, 1])), False)
+        # nothing is left behind
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_invalid_files(self):
+        path = self.write('diag.cols', 'not a column diag file')
+        self.assertRaises(ColumnDiagError, read_column_diag, path)
+        path = self.write('empty.cols', '')
+        self.assertRaises(ColumnDiagError, read_column_diag_header, path)
+        for compress in (False, True):
+            path = self.write_columns(self.COLUMNS, compress)
+            with open(path, 'rb') as f:
+                contents = f.read()
+            path = self.write('truncated.cols', contents[:-10])
+            self.assertRaises((ColumnDiagError, zlib.error), read_column_diag,
+                              path, mmap=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+'''
+Unit tests for the gsi_objects module: the plain text and column diag files
+written by GsiObTypeDiag are read back by their readers, and GsiRun picks the
+diag format from what is in the products directory
+'''
+
+import os
+import struct
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import unit_env
+from gsi_objects import GsiObTypeDiag, GsiRun, get_diag_file_name, \
+                        GsiConventionalObservation, GsiWindObservation
+from gsi_diag_reader import read_text_diag, read_column_diag, \
+                            TEXT_DIAG_COLUMNS
+from test_gsi_diag_reader import fortran_record, conv_block, conv_info, \
+                                 IDATE, NINFO, CONV_INFO_FIELDS
+
+DATE = 1122897600 # 2005-08-01 12Z
+
+
+def write_conv_diag(path):
+    '''
+    Write a binary conventional diag file with surface pressure obs (one of
+    them not used by the analysis), no temperature obs and wind obs
+    '''
+    psInfo = conv_info(181, [1000.25, 1010.5, 995.125])
+    psInfo[1, CONV_INFO_FIELDS['iuse']] = -1
+    uvInfo = conv_info(220, [5.5, -2.], v_values=[-3.25, 7.])
+    contents = fortran_record(struct.pack('>i', IDATE), '>') + \
+               conv_block(' ps', ['STN1', 'STN2', 'STN3'], psInfo, '>') + \
+               conv_block('  t', [], np.zeros((0, NINFO)), '>') + \
+               conv_block(' uv', ['WND1', 'WND2'], uvInfo, '>')
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+
+class PlainTextDiagRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        write_conv_diag(os.path.join(self.tmpdir, 
+                        get_diag_file_name('conv', 'ges', DATE, False)))
+        self.diag = GsiObTypeDiag(self.tmpdir, 'conv', DATE, 'ges')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertSameObs(self, table, expected):
+        self.assertEqual(len(table), len(expected))
+        for name in ('type', 'station_id', 'iuse'):
+            self.assertEqual(table.columns[name].tolist(), 
+                             expected.columns[name].tolist())
+        # the text diags are printed with 6 decimals
+        for name in TEXT_DIAG_COLUMNS[2:]:
+            np.testing.assert_allclose(table.columns[name], 
+                                       expected.columns[name], atol=1e-6)
+
+    def test_round_trip(self):
+        self.diag.make_plain_text_diag_file(outdir=self.tmpdir, 
+                                            include_skipped=True)
+        textDiag = GsiObTypeDiag(self.tmpdir, 'conv', DATE, 'ges', 
+                                 use_plaintext_diag=True)
+        self.assertSameObs(textDiag.obs, self.diag.obs)
+        self.assertEqual(textDiag.obs.columns['type'].tolist(), 
+                         ['ps', 'ps', 'ps', 'uv', 'uv'])
+        # u and v are not swapped
+        self.assertEqual(textDiag.obs.columns['value'][3:].tolist(), 
+                         [5.5, -2.])
+        self.assertEqual(textDiag.obs.columns['v_value'][3:].tolist(), 
+                         [-3.25, 7.])
+        np.testing.assert_allclose(textDiag.obs.columns['v_bias'][3:], 
+                                   [-.325, .7], atol=1e-6)
+        self.assertTrue(np.isnan(textDiag.obs.columns['v_value'][:3]).all())
+
+    def test_skipped_obs_are_not_written(self):
+        outfile = 'diag.dat'
+        self.diag.make_plain_text_diag_file(outfile=outfile, outdir=self.tmpdir,
+                                            gz=False)
+        columns = read_text_diag(os.path.join(self.tmpdir, outfile))
+        self.assertEqual(columns['station_id'].tolist(), 
+                         ['STN1', 'STN3', 'WND1', 'WND2'])
+        self.assertEqual(columns['iuse'].tolist(), [1, 1, 1, 1])
+
+    def test_observation_lines(self):
+        ob = GsiConventionalObservation('ps', 'STN1', -1.5, 20., 300., 850., 
+                                        1, 1000., 1.)
+        self.assertEqual(len(ob.to_csv().split(',')), 
+                         len(TEXT_DIAG_COLUMNS) - 2)
+        ob = GsiWindObservation('uv', 'WND1', -1.5, 20., 300., 850., 1, 
+                                5., -3., .5, -.3)
+        self.assertEqual(ob.to_csv(), 'uv, WND1, -1.500000, 20.000000, '
+                         '300.000000, 850.000000, 1, 5.000000, 0.500000, '
+                         '-3.000000, -0.300000')
+
+
+class ColumnDiagRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        write_conv_diag(os.path.join(self.tmpdir, 
+                        get_diag_file_name('conv', 'ges', DATE, False)))
+        self.diag = GsiObTypeDiag(self.tmpdir, 'conv', DATE, 'ges')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertSameObs(self, table, expected):
+        self.assertEqual(sorted(table.columns.keys()), 
+                         sorted(expected.columns.keys()))
+        for name in expected.columns:
+            np.testing.assert_array_equal(table.columns[name], 
+                                          expected.columns[name])
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            self.diag.make_column_diag_file(outdir=self.tmpdir, 
+                                            compress=compress,
+                                            include_skipped=True)
+            columnDiag = GsiObTypeDiag(self.tmpdir, 'conv', DATE, 'ges', 
+                                       use_column_diag=True)
+            self.assertSameObs(columnDiag.obs, self.diag.obs)
+
+    def test_skipped_obs_are_not_written(self):
+        outfile = 'diag.cols'
+        self.diag.make_column_diag_file(outfile=outfile, outdir=self.tmpdir)
+        (header, columns) = read_column_diag(os.path.join(self.tmpdir, 
+                                                          outfile))
+        self.assertEqual(header['num_obs'], 4)
+        self.assertEqual(columns['station_id'].tolist(), 
+                         ['STN1', 'STN3', 'WND1', 'WND2'])
+
+    def test_header_mismatch(self):
+        # a file written for the first guess but named as the analysis one
+        self.diag.make_column_diag_file(
+                outfile=get_diag_file_name('conv', 'anl', DATE, False, True),
+                outdir=self.tmpdir)
+        self.assertRaises(Exception, GsiObTypeDiag, self.tmpdir, 'conv', DATE,
+                          'anl', use_column_diag=True)
+        # a file written for another ob type
+        self.diag.make_column_diag_file(
+                outfile=get_diag_file_name('foo', 'ges', DATE, False, True),
+                outdir=self.tmpdir)
+        self.assertRaises(Exception, GsiObTypeDiag, self.tmpdir, 'foo', DATE,
+                          'ges', use_column_diag=True)
+
+
+class DiagFormatDiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_diags(self, step, is_text=False, is_column=False):
+        '''
+        Write the diag files for the conv ob type and `step', in the binary
+        format and, optionally, the plain text and column formats
+        '''
+        write_conv_diag(os.path.join(self.tmpdir, 
+                        get_diag_file_name('conv', step, DATE, False)))
+        diag = GsiObTypeDiag(self.tmpdir, 'conv', DATE, step)
+        if is_text:
+            diag.make_plain_text_diag_file(outdir=self.tmpdir)
+        if is_column:
+            diag.make_column_diag_file(outdir=self.tmpdir)
+
+    def test_column_diags_are_preferred(self):
+        self.write_diags('ges', is_text=True, is_column=True)
+        run = GsiRun(self.tmpdir, date=DATE, num_iterations=1)
+        self.assertTrue(run.use_column_diag)
+        self.assertFalse(run.use_plaintext_diag)
+        self.assertEqual(run.ob_types, ['conv'])
+        # skipped obs are not in the column diag
+        self.assertEqual(len(run.firstguess_diags['conv'].obs), 4)
+
+    def test_binary_diags_are_preferred_to_text(self):
+        self.write_diags('ges', is_text=True)
+        run = GsiRun(self.tmpdir, date=DATE, num_iterations=1)
+        self.assertFalse(run.use_column_diag)
+        self.assertFalse(run.use_plaintext_diag)
+        self.assertEqual(run.ob_types, ['conv'])
+        self.assertEqual(len(run.firstguess_diags['conv'].obs), 5)
+
+    def test_text_diags(self):
+        self.write_diags('ges', is_text=True)
+        os.remove(os.path.join(self.tmpdir, 
+                  get_diag_file_name('conv', 'ges', DATE, False)))
+        run = GsiRun(self.tmpdir, date=DATE, num_iterations=1)
+        self.assertFalse(run.use_column_diag)
+        self.assertTrue(run.use_plaintext_diag)
+        self.assertEqual(run.ob_types, ['conv'])
+        self.assertEqual(len(run.firstguess_diags['conv'].obs), 4)
+
+    def test_analysis_uses_anl_diags(self):
+        # only the first guess has a column diag, so the binary diags are used
+        self.write_diags('ges', is_column=True)
+        self.write_diags('anl')
+        run = GsiRun(self.tmpdir, date=DATE, num_iterations=3)
+        self.assertFalse(run.use_column_diag)
+        self.assertEqual(run.ob_types, ['conv'])
+        self.assertEqual(sorted(run.analysis_diags.keys()), ['conv'])
+
+    def test_no_diags(self):
+        self.assertRaises(Exception, GsiRun, self.tmpdir, date=DATE, 
+                          num_iterations=1)
+        # diags for another date are ignored
+        write_conv_diag(os.path.join(self.tmpdir, 
+                        get_diag_file_name('conv', 'ges', DATE + 21600, False)))
+        self.assertRaises(Exception, GsiRun, self.tmpdir, date=DATE, 
+                          num_iterations=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+'''
+Unit tests for the BackgroundImageWriter class
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import unit_env
+import image_writer
+from image_writer import BackgroundImageWriter, ImageWriteError
+
+
+def create_figure(i):
+    fig = Figure(figsize=(4, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.plot([0, 1, 2], [i, 2 * i, i * i], label='line %i' %i)
+    ax.set_title('Figure %i' %i)
+    ax.legend()
+    return fig
+
+
+class BackgroundImageWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.writer = BackgroundImageWriter(jobs=2,
+                                            log=logging.getLogger('test'))
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    def test_output_matches_savefig(self):
+        self.assertTrue(image_writer._encoder_matches_savefig())
+        for (i, kwargs) in enumerate([ {}, dict(dpi=50),
+                                       dict(dpi=72, transparent=True),
+                                       dict(facecolor='gray', format='png'),
+                                       dict(dpi='figure') ]):
+            fig = create_figure(i)
+            fig.savefig(self.path('expected_%i.png' %i), **kwargs)
+            self.writer.savefig(fig, self.path('actual_%i.png' %i), **kwargs)
+        self.assertFalse(self.writer._pool is None)
+        self.writer.flush()
+        for i in range(5):
+            self.assertEqual(self.read('actual_%i.png' %i),
+                             self.read('expected_%i.png' %i))
+        # no temporary files are left behind
+        self.assertEqual(len(os.listdir(self.tmpdir)), 10)
+
+    def test_unsupported_images_are_saved_synchronously(self):
+        fig = create_figure(1)
+        self.writer.savefig(fig, self.path('figure.svg'))
+        self.writer.savefig(fig, self.path('figure'), format='svg')
+        self.writer.savefig(fig, self.path('actual.png'), bbox_inches='tight')
+        # written before savefig() returns
+        self.assertTrue(self.writer._pool is None)
+        self.assertTrue(os.path.getsize(self.path('figure.svg')) > 0)
+        self.assertTrue(os.path.getsize(self.path('figure')) > 0)
+        fig.savefig(self.path('expected.png'), bbox_inches='tight')
+        self.assertEqual(self.read('actual.png'), self.read('expected.png'))
+
+    def test_unknown_encoder_is_not_used(self):
+        # e.g. a version of matplotlib whose PNG files would differ
+        matches = image_writer._encoder_matches
+        image_writer._encoder_matches = False
+        try:
+            self.writer.savefig(create_figure(1), self.path('figure.png'))
+        finally:
+            image_writer._encoder_matches = matches
+        self.assertTrue(self.writer._pool is None)
+        self.assertTrue(os.path.exists(self.path('figure.png')))
+
+    def test_pending_images_are_bounded(self):
+        self.assertEqual(self.writer.max_pending,
+                         image_writer.MAX_PENDING_PER_JOB * 2)
+        for i in range(3 * self.writer.max_pending):
+            self.writer.savefig(create_figure(i), self.path('%i.png' %i))
+            self.assertTrue(len(self.writer._pending)
+                            <= self.writer.max_pending)
+        self.writer.flush()
+        self.assertEqual(len(self.writer._pending), 0)
+        self.assertEqual(len(os.listdir(self.tmpdir)),
+                         3 * self.writer.max_pending)
+
+    def test_errors_are_reported_with_the_path(self):
+        badPath = self.path(os.path.join('missing', 'figure.png'))
+        self.writer.savefig(create_figure(1), self.path('good.png'))
+        self.writer.savefig(create_figure(2), self.path('good2.png'))
+        self.writer.savefig(create_figure(3), badPath)
+        try:
+            self.writer.flush()
+            self.fail("ImageWriteError not raised")
+        except ImageWriteError as e:
+            self.assertTrue(badPath in str(e))
+        # the other images are still written
+        self.assertTrue(os.path.exists(self.path('good.png')))
+        self.assertTrue(os.path.exists(self.path('good2.png')))
+        self.assertEqual(len(self.writer._pending), 0)
+        # the next savefig() raises it once the write fails
+        self.writer.savefig(create_figure(2), badPath)
+        self.writer._pending[0].wait()
+        self.assertRaises(ImageWriteError, self.writer.savefig,
+                          create_figure(3), self.path('good3.png'))
+        self.assertFalse(os.path.exists(self.path('good3.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
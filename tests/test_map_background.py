@@ -0,0 +1,53 @@
+'''
+Unit tests for the map_background module
+'''
+
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import unit_env
+import numpy as np
+import map_background
+
+
+class WriteBackgroundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.background = (np.zeros((2, 3, 4), dtype=np.uint8), 
+                           (0., 1., 2., 3.))
+        self.log = logging.getLogger('test_map_background')
+        self.log.disabled = True
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_writes_entry(self):
+        entryPath = os.path.join(self.cache_dir, 'key.mapbg.npz')
+        map_background._write_background(entryPath, self.background, self.log)
+        self.assertEqual(os.listdir(self.cache_dir), ['key.mapbg.npz'])
+        entry = np.load(entryPath)
+        self.assertTrue(np.array_equal(entry['rgba'], self.background[0]))
+        self.assertEqual(tuple(entry['extent']), self.background[1])
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        # the entry cannot be renamed over a (non-empty) directory
+        entryPath = os.path.join(self.cache_dir, 'key.mapbg.npz')
+        os.makedirs(os.path.join(entryPath, 'x'))
+        map_background._write_background(entryPath, self.background, self.log)
+        self.assertEqual(os.listdir(self.cache_dir), ['key.mapbg.npz'])
+
+
+class BackgroundsCacheTest(unittest.TestCase):
+
+    def test_size_is_that_of_the_pixels(self):
+        rgba = np.zeros((10, 10, 4), dtype=np.uint8)
+        self.assertEqual(map_background._backgrounds._sizeof(
+                                                    (rgba, (0, 1, 0, 1))), 
+                         rgba.nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+'''
+Unit tests for the TrackFileCache class
+'''
+
+import os
+import glob
+import stat
+import shutil
+import tempfile
+import unittest
+import logging
+import unit_env
+from track_cache import TrackFileCache, CACHE_FILE_SUFFIX
+
+
+class Parser(object):
+    ''' Parse function that counts how many times it is called '''
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class TrackFileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.workDir, 'cache')
+        self.cache = TrackFileCache(self.cacheDir, 
+                                    log=logging.getLogger('test'))
+        self.trackFile = os.path.join(self.workDir, 'fort.64')
+        self.write_track_file('line1\n', 1000000000)
+        self.options = {'flagged': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir)
+
+    def write_track_file(self, contents, mtime):
+        with open(self.trackFile, 'w') as f:
+            f.write(contents)
+        os.utime(self.trackFile, (mtime, mtime))
+
+    def entries(self):
+        return glob.glob(os.path.join(self.cacheDir, '*' + CACHE_FILE_SUFFIX))
+
+    def test_parses_once(self):
+        parse = Parser({'entries': [1, 2, 3]})
+        for i in range(2):
+            track = self.cache.get_or_parse([self.trackFile], self.options,
+                                            parse)
+            self.assertEqual(track, {'entries': [1, 2, 3]})
+        self.assertEqual(parse.calls, 1)
+        # e.g. a new process using the same cache directory
+        otherCache = TrackFileCache(self.cacheDir)
+        otherCache.get_or_parse([self.trackFile], self.options, parse)
+        self.assertEqual(parse.calls, 1)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_stale_entry_is_replaced(self):
+        self.cache.get_or_parse([self.trackFile], self.options, Parser('old'))
+        # same size, different mtime
+        self.write_track_file('line2\n', 1000000060)
+        self.assertEqual(self.cache.get([self.trackFile], self.options), None)
+        parse = Parser('new')
+        self.assertEqual(self.cache.get_or_parse([self.trackFile],
+                                                 self.options, parse), 'new')
+        self.assertEqual(parse.calls, 1)
+        self.assertEqual(len(self.entries()), 1)
+        # different size, same mtime
+        self.write_track_file('line2\nline3\n', 1000000060)
+        self.assertEqual(self.cache.get([self.trackFile], self.options), None)
+
+    def test_options_and_optional_paths_are_part_of_the_key(self):
+        self.cache.put([self.trackFile, None], self.options, 'unfiltered')
+        self.cache.put([self.trackFile, None], {'flagged': True}, 'filtered')
+        self.assertEqual(self.cache.get([self.trackFile, None], self.options),
+                         'unfiltered')
+        self.assertEqual(self.cache.get([self.trackFile, None],
+                                        {'flagged': True}), 'filtered')
+        self.assertEqual(self.cache.get([self.trackFile], self.options), None)
+        self.assertEqual(self.cache.get_size()[0], 2)
+
+    def test_missing_file_and_unreadable_entry(self):
+        missing = os.path.join(self.workDir, 'missing.64')
+        self.assertEqual(self.cache.get([missing], self.options), None)
+        self.cache.put([self.trackFile], self.options, 'track')
+        with open(self.entries()[0], 'wb') as f:
+            f.write('not a compressed pickle')
+        self.assertEqual(self.cache.get([self.trackFile], self.options), None)
+        parse = Parser('track')
+        self.cache.get_or_parse([self.trackFile], self.options, parse)
+        self.assertEqual(parse.calls, 1)
+        self.assertEqual(self.cache.get([self.trackFile], self.options),
+                         'track')
+        self.assertEqual(os.listdir(self.cacheDir), 
+                         [os.path.basename(self.entries()[0])])
+
+    def test_entries_are_shared(self):
+        # other users of the cache_dir can read the entries
+        umask = os.umask(0o022)
+        try:
+            self.cache.put([self.trackFile], self.options, 'track')
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(self.entries()[0]).st_mode), 
+                         0o644)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+'''
+Unit tests for the TrackCube class
+'''
+
+import unittest
+import numpy as np
+import unit_env
+try:
+    import track_cube
+    from track_cube import TrackCube, percentile_name
+except ImportError:
+    track_cube = None # pycane is not installed
+
+HOUR = 3600
+CYCLES = [0, 6 * HOUR, 12 * HOUR, 18 * HOUR]
+
+
+class Entry(object):
+    ''' Tracker entry with the given attributes '''
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Track(object):
+    ''' ForecastTrack/ForecastTrackDiff containing the given entries '''
+    def __init__(self, entries):
+        self.tracker_entries = entries
+
+
+def make_errors(seed=0):
+    '''
+    RETURN a dictionary mapping each cycle to a list of error entries for
+    forecast hours 0,6,12, with random errors and some flagged entries.
+    The last cycle has no entry for fhr 12
+    '''
+    rand = np.random.RandomState(seed)
+    errors = {}
+    for i,cycle in enumerate(CYCLES):
+        fhrs = (0, 6, 12) if i < len(CYCLES) - 1 else (0, 6)
+        errors[cycle] = [ Entry(fhr=fhr, track_error=rand.uniform(0, 200),
+                                maxwind_error=rand.uniform(-20, 20),
+                                mslp_error=rand.uniform(-10, 10),
+                                flagged=(i == 1 and fhr == 6))
+                          for fhr in fhrs ]
+    return errors
+
+
+def per_cycle_statistics(errors, field, fhr, is_absolute=False):
+    '''
+    RETURN the unflagged `field' errors of all cycles for forecast hour
+    `fhr', as collected by the per-cycle loop used before the TrackCube
+    '''
+    values = []
+    for cycle in CYCLES:
+        for entry in errors[cycle]:
+            if entry.fhr == fhr and not entry.flagged:
+                value = getattr(entry, field)
+                values.append(abs(value) if is_absolute else value)
+    return values
+
+
+@unittest.skipIf(track_cube is None, "pycane is not installed")
+class TrackCubeStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = make_errors()
+        self.cube = TrackCube(CYCLES, 6 * HOUR, 12 * HOUR)
+        for cycle in CYCLES:
+            self.cube.set_errors(cycle, Track(self.errors[cycle]))
+
+    def test_statistics_match_per_cycle_loop(self):
+        for is_absolute in (False, True):
+            (stats, counts) = self.cube.get_error_statistics(
+                                    percentiles=(10, 90),
+                                    is_absolute=is_absolute)
+            for (i, fhr) in enumerate((0, 6, 12)):
+                for field in ('track_error', 'maxwind_error', 'mslp_error'):
+                    values = per_cycle_statistics(self.errors, field, fhr,
+                                                  is_absolute)
+                    self.assertEqual(counts[i], len(values))
+                    get = lambda name: getattr(stats[name][i], field)
+                    self.assertAlmostEqual(get('mean'), np.mean(values))
+                    self.assertAlmostEqual(
+                        get('rmse'), np.sqrt(np.mean(np.square(values))))
+                    self.assertAlmostEqual(get('std'), np.std(values))
+                    self.assertAlmostEqual(get('median'), np.median(values))
+                    for q in (10, 90):
+                        self.assertAlmostEqual(get(percentile_name(q)),
+                                               np.percentile(values, q))
+
+    def test_mean_and_rms_errors(self):
+        (means, counts) = self.cube.get_mean_errors()
+        (rms, rmsCounts) = self.cube.get_rms_errors()
+        self.assertEqual(counts, [4, 3, 3])
+        self.assertEqual(counts, rmsCounts)
+        self.assertEqual([ e.fhr for e in means ], [0, 6, 12])
+        values = per_cycle_statistics(self.errors, 'mslp_error', 12)
+        self.assertAlmostEqual(means[2].mslp_error, np.mean(values))
+        self.assertAlmostEqual(rms[2].mslp_error,
+                               np.sqrt(np.mean(np.square(values))))
+
+    def test_all_flagged_fhr_uses_previous_value(self):
+        for entry in self.errors[CYCLES[0]] + self.errors[CYCLES[1]] + \
+                     self.errors[CYCLES[2]]:
+            if entry.fhr == 12:
+                entry.flagged = True
+        for cycle in CYCLES:
+            self.cube.set_errors(cycle, Track(self.errors[cycle]))
+        (means, counts) = self.cube.get_mean_errors()
+        self.assertEqual(counts[2], 0)
+        self.assertEqual(means[2].track_error, means[1].track_error)
+
+    def test_statistics_are_recalculated_after_set_errors(self):
+        (means, counts) = self.cube.get_mean_errors()
+        self.errors[CYCLES[0]][0].track_error += 400.
+        self.cube.set_errors(CYCLES[0], Track(self.errors[CYCLES[0]]))
+        (newMeans, counts) = self.cube.get_mean_errors()
+        self.assertAlmostEqual(newMeans[0].track_error,
+                               means[0].track_error + 100.)
+
+
+    def test_percentiles_of_fields_with_missing_values(self):
+        # missing mslp errors of entries whose position is valid
+        self.errors[CYCLES[0]][0].mslp_error = float('nan')
+        self.errors[CYCLES[2]][0].mslp_error = float('nan')
+        for cycle in CYCLES:
+            self.cube.set_errors(cycle, Track(self.errors[cycle]))
+        (stats, counts) = self.cube.get_error_statistics(percentiles=(90,))
+        self.assertEqual(counts[0], 4)
+        values = [ v for v in per_cycle_statistics(self.errors,
+                                                   'mslp_error', 0)
+                   if not np.isnan(v) ]
+        self.assertEqual(len(values), 2)
+        self.assertAlmostEqual(stats['median'][0].mslp_error,
+                               np.median(values))
+        self.assertAlmostEqual(stats['p90'][0].mslp_error,
+                               np.percentile(values, 90))
+        self.assertAlmostEqual(stats['mean'][0].mslp_error, np.mean(values))
+
+
+@unittest.skipIf(track_cube is None, "pycane is not installed")
+class TrackCubeRangeTest(unittest.TestCase):
+
+    def test_value_and_error_ranges(self):
+        cube = TrackCube(CYCLES[:2], 6 * HOUR, 6 * HOUR)
+        cube.set_track(CYCLES[0], Track([
+            Entry(fhr=0, lat=20., lon=-60., mslp_value=990.,
+                  maxwind_value=60., flagged=False),
+            Entry(fhr=6, lat=21., lon=-61., mslp_value=980.,
+                  maxwind_value=70., flagged=True) ]))
+        cube.set_errors(CYCLES[0], Track([
+            Entry(fhr=0, track_error=10., maxwind_error=-5.,
+                  mslp_error=2., flagged=False),
+            Entry(fhr=6, track_error=30., maxwind_error=-8.,
+                  mslp_error=1., flagged=True) ]))
+        self.assertEqual(cube.get_value_range('mslp_value'), (990., 990.))
+        self.assertEqual(cube.get_error_range('maxwind_error'), (-8., -5.))
+        self.assertEqual(cube.get_error_range('maxwind_error', 
+                                              is_absolute=True), (5., 8.))
+        self.assertEqual(cube.get_cycles_without_errors(), [CYCLES[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+'''
+Unit tests for the track_renderer module
+'''
+
+import unittest
+import unit_env
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from track_renderer import get_track_sublines, TrackCollectionBuilder, \
+                           SUBLINE_LENGTH
+from decimate import local_extrema
+
+
+class Basemap(object):
+    ''' Basemap with a cylindrical projection (i.e. x=lon, y=lat) '''
+    def __init__(self, ax, extents=(-100., 0., -20., 60.)):
+        self.ax = ax
+        (self.llcrnrx, self.llcrnry, self.urcrnrx, self.urcrnry) = extents
+
+    def __call__(self, lons, lats):
+        return (lons, lats)
+
+    def set_axes_limits(self, ax=None):
+        pass
+
+
+def make_track(numPoints, seed=0):
+    ''' RETURN the lats, lons and windspeeds of a made-up, wiggly track '''
+    rs = np.random.RandomState(seed)
+    lons = -90. + np.arange(numPoints) * 0.1
+    lats = 10. + np.cumsum(rs.normal(0., 0.01, numPoints))
+    windspeeds = 50. + 20. * np.sin(np.arange(numPoints) / 10.)
+    return (lats, lons, windspeeds)
+
+
+class GetTrackSublinesTest(unittest.TestCase):
+
+    def test_short_tracks(self):
+        for numPoints in range(SUBLINE_LENGTH):
+            self.assertEqual(get_track_sublines(numPoints), [])
+        self.assertEqual(get_track_sublines(SUBLINE_LENGTH),
+                         [(0, SUBLINE_LENGTH)])
+
+    def test_sublines_cover_the_track(self):
+        self.assertEqual(get_track_sublines(10), [(0, 4), (3, 7), (6, 10)])
+        self.assertEqual(get_track_sublines(11), [(0, 4), (3, 7), (6, 11)])
+        for numPoints in range(SUBLINE_LENGTH, 50):
+            sublines = get_track_sublines(numPoints)
+            self.assertEqual(sublines[0][0], 0)
+            self.assertEqual(sublines[-1][1], numPoints)
+            for (start, end) in sublines:
+                self.assertTrue(end - start >= SUBLINE_LENGTH)
+            # consecutive sub-lines share one point
+            for (prev, curr) in zip(sublines[:-1], sublines[1:]):
+                self.assertEqual(curr[0], prev[1] - 1)
+
+
+class TrackCollectionBuilderTest(unittest.TestCase):
+
+    def setUp(self):
+        fig = Figure(figsize=(4, 4))
+        FigureCanvasAgg(fig)
+        self.ax = fig.add_subplot(111)
+        self.basemap = Basemap(self.ax)
+
+    def test_add_track(self):
+        (lats, lons, windspeeds) = make_track(10)
+        builder = TrackCollectionBuilder(self.basemap)
+        builder.add_track(lats, lons, windspeeds=windspeeds,
+                          flagged_idc=[2], indicator_idc=[0, 4, 8])
+        builder.add_track(lats[:5], lons[:5])
+        builder.add_track([], [])
+        sublines = get_track_sublines(10) + get_track_sublines(5)
+        self.assertEqual(len(builder.segments), len(sublines))
+        for (segment, (start, end)) in zip(builder.segments, sublines):
+            np.testing.assert_array_equal(segment[:, 0], lons[start:end])
+            np.testing.assert_array_equal(segment[:, 1], lats[start:end])
+        np.testing.assert_allclose(
+                builder.alphas[:3],
+                [ windspeeds[start:end].mean() / windspeeds.max()
+                  for (start, end) in get_track_sublines(10) ])
+        self.assertEqual(builder.alphas[3:], [None])
+        np.testing.assert_array_equal(builder.flagged_points,
+                                      [[lons[2], lats[2]]])
+        np.testing.assert_array_equal(builder.indicator_points,
+                                      [ [lons[i], lats[i]] for i in (0, 4, 8) ])
+        lines = builder.draw(line_color='black', alpha=0.5)
+        self.assertEqual(len(lines.get_segments()), 4)
+        np.testing.assert_allclose(lines.get_colors()[:, 3],
+                                   builder.alphas[:3] + [0.5])
+
+    def test_decimated_track_keeps_marked_points(self):
+        (lats, lons, windspeeds) = make_track(300)
+        flaggedIdc = [7, 150, 151, 299]
+        indicatorIdc = range(0, 300, 40)
+        builder = TrackCollectionBuilder(self.basemap, tolerance=1.)
+        builder.add_track(lats, lons, windspeeds=windspeeds,
+                          flagged_idc=flaggedIdc, indicator_idc=indicatorIdc)
+        points = np.concatenate([ s[:-1] for s in builder.segments[:-1] ]
+                                + [ builder.segments[-1] ])
+        self.assertTrue(len(points) < len(lats))
+        self.assertEqual(points[0].tolist(), [lons[0], lats[0]])
+        self.assertEqual(points[-1].tolist(), [lons[-1], lats[-1]])
+        # the marked points are those of the original track at their indices
+        np.testing.assert_array_equal(builder.flagged_points,
+                                      [ [lons[i], lats[i]]
+                                        for i in flaggedIdc ])
+        np.testing.assert_array_equal(builder.indicator_points,
+                                      [ [lons[i], lats[i]]
+                                        for i in indicatorIdc ])
+        # and are kept in the line, as are the wind speed extrema
+        kept = set(map(tuple, points.tolist()))
+        for i in list(flaggedIdc) + list(indicatorIdc) \
+                 + list(local_extrema(windspeeds)):
+            self.assertTrue((lons[i], lats[i]) in kept)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+'''
+Unit tests for the TruthIndex class
+'''
+
+import unittest
+import numpy as np
+import unit_env
+from truth_index import TruthIndex, TRUTH_FIELDS
+
+HOUR = 3600
+START = 1122897600 # 2005-08-01 12Z
+
+
+class Entry(object):
+    ''' Tracker entry with the given attributes '''
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Track(object):
+    ''' Truth ForecastTrack with the given entries, keyed by valid time '''
+    def __init__(self, entries):
+        self.entries = entries
+
+    def absolute_times_dict(self):
+        return dict(self.entries)
+
+
+def make_truth(hours=(0, 6, 12, 18, 24), flagged_hours=(12,)):
+    '''
+    RETURN a Track with an entry for each of the given `hours' after START,
+    whose values are linear in the hour, given in unsorted order
+    '''
+    entries = [ (START + h * HOUR, 
+                 Entry(lat=20. + h * 0.1, lon=-60. - h * 0.2,
+                       mslp_value=1000. - h, maxwind_value=30. + h,
+                       flagged=(h in flagged_hours)))
+                for h in hours ]
+    return Track(list(reversed(entries)))
+
+
+class AlignTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TruthIndex(make_truth())
+
+    def test_times_are_sorted(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.times.tolist(), 
+                         [ START + h * HOUR for h in (0, 6, 12, 18, 24) ])
+
+    def test_exact_matches(self):
+        times = START + HOUR * np.array([[6, 3], [24, 30]])
+        ret = self.index.align(times)
+        self.assertEqual(sorted(ret.keys()), sorted(TRUTH_FIELDS))
+        self.assertEqual(ret['mslp_value'].shape, (2, 2))
+        self.assertEqual(ret['mslp_value'][0, 0], 994.)
+        self.assertEqual(ret['mslp_value'][1, 0], 976.)
+        # between entries and after the last one
+        self.assertTrue(np.isnan(ret['mslp_value'][0, 1]))
+        self.assertTrue(np.isnan(ret['mslp_value'][1, 1]))
+
+    def test_interpolation(self):
+        times = START + HOUR * np.array([-6, 0, 3, 9, 30])
+        ret = self.index.align(times, interpolate=True)
+        self.assertTrue(np.isnan(ret['maxwind_value'][0]))
+        self.assertAlmostEqual(ret['maxwind_value'][1], 30.)
+        self.assertAlmostEqual(ret['maxwind_value'][2], 33.)
+        self.assertAlmostEqual(ret['lon'][3], -61.8)
+        self.assertTrue(np.isnan(ret['maxwind_value'][4]))
+        # flagged if either surrounding entry is
+        self.assertEqual(ret['flagged'][2], 0.)
+        self.assertEqual(ret['flagged'][3], 1.)
+
+    def test_empty_track(self):
+        index = TruthIndex(Track([]))
+        ret = index.align([START], interpolate=True)
+        self.assertTrue(np.isnan(ret['lat'][0]))
+        ret = index.get_series(START, 3, 6 * HOUR)
+        self.assertEqual(len(ret['lat']), 3)
+        self.assertTrue(np.isnan(ret['lat']).all())
+
+
+class GetSeriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TruthIndex(make_truth(hours=range(0, 49, 3)))
+
+    def assertSameAsAlign(self, start, count, interval, interpolate=False):
+        series = self.index.get_series(start, count, interval, 
+                                       interpolate=interpolate)
+        expected = self.index.align(start + interval * np.arange(count),
+                                    interpolate=interpolate)
+        for field in TRUTH_FIELDS:
+            self.assertEqual(len(series[field]), count)
+            np.testing.assert_array_equal(series[field], expected[field])
+
+    def test_windows_match_align(self):
+        for start in (START - 12 * HOUR, START, START + 6 * HOUR, 
+                      START + 42 * HOUR, START + 60 * HOUR):
+            for interval in (3 * HOUR, 6 * HOUR):
+                self.assertSameAsAlign(start, 5, interval)
+
+    def test_phase_and_interpolation(self):
+        # times between the truth entries
+        for interpolate in (False, True):
+            self.assertSameAsAlign(START + HOUR, 8, 6 * HOUR, 
+                                   interpolate=interpolate)
+            self.assertSameAsAlign(START + 2 * HOUR, 8, 6 * HOUR, 
+                                   interpolate=interpolate)
+
+    def test_series_are_reused(self):
+        self.index.get_series(START, 4, 6 * HOUR)
+        self.index.get_series(START + 18 * HOUR, 4, 6 * HOUR)
+        self.assertEqual(len(self.index._series), 1)
+        self.index.get_series(START + 3 * HOUR, 4, 6 * HOUR)
+        self.assertEqual(len(self.index._series), 2)
+
+    def test_non_positive_interval(self):
+        self.assertSameAsAlign(START + 6 * HOUR, 3, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+'''
+Unit tests for the util module
+'''
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+import unit_env
+from util import LRUCache, atomic_write
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1) # 'b' is now the oldest
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_byte_limit(self):
+        cache = LRUCache(max_bytes=10, sizeof=len)
+        cache.put('a', 'x' * 4)
+        cache.put('b', 'x' * 4)
+        self.assertEqual(cache.nbytes, 8)
+        cache.put('c', 'x' * 4)
+        self.assertEqual(sorted(cache._entries.keys()), ['b', 'c'])
+        self.assertEqual(cache.nbytes, 8)
+        # replacing a value updates the size
+        cache.put('c', 'x')
+        self.assertEqual(cache.nbytes, 5)
+        # a value larger than the limit evicts everything else but is kept
+        cache.put('d', 'x' * 20)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 20)
+
+    def test_entry_and_byte_limits_combined(self):
+        cache = LRUCache(max_entries=3, max_bytes=5, sizeof=len)
+        for key in 'abcd':
+            cache.put(key, 'x')
+        self.assertEqual(sorted(cache._entries.keys()), ['b', 'c', 'd'])
+        cache.put('e', 'xxxx')
+        self.assertEqual(sorted(cache._entries.keys()), ['d', 'e'])
+
+    def test_zero_entries_disables_caching(self):
+        cache = LRUCache(max_entries=0)
+        cache.put('a', 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+
+    def test_hits_misses_and_clear(self):
+        cache = LRUCache()
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('b')
+        cache.clear()
+        cache.get('a')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'out.dat')
+        self.umask = os.umask(0o022)
+
+    def tearDown(self):
+        os.umask(self.umask)
+        shutil.rmtree(self.tmpdir)
+
+    def test_write(self):
+        with atomic_write(self.path) as f:
+            f.write('contents')
+            # not visible until the block exits
+            self.assertFalse(os.path.exists(self.path))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), 'contents')
+        self.assertEqual(os.listdir(self.tmpdir), ['out.dat'])
+        # same permissions as a file created with open()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+        os.umask(0o077)
+        with atomic_write(self.path) as f:
+            f.write('new contents')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_failed_write(self):
+        with open(self.path, 'wb') as f:
+            f.write('old contents')
+        def write():
+            with atomic_write(self.path) as f:
+                f.write('partial')
+                raise ValueError('failed')
+        self.assertRaises(ValueError, write)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), 'old contents')
+        self.assertEqual(os.listdir(self.tmpdir), ['out.dat'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+'''
+Sets up sys.path so that the unit tests (test_*.py) can import the daffy_plot
+modules the same way they import each other. The unit tests are run from this
+directory with:
+    python -m unittest discover -p 'test_*.py'
+The common module of the plotting scripts, in the top-level directory, can
+also be imported. Tests of modules that need packages that are not installed
+(e.g. pycane) are skipped.
+
+Javier.Delgado@noaa.gov
+'''
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_DIR = os.path.dirname(TESTS_DIR)
+for path in (TOP_DIR, os.path.join(TOP_DIR, 'extern', 'timing'),
+             os.path.join(TOP_DIR, 'daffy_plot')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
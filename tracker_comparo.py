@@ -13,7 +13,7 @@ import os
 import copy
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, savefig, axhline, ylim, gca, scatter
+from matplotlib.pyplot import plot, ylabel, xlabel, show, legend, figure, axhline, ylim, gca, scatter
 import logging as log
 from daffy_plot.plot_helper import DaffyTCVPlotHelper
 from daffy_plot.nature_track import NatureGfdlTrackHelper, NatureNolanTrackHelper
@@ -79,6 +79,6 @@ for metric_name in ('mslp_value', 'maxwind_value'):
    handles, labels = gca().get_legend_handles_labels()
    
    plot_helper.create_simple_legend()
-   savefig(outputfile_prefix + metric_name + '.png')
+   plot_helper.savefig(outputfile_prefix + metric_name + '.png')
    
 